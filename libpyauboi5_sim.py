@@ -0,0 +1,929 @@
+#! /usr/bin/env python
+# coding=utf-8
+import heapq
+import itertools
+import os
+import threading
+import time
+import numpy as np
+import robot_frames
+import robot_kinematics
+import robot_track
+import robot_trajectory
+import robot_transforms
+
+# Pure-Python stand-in for libpyauboi5: same functions, arguments and return values as used by Auboi5Robot.
+# Argument lists match the native ones, e.g. only move_joint takes issync; move_line, move_rotate and
+# move_track always block until the motion ends.
+# Selected by robot_control_en when AUBO_SDK_SIMULATOR=1, or usable directly: robot_control_en.libpyauboi5 = sim.
+# Joint motion follows the configured joint_maxvelc / joint_maxacc on a simulated clock that runs
+# SIM_TIME_SCALE times faster than real time; events are delivered from a per-context thread like the
+# native library does.
+# The kinematics and pose conversions are computed by the SDK's own robot_kinematics / robot_frames /
+# robot_transforms code, so comparing them with the local Auboi5Robot results only checks self-consistency.
+
+# Simulated seconds per real second, overridden by AUBO_SIM_TIME_SCALE
+SIM_TIME_SCALE = float(os.environ.get('AUBO_SIM_TIME_SCALE', '20'))
+
+# Added to every call that talks to the controller, emulates the network round trip, unit (s),
+# overridden by AUBO_SIM_LATENCY
+SIM_LATENCY = float(os.environ.get('AUBO_SIM_LATENCY', '0'))
+
+# Kinematic model of the simulated arm
+SIM_ROBOT_MODEL = robot_kinematics.RobotModelType.Aubo_i5
+
+# Simulated duration of robot_startup / robot_shutdown, unit (s)
+SIM_STARTUP_SECONDS = 3.0
+SIM_SHUTDOWN_SECONDS = 1.0
+
+# Joint and end limits after login and init_global_move_profile
+SIM_DEFAULT_JOINT_MAXVELC = (1.5,) * 6
+SIM_DEFAULT_JOINT_MAXACC = (3.0,) * 6
+SIM_DEFAULT_END_MAX_LINE_VELC = 0.5
+SIM_DEFAULT_END_MAX_LINE_ACC = 1.0
+SIM_DEFAULT_END_MAX_ANGLE_VELC = 1.0
+SIM_DEFAULT_END_MAX_ANGLE_ACC = 2.0
+
+# Joint angles after create_context, unit (rad)
+SIM_HOME = (0.0, -0.127, 1.27, -0.1, 1.57, 0.0)
+
+# Result codes, the values of the matching RobotErrorType so logs read the same
+SIM_SUCC = 0
+SIM_ERROR_NO_LINK = 2003
+SIM_ERROR_MOVE = 2004
+SIM_ERROR_LOGIN = 2005
+SIM_ERROR_ARGS = 2007
+
+# Functions computed with the same local code as Auboi5Robot, not an independent reference for accuracy checks
+SIM_SELF_CONSISTENT = ('forward_kin', 'inverse_kin', 'base_to_user', 'user_to_base', 'base_to_base_additional_tool',
+                       'rpy_to_quaternion', 'quaternion_to_rpy')
+
+# RobotEventType values emitted by the simulator
+SIM_EVENT_STARTUP_DONE = 20
+SIM_EVENT_SHUTDOWN_DONE = 21
+SIM_EVENT_TARGET_REACHED = 22
+SIM_EVENT_SOCKET_DISCONNECTED = 27
+SIM_EVENT_ALREADY_STOPPED = 48
+SIM_EVENT_MOVE_STOP = 1300
+
+# get_robot_state values, see RobotStatus
+SIM_STATE_STOPPED = 0
+SIM_STATE_RUNNING = 1
+SIM_STATE_PAUSED = 2
+
+
+class SimClock:
+    """
+    * Simulated time, SIM_TIME_SCALE times faster than time.monotonic()
+    """
+
+    def __init__(self, scale=SIM_TIME_SCALE):
+        self.__lock = threading.Lock()
+        self.__real = time.monotonic()
+        self.__sim = 0.0
+        self.scale = scale
+
+    def now(self):
+        return self.__sim + (time.monotonic() - self.__real) * self.scale
+
+    def set_scale(self, scale):
+        if not scale > 0.0:
+            raise ValueError("time scale must be positive")
+        with self.__lock:
+            self.__sim = self.now()
+            self.__real = time.monotonic()
+            self.scale = scale
+
+    def real_delay(self, sim_seconds):
+        return max(sim_seconds, 0.0) / self.scale
+
+
+clock = SimClock()
+
+
+class SimMotion:
+    """
+    * Joint samples played back from a simulated start time
+    * Pausing shifts the remaining samples, stopping truncates them at the current position
+    """
+
+    def __init__(self, waypoints, period, start, blocking):
+        self.waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 6)
+        self.period = period
+        self.start = start
+        self.duration = (len(self.waypoints) - 1) * period
+        self.blocking = blocking
+        self.paused_at = None
+        self.stopped = False
+        # Set when the motion ended, reached or stopped
+        self.finished = threading.Event()
+
+    @property
+    def end(self):
+        return self.start + self.duration
+
+    def elapsed(self, now):
+        if self.paused_at is not None:
+            now = self.paused_at
+        return min(max(now - self.start, 0.0), self.duration)
+
+    def position(self, now):
+        if self.duration <= 0.0:
+            return self.waypoints[-1].copy()
+        index = self.elapsed(now) / self.period
+        low = min(int(index), len(self.waypoints) - 1)
+        high = min(low + 1, len(self.waypoints) - 1)
+        fraction = index - low
+        return self.waypoints[low] * (1.0 - fraction) + self.waypoints[high] * fraction
+
+    def velocity(self, now):
+        if self.duration <= 0.0 or self.paused_at is not None:
+            return np.zeros(6)
+        low = min(int(self.elapsed(now) / self.period), len(self.waypoints) - 2)
+        return (self.waypoints[low + 1] - self.waypoints[low]) / self.period
+
+    def pause(self, now):
+        if self.paused_at is None:
+            self.paused_at = now
+
+    def resume(self, now):
+        if self.paused_at is not None:
+            self.start += now - self.paused_at
+            self.paused_at = None
+
+    def done(self, now):
+        return self.stopped or (self.paused_at is None and now >= self.end)
+
+
+class SimRobot:
+    """
+    * State of one simulated controller context
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.lock = threading.RLock()
+        self.logged_in = False
+        self.link_up = True
+        self.powered = False
+        self.callback = None
+        self.joint = np.array(SIM_HOME, dtype=np.float64)
+        self.motion = None
+        self.offline_track = []
+        self.waypoints = []
+        self.tcp2canbus = False
+        self.reduce_mode = False
+        self.calls = 0
+        self.events_sent = 0
+        # (joint bytes, pose) of the last get_current_waypoint, an arm at rest is not recomputed
+        self.last_pose = None
+        self.board_io = {}
+        self.tool_io = {}
+        self.tool_io_type = {}
+        self.tool_power_type = 0
+        self.work_mode = 0
+        self.__timers = []
+        self.__timer_ids = itertools.count()
+        self.__condition = threading.Condition(self.lock)
+        self.__thread = None
+        self.init_profile()
+
+    def init_profile(self):
+        self.joint_maxvelc = SIM_DEFAULT_JOINT_MAXVELC
+        self.joint_maxacc = SIM_DEFAULT_JOINT_MAXACC
+        self.end_max_line_velc = SIM_DEFAULT_END_MAX_LINE_VELC
+        self.end_max_line_acc = SIM_DEFAULT_END_MAX_LINE_ACC
+        self.end_max_angle_velc = SIM_DEFAULT_END_MAX_ANGLE_VELC
+        self.end_max_angle_acc = SIM_DEFAULT_END_MAX_ANGLE_ACC
+        self.tool_dynamics = {"position": (0.0, 0.0, 0.0), "payload": 0.0, "inertia": (0.0,) * 6}
+        self.tool_kinematics = {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)}
+        self.user_coord = None
+        self.relative_offset = None
+        self.blend_radius = 0.0
+        self.circular_loop_times = 0
+        self.arrival_ahead = None
+        self.collision_class = 6
+        self.waypoints = []
+
+    # Motion
+
+    def current_joint(self, now=None):
+        with self.lock:
+            motion = self.motion
+            if motion is None:
+                return self.joint.copy()
+            return motion.position(clock.now() if now is None else now)
+
+    def state(self):
+        with self.lock:
+            motion = self.motion
+            if motion is None or motion.done(clock.now()):
+                return SIM_STATE_STOPPED
+            return SIM_STATE_PAUSED if motion.paused_at is not None else SIM_STATE_RUNNING
+
+    def start_motion(self, waypoints, period, blocking):
+        with self.lock:
+            now = clock.now()
+            if not self.powered:
+                return SIM_ERROR_MOVE, None
+            if self.motion is not None and not self.motion.done(now):
+                return SIM_ERROR_MOVE, None
+            self.settle(now)
+            motion = SimMotion(waypoints, period, now, blocking)
+            self.motion = motion
+            self.schedule(motion.end, lambda: self.__finish(motion))
+        return SIM_SUCC, motion
+
+    def plan(self, path, velocity_scale=1.0, acceleration_scale=1.0):
+        return robot_trajectory.time_parameterize(np.asarray(path, dtype=np.float64), self.joint_maxvelc,
+                                                  self.joint_maxacc, robot_trajectory.OFFLINE_TRACK_PERIOD,
+                                                  velocity_scale, acceleration_scale)
+
+    def wait_motion(self, motion):
+        # Blocking move: sleep in real time until the motion ends, move_stop wakes it up early
+        while not motion.finished.is_set():
+            with self.lock:
+                remaining = motion.end - clock.now() if motion.paused_at is None else SIM_STARTUP_SECONDS
+            motion.finished.wait(clock.real_delay(remaining) + 0.0005)
+        return SIM_SUCC
+
+    def stop(self):
+        with self.lock:
+            motion = self.motion
+            if motion is None or motion.done(clock.now()):
+                self.emit(SIM_EVENT_ALREADY_STOPPED)
+                return SIM_SUCC
+            self.joint = motion.position(clock.now())
+            motion.stopped = True
+            self.motion = None
+            motion.finished.set()
+            self.emit(SIM_EVENT_MOVE_STOP)
+        return SIM_SUCC
+
+    def settle(self, now):
+        # Fold a finished motion into the resting position
+        if self.motion is not None and self.motion.done(now):
+            if not self.motion.stopped:
+                self.joint = self.motion.waypoints[-1].copy()
+            self.motion.finished.set()
+            self.motion = None
+
+    def __finish(self, motion):
+        with self.lock:
+            if motion is not self.motion or motion.stopped:
+                return
+            now = clock.now()
+            if not motion.done(now):
+                # Paused or resumed since the completion was scheduled
+                self.schedule(max(motion.end, now + 0.01), lambda: self.__finish(motion))
+                return
+            self.settle(now)
+            self.emit(SIM_EVENT_TARGET_REACHED)
+
+    # Events, delivered from the context thread like the native library callback
+
+    def emit(self, event_type, code=0, content=''):
+        self.schedule(clock.now(), None, {'type': event_type, 'code': code, 'content': content})
+
+    def schedule(self, sim_time, action, event=None):
+        with self.__condition:
+            heapq.heappush(self.__timers, (sim_time, next(self.__timer_ids), action, event))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='aubo-sim-{0}'.format(self.handle),
+                                                 daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while True:
+                    if not self.__timers:
+                        self.__condition.wait(1.0)
+                        if not self.__timers:
+                            self.__thread = None
+                            return
+                        continue
+                    delay = clock.real_delay(self.__timers[0][0] - clock.now())
+                    if delay <= 0.0:
+                        break
+                    self.__condition.wait(delay)
+                _, _, action, event = heapq.heappop(self.__timers)
+                callback = self.callback if self.logged_in else None
+            if action is not None:
+                action()
+            if event is not None and callback is not None:
+                self.events_sent += 1
+                callback(event)
+
+
+contexts = {}
+_next_handle = itertools.count(1)
+
+
+def _robot(rshd):
+    # Context of a logged-in handle with a working link, None otherwise
+    robot = contexts.get(rshd)
+    if robot is None or not robot.logged_in or not robot.link_up:
+        return None
+    robot.calls += 1
+    if SIM_LATENCY > 0.0:
+        time.sleep(SIM_LATENCY)
+    return robot
+
+
+def _result(rshd, update=None):
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    if update is not None:
+        with robot.lock:
+            return update(robot) or SIM_SUCC
+    return SIM_SUCC
+
+
+def _query(rshd, read):
+    robot = _robot(rshd)
+    if robot is None:
+        return None
+    with robot.lock:
+        return read(robot)
+
+
+def _pose(joint):
+    pos, ori = robot_kinematics.forward_kin_batch(np.asarray(joint, dtype=np.float64), SIM_ROBOT_MODEL)
+    return {'joint': [float(v) for v in joint], 'pos': pos[0].tolist(), 'ori': ori[0].tolist()}
+
+
+def _load_track(track_file):
+    if robot_track.is_track_binary(track_file):
+        return np.array(robot_track.open_track_binary(track_file), dtype=np.float64)
+    return np.loadtxt(track_file, delimiter=',', dtype=np.float64, ndmin=2)
+
+
+# Library and connection
+
+def initialize():
+    return SIM_SUCC
+
+
+def uninitialize():
+    return SIM_SUCC
+
+
+def create_context():
+    handle = next(_next_handle)
+    contexts[handle] = SimRobot(handle)
+    return handle
+
+
+def get_context():
+    return max(contexts) if contexts else -1
+
+
+def login(rshd, ip, port):
+    robot = contexts.get(rshd)
+    if robot is None:
+        return SIM_ERROR_LOGIN
+    if SIM_LATENCY > 0.0:
+        time.sleep(SIM_LATENCY)
+    with robot.lock:
+        robot.logged_in = True
+        robot.link_up = True
+    return SIM_SUCC
+
+
+def logout(rshd):
+    robot = contexts.get(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    with robot.lock:
+        robot.logged_in = False
+    return SIM_SUCC
+
+
+def set_robot_event_callback(rshd, callback):
+    def update(robot):
+        robot.callback = callback
+    return _result(rshd, update)
+
+
+def robot_startup(rshd, collision, tool_dynamics):
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    if not robot.powered:
+        time.sleep(clock.real_delay(SIM_STARTUP_SECONDS))
+    with robot.lock:
+        robot.powered = True
+        robot.collision_class = collision
+        robot.tool_dynamics = tool_dynamics
+        robot.emit(SIM_EVENT_STARTUP_DONE)
+    return SIM_SUCC
+
+
+def robot_shutdown(rshd):
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    robot.stop()
+    if robot.powered:
+        time.sleep(clock.real_delay(SIM_SHUTDOWN_SECONDS))
+    with robot.lock:
+        robot.powered = False
+        robot.emit(SIM_EVENT_SHUTDOWN_DONE)
+    return SIM_SUCC
+
+
+def init_global_move_profile(rshd):
+    return _result(rshd, SimRobot.init_profile)
+
+
+# Motion
+
+def _move(rshd, path_or_trajectory, blocking, scale=None):
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    with robot.lock:
+        if isinstance(path_or_trajectory, robot_trajectory.TimedTrajectory):
+            trajectory = path_or_trajectory
+        else:
+            path = np.vstack((robot.current_joint()[None], np.asarray(path_or_trajectory, dtype=np.float64)))
+            try:
+                trajectory = robot.plan(path) if scale is None else robot.plan(path, *scale(robot, path))
+            except ValueError:
+                return SIM_ERROR_ARGS
+        result, motion = robot.start_motion(trajectory.waypoints, trajectory.period, blocking)
+    if result != SIM_SUCC or not blocking:
+        return result
+    return robot.wait_motion(motion)
+
+
+def _line_scale(robot, path):
+    # Slow a joint interpolated move down until the flange respects the end line speed and acceleration
+    pos, _ = robot_kinematics.forward_kin_batch(path, SIM_ROBOT_MODEL)
+    distance = float(np.linalg.norm(np.diff(pos, axis=0), axis=1).sum())
+    joint = robot.plan(path).duration
+    if distance <= 0.0 or joint <= 0.0:
+        return 1.0, 1.0
+    velc, acc = robot.end_max_line_velc, robot.end_max_line_acc
+    line = 2.0 * np.sqrt(distance / acc) if distance < velc * velc / acc else distance / velc + velc / acc
+    factor = min(1.0, joint / line)
+    return factor, factor * factor
+
+
+def move_joint(rshd, joint_radian, issync=True):
+    return _move(rshd, [joint_radian], issync)
+
+
+def move_line(rshd, joint_radian):
+    return _move(rshd, [joint_radian], True, _line_scale)
+
+
+def move_rotate(rshd, user_coord, rotate_axis, rotate_angle):
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    joint = robot.current_joint()
+    pos, ori = robot_kinematics.forward_kin_batch(joint, SIM_ROBOT_MODEL)
+    rotation = robot_transforms.axis_angle_to_quaternion(np.asarray(rotate_axis, dtype=np.float64), rotate_angle)
+    target = robot_transforms.quaternion_multiply(rotation, ori)
+    solutions, valid = robot_kinematics.inverse_kin_all(pos[0], np.reshape(target, 4), SIM_ROBOT_MODEL)
+    target_joint, found, _ = robot_kinematics.select_nearest_solution(solutions, valid, joint, SIM_ROBOT_MODEL)
+    if not found[0]:
+        return SIM_ERROR_MOVE
+    return _move(rshd, target_joint, True, _line_scale)
+
+
+def remove_all_waypoint(rshd):
+    def update(robot):
+        robot.waypoints = []
+    return _result(rshd, update)
+
+
+def add_waypoint(rshd, joint_radian):
+    def update(robot):
+        robot.waypoints.append(tuple(joint_radian))
+    return _result(rshd, update)
+
+
+def move_track(rshd, track):
+    # Every track type is followed as the joint polyline through the added waypoints
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    with robot.lock:
+        if not robot.waypoints:
+            return SIM_ERROR_ARGS
+        waypoints = list(robot.waypoints)
+    return _move(rshd, waypoints, True)
+
+
+def move_stop(rshd):
+    robot = _robot(rshd)
+    return SIM_ERROR_NO_LINK if robot is None else robot.stop()
+
+
+def move_pause(rshd):
+    def update(robot):
+        if robot.motion is not None:
+            robot.motion.pause(clock.now())
+    return _result(rshd, update)
+
+
+def move_continue(rshd):
+    def update(robot):
+        if robot.motion is not None:
+            robot.motion.resume(clock.now())
+    return _result(rshd, update)
+
+
+def clear_offline_track(rshd):
+    def update(robot):
+        robot.offline_track = []
+    return _result(rshd, update)
+
+
+def append_offline_track_waypoint(rshd, waypoints):
+    waypoints = np.asarray(waypoints, dtype=np.float64)
+    if waypoints.ndim != 2 or waypoints.shape[1] != 6 or len(waypoints) > robot_track.OFFLINE_TRACK_MAX_CHUNK:
+        return SIM_ERROR_ARGS
+
+    def update(robot):
+        robot.offline_track.append(waypoints)
+    return _result(rshd, update)
+
+
+def append_offline_track_file(rshd, track_file):
+    try:
+        waypoints = _load_track(track_file)
+    except (OSError, ValueError):
+        return SIM_ERROR_ARGS
+
+    def update(robot):
+        robot.offline_track.append(waypoints)
+    return _result(rshd, update)
+
+
+def startup_offline_track(rshd):
+    # The controller replays the uploaded samples as they are, one every OFFLINE_TRACK_PERIOD
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    with robot.lock:
+        if not robot.offline_track:
+            return SIM_ERROR_ARGS
+        waypoints = np.concatenate(robot.offline_track)
+        result, _ = robot.start_motion(waypoints, robot_trajectory.OFFLINE_TRACK_PERIOD, False)
+    return result
+
+
+def stop_offline_track(rshd):
+    return move_stop(rshd)
+
+
+def startup_excit_traj_track(rshd, track_file, track_type, subtype):
+    robot = _robot(rshd)
+    if robot is None:
+        return SIM_ERROR_NO_LINK
+    try:
+        waypoints = _load_track(track_file)
+    except (OSError, ValueError):
+        return SIM_ERROR_ARGS
+    result, _ = robot.start_motion(waypoints, robot_trajectory.OFFLINE_TRACK_PERIOD, False)
+    return result
+
+
+def enter_tcp2canbus_mode(rshd):
+    def update(robot):
+        robot.tcp2canbus = True
+    return _result(rshd, update)
+
+
+def leave_tcp2canbus_mode(rshd):
+    def update(robot):
+        robot.tcp2canbus = False
+    return _result(rshd, update)
+
+
+def set_waypoint_to_canbus(rshd, joint_radian):
+    def update(robot):
+        if not robot.tcp2canbus or not robot.powered:
+            return SIM_ERROR_MOVE
+        robot.joint = np.asarray(joint_radian, dtype=np.float64)
+    return _result(rshd, update)
+
+
+def enter_reduce_mode(rshd):
+    def update(robot):
+        robot.reduce_mode = True
+    return _result(rshd, update)
+
+
+def exit_reduce_mode(rshd):
+    def update(robot):
+        robot.reduce_mode = False
+    return _result(rshd, update)
+
+
+def project_startup(rshd):
+    return _result(rshd)
+
+
+def rs_project_stop(rshd):
+    return _result(rshd)
+
+
+def collision_recover(rshd):
+    return _result(rshd)
+
+
+# Motion profile
+
+def _setter(attribute, convert=lambda value: value):
+    def setter(rshd, value):
+        def update(robot):
+            setattr(robot, attribute, convert(value))
+        return _result(rshd, update)
+    setter.__name__ = 'set_' + attribute
+    return setter
+
+
+def _getter(attribute):
+    def getter(rshd):
+        return _query(rshd, lambda robot: getattr(robot, attribute))
+    getter.__name__ = 'get_' + attribute
+    return getter
+
+
+set_joint_maxacc = _setter('joint_maxacc', tuple)
+set_joint_maxvelc = _setter('joint_maxvelc', tuple)
+set_end_max_line_acc = _setter('end_max_line_acc', float)
+set_end_max_line_velc = _setter('end_max_line_velc', float)
+set_end_max_angle_acc = _setter('end_max_angle_acc', float)
+set_end_max_angle_velc = _setter('end_max_angle_velc', float)
+set_tool_dynamics_param = _setter('tool_dynamics')
+set_tool_kinematics_param = _setter('tool_kinematics')
+set_tool_end_param = _setter('tool_kinematics')
+set_blend_radius = _setter('blend_radius', float)
+set_circular_loop_times = _setter('circular_loop_times', int)
+set_collision_class = _setter('collision_class', int)
+set_work_mode = _setter('work_mode', int)
+set_tool_power_type = _setter('tool_power_type', int)
+set_arrival_ahead_distance = _setter('arrival_ahead', lambda value: ('distance', value))
+set_arrival_ahead_time = _setter('arrival_ahead', lambda value: ('time', value))
+set_arrival_ahead_blend = _setter('arrival_ahead', lambda value: ('blend', value))
+
+get_joint_maxacc = _getter('joint_maxacc')
+get_joint_maxvelc = _getter('joint_maxvelc')
+get_end_max_line_acc = _getter('end_max_line_acc')
+get_end_max_line_velc = _getter('end_max_line_velc')
+get_end_max_angle_acc = _getter('end_max_angle_acc')
+get_end_max_angle_velc = _getter('end_max_angle_velc')
+get_tool_dynamics_param = _getter('tool_dynamics')
+get_tool_kinematics_param = _getter('tool_kinematics')
+get_work_mode = _getter('work_mode')
+get_tool_power_type = _getter('tool_power_type')
+
+
+def set_no_arrival_ahead(rshd):
+    def update(robot):
+        robot.arrival_ahead = None
+    return _result(rshd, update)
+
+
+def set_none_tool_dynamics_param(rshd):
+    def update(robot):
+        robot.tool_dynamics = {"position": (0.0, 0.0, 0.0), "payload": 0.0, "inertia": (0.0,) * 6}
+    return _result(rshd, update)
+
+
+def set_none_tool_kinematics_param(rshd):
+    def update(robot):
+        robot.tool_kinematics = {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)}
+    return _result(rshd, update)
+
+
+def set_user_coord(rshd, user_coord):
+    def update(robot):
+        robot.user_coord = user_coord
+    return _result(rshd, update)
+
+
+def set_base_coord(rshd):
+    def update(robot):
+        robot.user_coord = None
+    return _result(rshd, update)
+
+
+def check_user_coord(rshd, user_coord):
+    try:
+        robot_frames.resolve_user_coord(user_coord, SIM_ROBOT_MODEL)
+    except (KeyError, ValueError, TypeError):
+        return SIM_ERROR_ARGS
+    return _result(rshd)
+
+
+def set_relative_offset_on_base(rshd, relative_pos, relative_ori):
+    def update(robot):
+        robot.relative_offset = (tuple(relative_pos), tuple(relative_ori), None)
+    return _result(rshd, update)
+
+
+def set_relative_offset_on_user(rshd, relative_pos, relative_ori, user_coord):
+    def update(robot):
+        robot.relative_offset = (tuple(relative_pos), tuple(relative_ori), user_coord)
+    return _result(rshd, update)
+
+
+# Status
+
+def get_current_waypoint(rshd):
+    robot = _robot(rshd)
+    if robot is None:
+        return None
+    joint = robot.current_joint()
+    cached = robot.last_pose
+    if cached is None or cached[0] != joint.tobytes():
+        cached = (joint.tobytes(), _pose(joint))
+        robot.last_pose = cached
+    return {name: list(value) for name, value in cached[1].items()}
+
+
+def get_robot_state(rshd):
+    robot = _robot(rshd)
+    return None if robot is None else robot.state()
+
+
+def get_joint_status(rshd):
+    # Current follows the commanded joint speed, voltage and temperature are constant plus noise
+    robot = _robot(rshd)
+    if robot is None:
+        return None
+    with robot.lock:
+        motion = robot.motion
+        velocity = np.zeros(6) if motion is None else motion.velocity(clock.now())
+    current = 300.0 + 1500.0 * np.abs(velocity) + np.random.normal(0.0, 10.0, 6)
+    voltage = 48.0 + np.random.normal(0.0, 0.05, 6)
+    return {'joint{0}'.format(i + 1): {'current': int(current[i]), 'voltage': round(float(voltage[i]), 2),
+                                       'temperature': 35.0 if robot.powered else 25.0} for i in range(6)}
+
+
+def is_have_real_robot(rshd):
+    return _query(rshd, lambda robot: 0)
+
+
+def is_online_mode(rshd):
+    return _query(rshd, lambda robot: 0)
+
+
+def is_online_master_mode(rshd):
+    return _query(rshd, lambda robot: 0)
+
+
+def get_dynidentify_results(rshd):
+    return _query(rshd, lambda robot: [0.0] * 60)
+
+
+# IO
+
+def get_board_io_config(rshd, io_type):
+    return _query(rshd, lambda robot: [{"id": index, "name": name, "addr": index, "type": io_type, "value": value}
+                                       for index, ((kind, name), value) in enumerate(sorted(robot.board_io.items()))
+                                       if kind == io_type])
+
+
+def get_board_io_status(rshd, io_type, io_name):
+    return _query(rshd, lambda robot: robot.board_io.get((io_type, io_name), 0.0))
+
+
+def set_board_io_status(rshd, io_type, io_name, io_value):
+    def update(robot):
+        robot.board_io[(io_type, io_name)] = float(io_value)
+    return _result(rshd, update)
+
+
+def get_tool_power_voltage(rshd):
+    return _query(rshd, lambda robot: {0: 0.0, 1: 12.0, 2: 24.0}.get(robot.tool_power_type, 0.0))
+
+
+def set_tool_io_type(rshd, io_addr, io_type):
+    def update(robot):
+        robot.tool_io_type[io_addr] = io_type
+    return _result(rshd, update)
+
+
+def get_tool_io_status(rshd, io_name):
+    return _query(rshd, lambda robot: robot.tool_io.get(io_name, 0.0))
+
+
+def set_tool_do_status(rshd, io_name, io_status):
+    def update(robot):
+        robot.tool_io[io_name] = float(io_status)
+    return _result(rshd, update)
+
+
+# Local computations, no login required
+
+def forward_kin(rshd, joint_radian):
+    return _pose(joint_radian)
+
+
+def inverse_kin(rshd, joint_radian, pos, ori):
+    solutions, valid = robot_kinematics.inverse_kin_all(pos, ori, SIM_ROBOT_MODEL)
+    joint, found, _ = robot_kinematics.select_nearest_solution(solutions, valid, joint_radian, SIM_ROBOT_MODEL)
+    return _pose(joint[0]) if found[0] else None
+
+
+def rpy_to_quaternion(rshd, rpy):
+    return robot_transforms.rpy_to_quaternion(np.asarray(rpy, dtype=np.float64)).reshape(4).tolist()
+
+
+def quaternion_to_rpy(rshd, ori):
+    return robot_transforms.quaternion_to_rpy(np.asarray(ori, dtype=np.float64)).reshape(3).tolist()
+
+
+def base_to_user(rshd, pos, ori, user_coord, user_tool):
+    # Degenerate or unsupported frames fail like the library, with None
+    try:
+        pos, ori = robot_frames.base_to_user_batch(np.reshape(pos, (1, 3)), np.reshape(ori, (1, 4)), user_coord,
+                                                   user_tool, SIM_ROBOT_MODEL)
+    except ValueError:
+        return None
+    return {'pos': pos[0].tolist(), 'ori': ori[0].tolist()}
+
+
+def user_to_base(rshd, pos, ori, user_coord, user_tool):
+    try:
+        pos, ori = robot_frames.user_to_base_batch(np.reshape(pos, (1, 3)), np.reshape(ori, (1, 4)), user_coord,
+                                                   user_tool, SIM_ROBOT_MODEL)
+    except ValueError:
+        return None
+    return {'pos': pos[0].tolist(), 'ori': ori[0].tolist()}
+
+
+def base_to_base_additional_tool(rshd, flange_pos, flange_ori, user_tool):
+    pos, ori = robot_frames.base_to_base_additional_tool_batch(np.reshape(flange_pos, (1, 3)),
+                                                               np.reshape(flange_ori, (1, 4)), user_tool)
+    return {'pos': pos[0].tolist(), 'ori': ori[0].tolist()}
+
+
+# Simulator controls, not part of libpyauboi5
+
+def sim_set_time_scale(scale):
+    """
+    * FUNCTION: sim_set_time_scale
+    * DESCRIPTION: Change how much faster than real time the simulation runs
+    * INPUTS: scale: simulated seconds per real second, e.g. 1.0 for real time, 1e6 for practically instant motions
+    * OUTPUTS:
+    * RETURNS: None
+    * NOTES:
+    """
+    clock.set_scale(scale)
+
+
+def sim_inject_event(rshd, event_type, code=0, content=''):
+    """
+    * FUNCTION: sim_inject_event
+    * DESCRIPTION: Deliver an arbitrary event through the registered callback
+    * INPUTS: rshd: context handle, event_type: RobotEventType value, code / content: event fields
+    * OUTPUTS:
+    * RETURNS: None
+    * NOTES:
+    """
+    contexts[rshd].emit(event_type, code, content)
+
+
+def sim_drop_link(rshd):
+    """
+    * FUNCTION: sim_drop_link
+    * DESCRIPTION: Simulate a lost controller socket
+    * INPUTS: rshd: context handle
+    * OUTPUTS:
+    * RETURNS: None
+    * NOTES: Emits RobotEvent_socketDisconnected, calls fail with SIM_ERROR_NO_LINK until the next login
+    """
+    robot = contexts[rshd]
+    with robot.lock:
+        robot.link_up = False
+        robot.emit(SIM_EVENT_SOCKET_DISCONNECTED)
+
+
+def sim_state(rshd):
+    """
+    * FUNCTION: sim_state
+    * DESCRIPTION: Internal state of a context, for tests
+    * INPUTS: rshd: context handle
+    * OUTPUTS:
+    * RETURNS: {"joint": , "robot_state": , "powered": , "logged_in": , "link_up": , "calls": , "events_sent": ,
+    * "offline_track_points": , "sim_time": }
+    * NOTES:
+    """
+    robot = contexts[rshd]
+    with robot.lock:
+        return {"joint": robot.current_joint().tolist(), "robot_state": robot.state(), "powered": robot.powered,
+                "logged_in": robot.logged_in, "link_up": robot.link_up, "calls": robot.calls,
+                "events_sent": robot.events_sent,
+                "offline_track_points": int(sum(len(chunk) for chunk in robot.offline_track)),
+                "sim_time": clock.now()}
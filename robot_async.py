@@ -0,0 +1,259 @@
+#! /usr/bin/env python
+# coding=utf-8
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from robot_control_en import Auboi5Robot, RobotError, RobotErrorType, RobotEventType, logger, robot_event_info
+
+
+# Blocking calls on the handle, run one at a time in submission order
+HANDLE_METHODS = ('connect', 'disconnect', 'robot_startup', 'robot_shutdown', 'enable_robot_event', 'init_profile',
+                  'set_joint_maxacc', 'get_joint_maxacc', 'set_joint_maxvelc', 'get_joint_maxvelc',
+                  'set_end_max_line_acc', 'get_end_max_line_acc', 'set_end_max_line_velc', 'get_end_max_line_velc',
+                  'set_end_max_angle_acc', 'get_end_max_angle_acc', 'set_end_max_angle_velc',
+                  'get_end_max_angle_velc', 'set_user_coord', 'set_base_coord', 'check_user_coord',
+                  'set_relative_offset_on_base', 'set_relative_offset_on_user', 'set_no_arrival_ahead',
+                  'set_arrival_ahead_distance', 'set_arrival_ahead_time', 'set_arrival_ahead_blend',
+                  'remove_all_waypoint', 'add_waypoint', 'set_blend_radius', 'set_circular_loop_times',
+                  'clear_offline_track', 'append_offline_track_waypoint', 'append_offline_track_file',
+                  'stop_offline_track', 'set_tool_end_param', 'set_none_tool_dynamics_param',
+                  'set_tool_dynamics_param', 'get_tool_dynamics_param', 'set_none_tool_kinematics_param',
+                  'set_tool_kinematics_param', 'get_tool_kinematics_param', 'collision_recover',
+                  'get_robot_state', 'enter_reduce_mode', 'exit_reduce_mode', 'set_work_mode', 'get_work_mode',
+                  'set_collision_class', 'is_have_real_robot', 'is_online_mode', 'is_online_master_mode',
+                  'get_joint_status', 'get_current_waypoint', 'get_board_io_config', 'get_board_io_status',
+                  'set_board_io_status', 'set_tool_power_type', 'get_tool_power_type', 'set_tool_io_type',
+                  'get_tool_power_voltage', 'get_tool_io_status', 'set_tool_io_status', 'inverse_kin',
+                  'base_to_user', 'user_to_base', 'validate_trajectory', 'time_parameterize_track')
+
+# Motions sent with issync=False, the coroutine returns on the RobotEvent_atTrackTargetPos event
+MOTION_METHODS = ('move_joint', 'move_to_target_in_cartesian')
+
+# Motions libpyauboi5 only runs blocking (no issync argument), the call holds the handle executor until the arm stops
+BLOCKING_MOTION_METHODS = ('move_line', 'move_rotate', 'move_track')
+
+# Calls that start the offline track without waiting for it, the coroutine returns on the
+# RobotEvent_atTrackTargetPos event (upload_* only when called with startup=True)
+TRACK_METHODS = ('startup_offline_track', 'upload_offline_track', 'upload_offline_track_file')
+
+# Calls that must not be queued behind the other handle calls
+CONTROL_METHODS = ('move_stop', 'move_pause', 'move_continue')
+
+# Local computations that do not use the handle
+LOCAL_METHODS = ('forward_kin', 'rpy_to_quaternion', 'quaternion_to_rpy')
+
+
+class AsyncAuboi5Robot:
+    """
+    * asyncio front-end of Auboi5Robot
+    * Every method of HANDLE_METHODS, MOTION_METHODS, BLOCKING_MOTION_METHODS, TRACK_METHODS, CONTROL_METHODS and
+    * LOCAL_METHODS is available as a coroutine with the arguments of the Auboi5Robot method. Handle calls run on a
+    * single worker thread owned by this object, so they reach the server in the order they were awaited;
+    * move_stop / move_pause / move_continue use a second worker so they are not queued behind other handle calls.
+    * MOTION_METHODS and TRACK_METHODS only hold the handle worker while they are sent, completion is the arrival
+    * event; BLOCKING_MOTION_METHODS hold it until the arm stops. Motions take an extra keyword timeout, unit (s),
+    * None to wait forever. Cancelling a motion coroutine or its timeout calls move_stop.
+    *
+    * async with AsyncAuboi5Robot() as robot:
+    *     await robot.connect('192.168.1.2', 8899)
+    *     await robot.move_joint(joint_radian, timeout=10.0)
+    """
+
+    def __init__(self, robot=None, robot_model=None):
+        if robot is None:
+            robot = Auboi5Robot() if robot_model is None else Auboi5Robot(robot_model)
+        self.robot = robot
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='aubo-handle')
+        self.__control_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='aubo-control')
+        self.__loop = None
+        # Pending wait_event futures: [(event types, future)]
+        self.__pending = []
+        self.robot.event_waiter.add_listener(self.__on_robot_event)
+
+    async def __aenter__(self):
+        self.__loop = asyncio.get_running_loop()
+        if self.robot.rshd < 0:
+            await self.run(self.robot.create_context)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.robot.connected:
+            await self.disconnect()
+        self.close()
+
+    def close(self):
+        """
+        * FUNCTION: close
+        * DESCRIPTION: Release the worker threads and stop listening to robot events
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Does not log out, the wrapped Auboi5Robot stays usable
+        """
+        self.robot.event_waiter.remove_listener(self.__on_robot_event)
+        self.executor.shutdown(wait=False)
+        self.__control_executor.shutdown(wait=False)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        * FUNCTION: run
+        * DESCRIPTION: Await any blocking call on the handle executor
+        * INPUTS: function: callable, args / kwargs: its arguments
+        * OUTPUTS:
+        * RETURNS: return value of function
+        * NOTES:
+        """
+        self.__loop = asyncio.get_running_loop()
+        return await self.__loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    async def wait_event(self, event_types, timeout=None):
+        """
+        * FUNCTION: wait_event
+        * DESCRIPTION: Wait for the next event of the given types
+        * INPUTS: event_types: RobotEventType value or iterable of values
+        * timeout: maximum waiting time, unit (s), None to wait forever
+        * OUTPUTS:
+        * RETURNS: the event dict {'type': , 'code': , 'content': }
+        * NOTES: Raises RobotError when an error event arrives first and asyncio.TimeoutError on timeout.
+        * Events are delivered while the robot is connected
+        """
+        return await asyncio.wait_for(self.__expect(event_types), timeout)
+
+    async def motion(self, name, function, args, kwargs, timeout=None):
+        """
+        * FUNCTION: motion
+        * DESCRIPTION: Send a motion on the handle executor and wait for the arm to arrive
+        * INPUTS: name: method name for the log, function: call that starts the motion without waiting for it
+        * args / kwargs: its arguments, timeout: maximum movement time, unit (s), None to wait forever
+        * OUTPUTS:
+        * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Failure return: result of function
+        * NOTES: Completion is the RobotEvent_atTrackTargetPos event, the handle executor is free during the
+        * motion. Cancellation or timeout stops the arm with move_stop
+        """
+        try:
+            arrived = self.__expect(RobotEventType.RobotEvent_atTrackTargetPos)
+            try:
+                result = await self.run(function, *args, **kwargs)
+            except BaseException:
+                arrived.cancel()
+                raise
+            if result != RobotErrorType.RobotError_SUCC:
+                arrived.cancel()
+                return result
+            await asyncio.wait_for(arrived, timeout)
+            return RobotErrorType.RobotError_SUCC
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            await self.__stop_after_cancel(name)
+            raise
+
+    async def blocking_motion(self, name, function, args, kwargs, timeout=None):
+        """
+        * FUNCTION: blocking_motion
+        * DESCRIPTION: Run a motion call that returns when the arm stops on the handle executor
+        * INPUTS: name: method name for the log, function: blocking motion call
+        * args / kwargs: its arguments, timeout: maximum movement time, unit (s), None to wait forever
+        * OUTPUTS:
+        * RETURNS: return value of function
+        * NOTES: Cancellation or timeout stops the arm with move_stop, the blocking call then returns on the worker
+        """
+        task = asyncio.ensure_future(self.run(function, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # The interrupted call ends with a move error nobody awaits any more
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            await self.__stop_after_cancel(name)
+            raise
+
+    def __expect(self, event_types):
+        if isinstance(event_types, int):
+            event_types = (event_types,)
+        self.__loop = asyncio.get_running_loop()
+        future = self.__loop.create_future()
+        self.__pending.append((tuple(event_types), future))
+        return future
+
+    def __on_robot_event(self, event):
+        # Runs on the thread of the SDK event callback
+        loop = self.__loop
+        if loop is not None and self.__pending:
+            loop.call_soon_threadsafe(self.__dispatch, event)
+
+    def __dispatch(self, event):
+        pending = []
+        for event_types, future in self.__pending:
+            if future.done():
+                continue
+            if event['type'] in event_types:
+                future.set_result(event)
+            elif robot_event_info(event['type']).is_error:
+                future.set_exception(RobotError(event['type'], event['code'], event['content']))
+            else:
+                pending.append((event_types, future))
+        self.__pending = pending
+
+    async def __stop_after_cancel(self, name):
+        logger.warn("{0} cancelled, stopping the arm".format(name))
+        loop = asyncio.get_running_loop()
+        await asyncio.shield(loop.run_in_executor(self.__control_executor, self.robot.move_stop))
+
+
+def _handle_method(name):
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.robot, name), *args, **kwargs)
+    return _wrap(method, name, "runs on the handle executor")
+
+
+def _motion_method(name):
+    async def method(self, *args, timeout=None, **kwargs):
+        kwargs['issync'] = False
+        return await self.motion(name, getattr(self.robot, name), args, kwargs, timeout)
+    return _wrap(method, name, "sent with issync=False, returns on the arrival event, cancellation calls move_stop")
+
+
+def _blocking_motion_method(name):
+    async def method(self, *args, timeout=None, **kwargs):
+        return await self.blocking_motion(name, getattr(self.robot, name), args, kwargs, timeout)
+    return _wrap(method, name, "returns when the arm stops, cancellation calls move_stop")
+
+
+def _track_method(name):
+    signature = inspect.signature(getattr(Auboi5Robot, name))
+
+    async def method(self, *args, timeout=None, **kwargs):
+        function = getattr(self.robot, name)
+        if not signature.bind(self.robot, *args, **kwargs).arguments.get('startup', True):
+            return await self.run(function, *args, **kwargs)
+        return await self.motion(name, function, args, kwargs, timeout)
+    return _wrap(method, name, "returns on the arrival event of the started track, cancellation calls move_stop")
+
+
+def _control_method(name):
+    async def method(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._AsyncAuboi5Robot__control_executor,
+                                          functools.partial(getattr(self.robot, name), *args, **kwargs))
+    return _wrap(method, name, "bypasses the handle executor queue")
+
+
+def _local_method(name):
+    async def method(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(getattr(self.robot, name), *args, **kwargs))
+    return _wrap(method, name, "runs on the default executor, no server round trip")
+
+
+def _wrap(method, name, note):
+    method.__name__ = name
+    method.__qualname__ = "AsyncAuboi5Robot." + name
+    method.__doc__ = "\n    * Awaitable Auboi5Robot.{0}, {1}\n    ".format(name, note)
+    return method
+
+
+for _names, _factory in ((HANDLE_METHODS, _handle_method), (MOTION_METHODS, _motion_method),
+                         (BLOCKING_MOTION_METHODS, _blocking_motion_method), (TRACK_METHODS, _track_method),
+                         (CONTROL_METHODS, _control_method), (LOCAL_METHODS, _local_method)):
+    for _name in _names:
+        setattr(AsyncAuboi5Robot, _name, _factory(_name))
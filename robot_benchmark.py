@@ -0,0 +1,421 @@
+#! /usr/bin/env python
+# coding=utf-8
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+# The suite never talks to a controller; without this the native libpyauboi5 would be imported
+os.environ.setdefault('AUBO_SDK_SIMULATOR', '1')
+import libpyauboi5_sim
+import robot_control_en
+import robot_kinematics
+import robot_profile
+import robot_recorder
+import robot_telemetry
+import robot_trajectory
+import robot_transforms
+from robot_control_en import Auboi5Robot, RobotEventType, RobotIOType, RobotUserIoName, logger
+
+# Simulated seconds per real second during the benchmarks: motions and start-up take almost no real time,
+# so the numbers measure the SDK and not the simulated arm
+BENCHMARK_TIME_SCALE = 10000.0
+
+# Relative change of a metric reported as a regression by compare_results
+BENCHMARK_TOLERANCE = 0.25
+
+# Committed result of a full run that main() compares with unless --no-baseline is given;
+# regenerate it with --output on the reference machine after an intended performance change
+BENCHMARK_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+
+# Metric name suffixes: throughputs (higher is better) and latencies (lower is better);
+# other metrics are informational and never compared
+THROUGHPUT_SUFFIX = '_per_sec'
+LATENCY_SUFFIX = '_seconds'
+
+# Metrics too noisy to compare between runs
+UNCOMPARED_PREFIX = ('max_',)
+
+
+class SimulatedRobot:
+    """
+    * Auboi5Robot logged in to libpyauboi5_sim and started up
+    * The library module of robot_control_en is swapped for the simulator only inside the with block
+    """
+
+    def __init__(self, time_scale=BENCHMARK_TIME_SCALE, startup=True):
+        self.time_scale = time_scale
+        self.startup = startup
+        self.robot = None
+        self.__library = None
+        self.__time_scale = None
+
+    def __enter__(self):
+        self.__library = robot_control_en.libpyauboi5
+        self.__time_scale = libpyauboi5_sim.clock.scale
+        robot_control_en.libpyauboi5 = libpyauboi5_sim
+        libpyauboi5_sim.sim_set_time_scale(self.time_scale)
+        self.robot = Auboi5Robot()
+        self.robot.create_context()
+        self.robot.connect('localhost', 8899)
+        if self.startup:
+            self.robot.robot_startup()
+        return self.robot
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.robot.connected:
+                self.robot.disconnect()
+        finally:
+            # The simulated context keeps the robot's event callback; both are released here, not at interpreter
+            # exit where Auboi5Robot.__del__ finds logging torn down
+            libpyauboi5_sim.contexts.pop(self.robot.rshd, None)
+            self.robot = None
+            robot_control_en.libpyauboi5 = self.__library
+            libpyauboi5_sim.sim_set_time_scale(self.__time_scale)
+
+
+def _rate(function, count):
+    start = time.perf_counter()
+    function(count)
+    return count / (time.perf_counter() - start)
+
+
+def _latencies(samples):
+    samples = np.sort(np.asarray(samples, dtype=np.float64))
+    return {"p50_seconds": float(samples[len(samples) // 2]),
+            "p99_seconds": float(samples[min(len(samples) - 1, int(len(samples) * 0.99))]),
+            "max_seconds": float(samples[-1])}
+
+
+def benchmark_kinematics(count=20000, batch_count=200000, seed=1):
+    """
+    * FUNCTION: benchmark_kinematics
+    * DESCRIPTION: forward_kin / inverse_kin throughput of the single pose methods and the batched functions
+    * INPUTS: count: single pose calls, batch_count: poses per batched call, seed: random seed
+    * OUTPUTS:
+    * RETURNS: {"forward_kin_per_sec": , "inverse_kin_per_sec": , "forward_kin_batch_per_sec": ,
+    * "inverse_kin_batch_per_sec": }
+    * NOTES: The inverse kinematics targets are distinct, so the IK result cache is not hit
+    """
+    rng = np.random.RandomState(seed)
+    joints = rng.uniform(-2.5, 2.5, (max(count, batch_count), 6))
+    pos, ori = robot_kinematics.forward_kin_batch(joints)
+    robot = Auboi5Robot()
+    singles = [tuple(joint) for joint in joints[:count]]
+    targets = [(tuple(p), tuple(o)) for p, o in zip(pos[:count], ori[:count])]
+
+    def forward(n):
+        for joint in singles[:n]:
+            robot.forward_kin(joint)
+
+    def inverse(n):
+        for joint, (p, o) in zip(singles[:n], targets[:n]):
+            robot.inverse_kin(joint, p, o)
+
+    poses = np.concatenate((pos[:batch_count], ori[:batch_count]), axis=1)
+    return {"forward_kin_per_sec": _rate(forward, count),
+            "inverse_kin_per_sec": _rate(inverse, count),
+            "forward_kin_batch_per_sec": _rate(lambda n: robot_kinematics.forward_kin_batch(joints[:n]), batch_count),
+            "inverse_kin_batch_per_sec": _rate(lambda n: robot_kinematics.inverse_kin_batch(poses[:n]), batch_count)}
+
+
+def benchmark_polling(count=20000):
+    """
+    * FUNCTION: benchmark_polling
+    * DESCRIPTION: get_current_waypoint and get_robot_state polling rate against the simulator
+    * INPUTS: count: calls per method
+    * OUTPUTS:
+    * RETURNS: {"get_current_waypoint_per_sec": , "get_robot_state_per_sec": ,
+    * "get_current_waypoint_in_motion_per_sec": }
+    * NOTES: The last rate is measured from a second thread while a long move_joint blocks the first
+    """
+    with SimulatedRobot() as robot:
+        result = {"get_current_waypoint_per_sec":
+                  _rate(lambda n: [robot.get_current_waypoint() for _ in range(n)], count),
+                  "get_robot_state_per_sec": _rate(lambda n: [robot.get_robot_state() for _ in range(n)], count)}
+        robot.set_joint_maxvelc((0.001,) * 6)
+        mover = threading.Thread(target=robot.move_joint, args=((0.5, 0.0, 1.0, 0.0, 1.2, 0.0),))
+        mover.start()
+        result["get_current_waypoint_in_motion_per_sec"] = \
+            _rate(lambda n: [robot.get_current_waypoint() for _ in range(n)], count)
+        robot.move_stop()
+        mover.join()
+    return result
+
+
+def benchmark_io(count=20000):
+    """
+    * FUNCTION: benchmark_io
+    * DESCRIPTION: Board IO toggle round trips: set_board_io_status followed by get_board_io_status
+    * INPUTS: count: round trips
+    * OUTPUTS:
+    * RETURNS: {"io_toggle_per_sec": , "p50_seconds": , "p99_seconds": , "max_seconds": }
+    * NOTES:
+    """
+    samples = np.empty(count)
+    with SimulatedRobot(startup=False) as robot:
+        io_type, io_name = RobotIOType.User_DO, RobotUserIoName.user_do_00
+        start_all = time.perf_counter()
+        for i in range(count):
+            start = time.perf_counter()
+            robot.set_board_io_status(io_type, io_name, i & 1)
+            if robot.get_board_io_status(io_type, io_name) != i & 1:
+                raise RuntimeError("IO read back mismatch")
+            samples[i] = time.perf_counter() - start
+        elapsed = time.perf_counter() - start_all
+    result = {"io_toggle_per_sec": count / elapsed}
+    result.update(_latencies(samples))
+    return result
+
+
+def benchmark_track_upload(count=200000, seed=1):
+    """
+    * FUNCTION: benchmark_track_upload
+    * DESCRIPTION: upload_offline_track throughput against the simulator, without starting the track
+    * INPUTS: count: waypoints, seed: random seed
+    * OUTPUTS:
+    * RETURNS: {"waypoints": , "upload_waypoints_per_sec": , "upload_seconds": }
+    * NOTES:
+    """
+    rng = np.random.RandomState(seed)
+    waypoints = np.cumsum(rng.normal(0.0, 1e-4, (count, 6)), axis=0)
+    with SimulatedRobot() as robot:
+        start = time.perf_counter()
+        result = robot.upload_offline_track(waypoints, startup=False)
+        elapsed = time.perf_counter() - start
+        if result != 0 or libpyauboi5_sim.sim_state(robot.rshd)["offline_track_points"] != count:
+            raise RuntimeError("offline track upload failed, result={0}".format(result))
+    return {"waypoints": count, "upload_waypoints_per_sec": count / elapsed, "upload_seconds": elapsed}
+
+
+def benchmark_event_dispatch(count=2000):
+    """
+    * FUNCTION: benchmark_event_dispatch
+    * DESCRIPTION: Latency from the library event thread to the user callback, through the EventDispatcher
+    * INPUTS: count: events, sent one at a time
+    * OUTPUTS:
+    * RETURNS: {"p50_seconds": , "p99_seconds": , "max_seconds": , "dropped": }
+    * NOTES: Measured from the injection of the event into the simulator, so the simulator thread hop is included
+    """
+    samples = []
+    received = threading.Event()
+
+    def callback(event):
+        if event['type'] == RobotEventType.RobotEvent_powerChanged:
+            samples.append(time.perf_counter() - float(event['content']))
+            received.set()
+
+    with SimulatedRobot(startup=False) as robot:
+        robot.set_robot_event_callback(callback)
+        for _ in range(count):
+            received.clear()
+            libpyauboi5_sim.sim_inject_event(robot.rshd, RobotEventType.RobotEvent_powerChanged, 0,
+                                             repr(time.perf_counter()))
+            if not received.wait(1.0):
+                raise RuntimeError("event not delivered")
+        dropped = robot.event_dispatcher.stats()["dropped"]
+    result = _latencies(samples)
+    result["dropped"] = dropped
+    return result
+
+
+def benchmark_lifecycle(count=20):
+    """
+    * FUNCTION: benchmark_lifecycle
+    * DESCRIPTION: connect / robot_startup / robot_shutdown / disconnect times with events enabled
+    * INPUTS: count: cycles
+    * OUTPUTS:
+    * RETURNS: {"<step>_p50_seconds": } for each step, as measured in Auboi5Robot.lifecycle_latency
+    * NOTES: Start-up and shutdown include SIM_STARTUP_SECONDS / SIM_SHUTDOWN_SECONDS of simulated time,
+    * BENCHMARK_TIME_SCALE times faster than real time
+    """
+    steps = ('connect', 'robot_startup', 'robot_shutdown', 'disconnect')
+    samples = {step: [] for step in steps}
+    with SimulatedRobot(startup=False) as robot:
+        robot.disconnect()
+        for _ in range(count):
+            robot.connect('localhost', 8899)
+            robot.set_robot_event_callback(lambda event: None)
+            robot.robot_startup()
+            robot.robot_shutdown()
+            robot.disconnect()
+            for step in steps:
+                samples[step].append(robot.lifecycle_latency[step])
+    return {"{0}_p50_seconds".format(step): float(np.median(values)) for step, values in samples.items()}
+
+
+def benchmark_profile(count=2000):
+    """
+    * FUNCTION: benchmark_profile
+    * DESCRIPTION: Motion profile preamble of test() (init_profile and four limit setters) repeated before every
+    * command, sent directly and through robot_profile.RobotProfile
+    * INPUTS: count: preambles
+    * OUTPUTS:
+    * RETURNS: {"<way>_preamble_per_sec": , "<way>_calls_per_preamble": } for way direct and profile,
+    * calls counted by the simulator including the get_robot_state after each preamble
+    * NOTES: The simulator answers without network latency (AUBO_SIM_LATENCY), so the rates mostly show the
+    * Python overhead; on a controller every call saved is a round trip
+    """
+    result = {}
+    with SimulatedRobot(startup=False) as robot:
+        sim_robot = libpyauboi5_sim.contexts[robot.rshd]
+        for name, target in (('direct', robot), ('profile', robot_profile.RobotProfile(robot))):
+            calls = sim_robot.calls
+            start = time.perf_counter()
+            for _ in range(count):
+                target.init_profile()
+                target.set_joint_maxacc((1.5,) * 6)
+                target.set_joint_maxvelc((1.5,) * 6)
+                target.set_end_max_line_acc(0.5)
+                target.set_end_max_line_velc(0.2)
+                target.get_robot_state()
+            result["{0}_preamble_per_sec".format(name)] = count / (time.perf_counter() - start)
+            result["{0}_calls_per_preamble".format(name)] = (sim_robot.calls - calls) / count
+    return result
+
+
+def benchmark_transforms(count=200000):
+    return {name + THROUGHPUT_SUFFIX: rate for name, rate in robot_transforms.benchmark_transforms(count).items()}
+
+
+def benchmark_time_parameterize(count=100000):
+    return robot_trajectory.benchmark_time_parameterize(count)
+
+
+def benchmark_telemetry_bus(count=100000):
+    result = robot_telemetry.benchmark_telemetry_bus(count)
+    return {"queue_samples_per_sec": result["queue"]["samples_per_sec"],
+            "shared_ring_samples_per_sec": result["shared_ring"]["samples_per_sec"],
+            "shared_ring_lost": result["shared_ring"]["lost"]}
+
+
+def benchmark_recorder(seconds=120.0):
+    path = os.path.join(tempfile.mkdtemp(prefix='aubo-benchmark-'), 'telemetry.tlm')
+    try:
+        return robot_recorder.benchmark_recorder(path, seconds=seconds)
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+# name: (function, arguments of the quick run)
+BENCHMARKS = {
+    'kinematics': (benchmark_kinematics, {'count': 2000, 'batch_count': 20000}),
+    'polling': (benchmark_polling, {'count': 5000}),
+    'io': (benchmark_io, {'count': 2000}),
+    'track_upload': (benchmark_track_upload, {'count': 20000}),
+    'event_dispatch': (benchmark_event_dispatch, {'count': 200}),
+    'lifecycle': (benchmark_lifecycle, {'count': 5}),
+    'profile': (benchmark_profile, {'count': 200}),
+    'transforms': (benchmark_transforms, {'count': 20000}),
+    'time_parameterize': (benchmark_time_parameterize, {'count': 10000}),
+    'telemetry_bus': (benchmark_telemetry_bus, {'count': 20000}),
+    'recorder': (benchmark_recorder, {'seconds': 20.0}),
+}
+
+
+def run_benchmarks(names=None, quick=False):
+    """
+    * FUNCTION: run_benchmarks
+    * DESCRIPTION: Run the benchmark suite
+    * INPUTS: names: benchmark names (keys of BENCHMARKS), None for all
+    * quick: small sizes, for a smoke test
+    * OUTPUTS:
+    * RETURNS: {"environment": {...}, "results": {benchmark name: {metric: value}}}
+    * NOTES: Runs against libpyauboi5_sim, no controller needed
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        function, quick_args = BENCHMARKS[name]
+        logger.info("benchmark {0}".format(name))
+        start = time.perf_counter()
+        results[name] = function(**quick_args) if quick else function()
+        results[name]["wall_seconds_total"] = time.perf_counter() - start
+    return {"environment": {"python": platform.python_version(), "numpy": np.__version__,
+                            "platform": platform.platform(), "processor": platform.processor(),
+                            "cpu_count": os.cpu_count(), "time_scale": BENCHMARK_TIME_SCALE, "quick": quick,
+                            "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+            "results": results}
+
+
+def compare_results(current, baseline, tolerance=BENCHMARK_TOLERANCE):
+    """
+    * FUNCTION: compare_results
+    * DESCRIPTION: Compare two run_benchmarks results
+    * INPUTS: current, baseline: run_benchmarks results
+    * tolerance: relative change accepted before a metric counts as a regression
+    * OUTPUTS:
+    * RETURNS: [{"benchmark": , "metric": , "baseline": , "current": , "change": , "regression": }]
+    * NOTES: Only metrics ending in THROUGHPUT_SUFFIX (higher is better) or LATENCY_SUFFIX (lower is better)
+    * present in both results are compared, except UNCOMPARED_PREFIX; change is relative, positive when the metric got better
+    """
+    rows = []
+    for benchmark, metrics in sorted(current["results"].items()):
+        reference = baseline["results"].get(benchmark, {})
+        for metric, value in sorted(metrics.items()):
+            old = reference.get(metric)
+            if old is None or not old or metric.endswith('_total') or metric.startswith(UNCOMPARED_PREFIX):
+                continue
+            if metric.endswith(THROUGHPUT_SUFFIX):
+                change = value / old - 1.0
+            elif metric.endswith(LATENCY_SUFFIX):
+                change = old / value - 1.0 if value else float('inf')
+            else:
+                continue
+            rows.append({"benchmark": benchmark, "metric": metric, "baseline": old, "current": value,
+                         "change": change, "regression": change < -tolerance})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SDK hot paths against libpyauboi5_sim")
+    parser.add_argument('names', nargs='*', help="benchmarks to run, default all: {0}".format(", ".join(BENCHMARKS)))
+    parser.add_argument('--quick', action='store_true', help="small sizes, for a smoke test")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE,
+                        help="compare with a stored JSON result, exit status 1 on regression, default %(default)s")
+    parser.add_argument('--no-baseline', action='store_true', help="do not compare with a stored result")
+    parser.add_argument('--tolerance', type=float, default=BENCHMARK_TOLERANCE,
+                        help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error("unknown benchmark(s): {0}".format(", ".join(unknown)))
+
+    result = run_benchmarks(args.names or None, args.quick)
+    for benchmark, metrics in result["results"].items():
+        print(benchmark)
+        for metric, value in metrics.items():
+            print("  {0:<40s} {1}".format(metric, value))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    if args.no_baseline:
+        return 0
+    if not os.path.exists(args.baseline):
+        print("\nno baseline at {0}, nothing compared".format(args.baseline))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["environment"].get("quick") != args.quick:
+        print("\nbaseline {0} is {1}a --quick run, nothing compared".format(
+            args.baseline, "" if baseline["environment"].get("quick") else "not "))
+        return 0
+    rows = compare_results(result, baseline, args.tolerance)
+    regressions = [row for row in rows if row["regression"]]
+    print("\ncompared {0} metrics with {1}, tolerance {2:.0%}".format(len(rows), args.baseline, args.tolerance))
+    for row in rows:
+        print("  {0}{1:<18s} {2:<40s} {3:>+8.1%}".format("! " if row["regression"] else "  ", row["benchmark"],
+                                                       row["metric"], row["change"]))
+    print("{0} regression(s)".format(len(regressions)))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
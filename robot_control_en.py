@@ -1,12 +1,28 @@
 #! /usr/bin/env python
 # coding=utf-8
 import time
-import libpyauboi5
+import copy
+import functools
+import threading
+import os
+if os.environ.get('AUBO_SDK_SIMULATOR', '0') not in ('', '0'):
+    # Pure-Python controller simulator instead of the native library, see libpyauboi5_sim
+    import libpyauboi5_sim as libpyauboi5
+else:
+    import libpyauboi5
 import logging
 from logging.handlers import RotatingFileHandler
-from multiprocessing import Process, Queue
-import os
+from multiprocessing import Process, Event
+from collections import OrderedDict
 from math import pi
+import numpy as np
+import robot_kinematics
+import robot_transforms
+import robot_frames
+import robot_track
+import robot_trajectory
+import robot_events
+from robot_kinematics import RobotModelType
 
 # Create a logger
 #logger = logging.getLogger()
@@ -109,60 +125,11 @@ class RobotEventType:
     RobotEvent_MoveEnterStopState = 1300 #Movement enters the stop phase
     RobotEvent_None = 999999
 
-    # Non-error events
-    NoError = (RobotEvent_forceControl,
-               RobotEvent_exitForceControl,
-               RobotEvent_tcpParametersSucc,
-               RobotEvent_powerChanged,
-               RobotEvent_mountingPoseChanged,
-               RobotEvent_robotStartupPhase,
-               RobotEvent_robotStartupDoneResult,
-               RobotEvent_robotShutdownDone,
-               RobotEvent_SetPowerOnDone,
-               RobotEvent_ReleaseBrakeDone,
-               RobotEvent_atTrackTargetPos,
-               RobotEvent_robotControllerStateChaned,
-               RobotEvent_robotControllerError,
-               RobotEvent_algorithmException,
-               RobotEvent_alreadyStopped,
-               RobotEvent_alreadyRunning,
-               RobotEvent_boardIoPoweron,
-               RobotEvent_boardIoRunmode,
-               RobotEvent_boardIoPause,
-               RobotEvent_boardIoStop,
-               RobotEvent_boardIoHalt,
-               RobotEvent_boardIoRelease_alarm,
-               RobotEvent_boardIoOrigin_pose,
-               RobotEvent_boardIoAutorun,
-               RobotEvent_safetyIoExternalEmergencyStope,
-               RobotEvent_safetyIoExternalSafeguardStope,
-               RobotEvent_safetyIoReduced_mode,
-               RobotEvent_safetyIoSafeguard_reset,
-               RobotEvent_safetyIo3PositionSwitch,
-               RobotEvent_safetyIoOperationalMode,
-               RobotEvent_safetyIoManualEmergencyStop,
-               RobotEvent_safetyIoSystemStop,
-               RobotEvent_alreadySuspended,
-               RobotEvent_alreadyStopped,
-               RobotEvent_alreadyRunning,
-               RobotEvent_MoveEnterStopState
-               )
-               
-    UserPostEvent = (RobotEvent_robotControllerError,
-                     RobotEvent_safetyIoExternalSafeguardStope,
-                     RobotEvent_safetyIoSystemStop
-                     )
-    ClearErrorEvent = (RobotEvent_armCanbusError,
-                       RobotEvent_remoteEmergencyStop,
-                       RobotEvent_jointError,
-                       RobotEvent_collision,
-                       RobotEvent_collisionStatusChanged,
-                       RobotEvent_encoderError,
-                       RobotEvent_encoderLinesError,
-                       RobotEvent_currentAlarm,
-                       RobotEvent_softEmergency,
-                       RobotEvent_exitSoftEmergency
-                       )
+    # Non-error events, user post events and events cleared on recovery,
+    # built from ROBOT_EVENT_INFO after the table; use robot_event_info() for lookups
+    NoError = ()
+    UserPostEvent = ()
+    ClearErrorEvent = ()
 
     def __init__(self):
         pass
@@ -179,6 +146,9 @@ class RobotErrorType:
     RobotError_LOGIN_FAILED = RobotError_Base + 5 # Robotic arm login failed
     RobotError_NotLogin = RobotError_Base + 6 # Robot is not logged in
     RobotError_ERROR_ARGS = RobotError_Base + 7 # Parameter error
+    RobotError_WAIT_TIMEOUT = RobotError_Base + 8 # Completion event not received in time
+    RobotError_MODEL_MISMATCH = RobotError_Base + 9 # robot_model does not match the connected arm
+    RobotError_LIFECYCLE_FAILED = RobotError_Base + 10 # Start-up / shutdown completion event reported a failure
 
     def __init__(self):
         pass
@@ -202,6 +172,158 @@ class RobotError(Exception):
         return "RobotError type{0} code={1} msg={2}".format(self.error_type, self.error_cdoe, self.error_msg)
 
 
+class RobotEventSeverity:
+    INFO = 0 # Notification, no action needed
+    WARNING = 1 # Abnormal but not an error of the SDK, e.g. a safety IO stop or a planning error
+    ERROR = 2 # Stored in Auboi5Robot.last_error and raised by check_event
+
+    def __init__(self):
+        pass
+
+
+class RobotEventCategory:
+    HARDWARE = 'hardware'
+    SAFETY = 'safety'
+    FORCE = 'force'
+    CONFIG = 'config'
+    POWER = 'power'
+    LIFECYCLE = 'lifecycle'
+    MOTION = 'motion'
+    CONTROLLER = 'controller'
+    LINK = 'link'
+    BOARD_IO = 'board_io'
+    SAFETY_IO = 'safety_io'
+    UNKNOWN = 'unknown'
+
+    def __init__(self):
+        pass
+
+
+class RobotEventInfo:
+    """
+    * Metadata of one RobotEventType code
+    * clear_on_recover: the error state ends when the arm is recovered (RobotEventType.ClearErrorEvent)
+    * user_post: forwarded to the user as is (RobotEventType.UserPostEvent)
+    """
+    __slots__ = ('code', 'name', 'severity', 'category', 'clear_on_recover', 'user_post', 'is_error')
+
+    def __init__(self, code, name, severity, category, clear_on_recover=False, user_post=False):
+        self.code = code
+        self.name = name
+        self.severity = severity
+        self.category = category
+        self.clear_on_recover = clear_on_recover
+        self.user_post = user_post
+        self.is_error = severity == RobotEventSeverity.ERROR
+
+    def __repr__(self):
+        return "RobotEventInfo({0}, {1}, severity={2}, category={3})".format(self.code, self.name, self.severity,
+                                                                            self.category)
+
+
+def _robot_event_table():
+    info, warning, error = RobotEventSeverity.INFO, RobotEventSeverity.WARNING, RobotEventSeverity.ERROR
+    category = RobotEventCategory
+    # name without the RobotEvent_ prefix: (severity, category, clear_on_recover, user_post)
+    rows = {'armCanbusError': (error, category.HARDWARE, True, False),
+            'remoteHalt': (error, category.SAFETY, False, False),
+            'remoteEmergencyStop': (error, category.SAFETY, True, False),
+            'jointError': (error, category.HARDWARE, True, False),
+            'forceControl': (info, category.FORCE, False, False),
+            'exitForceControl': (info, category.FORCE, False, False),
+            'softEmergency': (error, category.SAFETY, True, False),
+            'exitSoftEmergency': (error, category.SAFETY, True, False),
+            'collision': (error, category.SAFETY, True, False),
+            'collisionStatusChanged': (error, category.SAFETY, True, False),
+            'tcpParametersSucc': (info, category.CONFIG, False, False),
+            'powerChanged': (info, category.POWER, False, False),
+            'ArmPowerOff': (error, category.POWER, False, False),
+            'mountingPoseChanged': (info, category.CONFIG, False, False),
+            'encoderError': (error, category.HARDWARE, True, False),
+            'encoderLinesError': (error, category.HARDWARE, True, False),
+            'singularityOverspeed': (error, category.SAFETY, False, False),
+            'currentAlarm': (error, category.HARDWARE, True, False),
+            'toolioError': (error, category.HARDWARE, False, False),
+            'robotStartupPhase': (info, category.LIFECYCLE, False, False),
+            'robotStartupDoneResult': (info, category.LIFECYCLE, False, False),
+            'robotShutdownDone': (info, category.LIFECYCLE, False, False),
+            'atTrackTargetPos': (info, category.MOTION, False, False),
+            'SetPowerOnDone': (info, category.POWER, False, False),
+            'ReleaseBrakeDone': (info, category.POWER, False, False),
+            'robotControllerStateChaned': (info, category.CONTROLLER, False, False),
+            'robotControllerError': (warning, category.CONTROLLER, False, True),
+            'socketDisconnected': (error, category.LINK, False, False),
+            'overSpeed': (error, category.SAFETY, False, False),
+            'algorithmException': (warning, category.CONTROLLER, False, False),
+            'boardIoPoweron': (info, category.BOARD_IO, False, False),
+            'boardIoRunmode': (info, category.BOARD_IO, False, False),
+            'boardIoPause': (warning, category.BOARD_IO, False, False),
+            'boardIoStop': (warning, category.BOARD_IO, False, False),
+            'boardIoHalt': (warning, category.BOARD_IO, False, False),
+            'boardIoEmergency': (error, category.BOARD_IO, False, False),
+            'boardIoRelease_alarm': (info, category.BOARD_IO, False, False),
+            'boardIoOrigin_pose': (info, category.BOARD_IO, False, False),
+            'boardIoAutorun': (info, category.BOARD_IO, False, False),
+            'safetyIoExternalEmergencyStope': (warning, category.SAFETY_IO, False, False),
+            'safetyIoExternalSafeguardStope': (warning, category.SAFETY_IO, False, True),
+            'safetyIoReduced_mode': (info, category.SAFETY_IO, False, False),
+            'safetyIoSafeguard_reset': (info, category.SAFETY_IO, False, False),
+            'safetyIo3PositionSwitch': (info, category.SAFETY_IO, False, False),
+            'safetyIoOperationalMode': (info, category.SAFETY_IO, False, False),
+            'safetyIoManualEmergencyStop': (warning, category.SAFETY_IO, False, False),
+            'safetyIoSystemStop': (warning, category.SAFETY_IO, False, True),
+            'alreadySuspended': (info, category.MOTION, False, False),
+            'alreadyStopped': (info, category.MOTION, False, False),
+            'alreadyRunning': (info, category.MOTION, False, False),
+            'MoveEnterStopState': (info, category.MOTION, False, False),
+            'None': (error, category.UNKNOWN, False, False)}
+    return {getattr(RobotEventType, 'RobotEvent_' + name): RobotEventInfo(getattr(RobotEventType, 'RobotEvent_' + name),
+                                                                         name, *row)
+            for name, row in rows.items()}
+
+
+# {event code: RobotEventInfo} for every RobotEventType code
+ROBOT_EVENT_INFO = _robot_event_table()
+
+RobotEventType.NoError = tuple(code for code, info in ROBOT_EVENT_INFO.items() if not info.is_error)
+RobotEventType.UserPostEvent = tuple(code for code, info in ROBOT_EVENT_INFO.items() if info.user_post)
+RobotEventType.ClearErrorEvent = tuple(code for code, info in ROBOT_EVENT_INFO.items() if info.clear_on_recover)
+
+
+def robot_event_info(event_type):
+    """
+    * FUNCTION: robot_event_info
+    * DESCRIPTION: Metadata of an event code
+    * INPUTS: event_type: RobotEventType value
+    * OUTPUTS:
+    * RETURNS: RobotEventInfo, an error of category UNKNOWN for codes the SDK does not know
+    * NOTES: One dict lookup
+    """
+    info = ROBOT_EVENT_INFO.get(event_type)
+    if info is None:
+        info = RobotEventInfo(event_type, 'unknown', RobotEventSeverity.ERROR, RobotEventCategory.UNKNOWN)
+    return info
+
+
+def robot_event_types(severity=None, category=None, min_severity=None):
+    """
+    * FUNCTION: robot_event_types
+    * DESCRIPTION: Event codes matching a severity and / or category, e.g. for EventDispatcher.subscribe
+    * INPUTS: severity: RobotEventSeverity value, None for any
+    * category: RobotEventCategory value or tuple of values, None for any
+    * min_severity: lowest RobotEventSeverity value, None for any
+    * OUTPUTS:
+    * RETURNS: tuple of RobotEventType values
+    * NOTES:
+    """
+    if isinstance(category, str):
+        category = (category,)
+    return tuple(code for code, info in ROBOT_EVENT_INFO.items()
+                 if (severity is None or info.severity == severity) and
+                 (category is None or info.category in category) and
+                 (min_severity is None or info.severity >= min_severity))
+
+
 class RobotDefaultParameters:
     # Default kinetic parameters
     tool_dynamics = {"position": (0.0, 0.0, 0.0), "payload": 1.0, "inertia": (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)}
@@ -209,6 +331,21 @@ class RobotDefaultParameters:
     # Default collision level
     collision_grade = 6
 
+    # Maximum waiting time for the start-up / shutdown completion event, unit (s)
+    startup_timeout = 30.0
+    shutdown_timeout = 10.0
+
+    # Maximum waiting time for the server to answer after login, and interval of the queries until it does, unit (s)
+    login_timeout = 5.0
+    login_poll_interval = 0.05
+
+    # Joint angles at which connect compares the local forward kinematics with the controller's, unit (rad),
+    # away from singularities so every link length shows in the pose
+    model_check_joint = (0.3, -0.4, 1.1, 0.2, 0.9, -0.5)
+
+    # Largest position difference accepted by that comparison, unit (m)
+    model_check_tolerance = 1e-4
+
     def __init__(self):
         pass
 
@@ -217,6 +354,24 @@ class RobotDefaultParameters:
                                                                                          self.collision_grade)
 
 
+class RobotSessionSettings:
+    # Setters sharing one slot of Auboi5Robot.session_settings, the last applied one wins
+    GROUP = {'set_base_coord': 'set_user_coord',
+             'set_none_tool_kinematics_param': 'set_tool_kinematics_param',
+             'set_none_tool_dynamics_param': 'set_tool_dynamics_param',
+             'set_no_arrival_ahead': 'arrival_ahead',
+             'set_arrival_ahead_distance': 'arrival_ahead',
+             'set_arrival_ahead_time': 'arrival_ahead'}
+
+    # Settings cleared by init_profile
+    MOVE_PROFILE = ('set_joint_maxacc', 'set_joint_maxvelc', 'set_end_max_line_acc', 'set_end_max_line_velc',
+                    'set_end_max_angle_acc', 'set_end_max_angle_velc', 'set_user_coord', 'set_tool_kinematics_param',
+                    'set_blend_radius', 'set_circular_loop_times', 'arrival_ahead', 'set_arrival_ahead_blend')
+
+    def __init__(self):
+        pass
+
+
 class RobotMoveTrackType:
     # Arc
     ARC_CIR = 2
@@ -397,16 +552,118 @@ class RobotToolDigitalIoDir:
         pass
 
 
+class RobotParameterCacheMode:
+    # Default: every get_* query reaches the controller, the answer is still cached for validate_trajectory
+    Off = 0
+    # Opt-in: a cached value is returned without a round trip, unknown ones are queried once and cached.
+    # Changes made outside this handle (teach pendant, another client) are not seen until invalidate_parameter_cache
+    ReadThrough = 1
+    # Only cached values are returned, None when unknown: the controller is never queried
+    CachedOnly = 2
+
+    def __init__(self):
+        pass
+
+
+class RobotParameterCache:
+    # Parameters of Auboi5Robot.parameter_cache, named after the libpyauboi5 getter without "get_"
+    PARAMETERS = ('joint_maxacc', 'joint_maxvelc', 'end_max_line_acc', 'end_max_line_velc', 'end_max_angle_acc',
+                  'end_max_angle_velc', 'tool_dynamics_param', 'tool_kinematics_param', 'work_mode')
+
+    # Parameters reset by init_profile, see RobotSessionSettings.MOVE_PROFILE
+    MOVE_PROFILE = ('joint_maxacc', 'joint_maxvelc', 'end_max_line_acc', 'end_max_line_velc', 'end_max_angle_acc',
+                    'end_max_angle_velc', 'tool_kinematics_param')
+
+    def __init__(self):
+        pass
+
+
+class RobotConcurrency:
+    # Auboi5Robot methods that do not take the handle lock:
+    # read-only queries, so a telemetry thread is never queued behind a running motion
+    READ_ONLY = ('get_current_waypoint', 'get_robot_state', 'get_joint_status', 'get_board_io_config',
+                 'get_board_io_status', 'get_tool_io_status', 'get_tool_power_type', 'get_tool_power_voltage',
+                 'get_work_mode', 'is_have_real_robot', 'is_online_mode', 'is_online_master_mode',
+                 'get_joint_maxacc', 'get_joint_maxvelc', 'get_end_max_line_acc', 'get_end_max_line_velc',
+                 'get_end_max_angle_acc', 'get_end_max_angle_velc', 'get_tool_dynamics_param',
+                 'get_tool_kinematics_param', 'get_dynidentify_results', 'base_to_user', 'base_to_user_batch',
+                 'user_to_base', 'user_to_base_batch', 'check_user_coord', 'validate_trajectory',
+                 'time_parameterize_track')
+    # commands that must reach the arm while another thread is blocked in a motion
+    CONTROL = ('move_stop', 'move_pause', 'move_continue')
+    # local computations and the event callback, which runs on the SDK thread
+    LOCAL = ('get_context', 'check_event', 'robot_event_callback', 'forward_kin', 'inverse_kin',
+             'invalidate_ik_cache', 'invalidate_parameter_cache', 'compile_user_coord', 'base_to_base_additional_tool',
+             'base_to_base_additional_tool_batch', 'rpy_to_quaternion', 'quaternion_to_rpy', 'raise_error',
+             'get_local_time', 'initialize', 'uninitialize')
+
+    def __init__(self):
+        pass
+
+
 class Auboi5Robot:
+    """
+    * Concurrency model:
+    * Every public method not listed in RobotConcurrency runs under the per-handle lock self.handle_lock,
+    * so commands from several threads reach the server one at a time and a motion blocks other commands
+    * until it returns. Read-only queries (RobotConcurrency.READ_ONLY) and move_stop / move_pause /
+    * move_continue do not take the lock: a telemetry thread may poll get_current_waypoint while a motion
+    * thread is inside move_line, and a supervisor thread may stop that motion. The parameter getters among them
+    * still take the lock around parameter_cache, not around the controller query.
+    * State shared with the SDK event thread (last_error, last_event, connected) is only replaced, never
+    * modified in place, so readers see either the old or the new value.
+    """
     # Number of clients
     __client_count = 0
 
-    def __init__(self):
+    def __init__(self, robot_model=RobotModelType.Aubo_i5):
         self.rshd = -1
         self.connected = False
+        # Serializes commands on this handle, see RobotConcurrency
+        self.handle_lock = threading.RLock()
         self.last_error = RobotError()
         self.last_event = RobotEvent()
         self.atTrackTargetPos = False
+        # Robot model used by the local kinematics, see class RobotModelType
+        self.robot_model = robot_model
+        # Result of connect's check of robot_model against the controller: True when it matches, False when it
+        # does not (the local kinematics are then refused), None while not logged in or when it could not be checked
+        self.verified_robot_model = None
+        # Inverse kinematics result cache, keyed by the tool and user frame and cleared whenever they change
+        self.ik_cache = robot_kinematics.IkResultCache()
+        # Tool kinematics parameters the cached results were computed with, None without tool
+        self.ik_cache_tool = None
+        # User frame last applied by set_user_coord, None when unknown
+        self.user_frame = None
+        # Number of set_user_coord calls skipped because the frame was already applied
+        self.user_coord_skipped = 0
+        # Statistics of the last upload_offline_track call
+        self.last_track_upload = None
+        # Controller parameters last read or written, {RobotParameterCache.PARAMETERS name: value}, an unknown
+        # parameter has no entry. Replaced, not cleared, on invalidation so a query in flight cannot refill it
+        self.parameter_cache = {}
+        # How the get_* queries of RobotParameterCache.PARAMETERS use parameter_cache, see RobotParameterCacheMode
+        self.parameter_cache_mode = RobotParameterCacheMode.Off
+        # Number of get_* queries answered from parameter_cache
+        self.parameter_cache_hits = 0
+        # Completion events waited for by robot_startup / robot_shutdown
+        self.event_waiter = robot_events.EventWaiter()
+        # Callback passed to set_robot_event_callback, None when events are not enabled
+        self.event_callback = None
+        # True once connect has registered the library event callback feeding event_waiter and event_dispatcher
+        self.__events_registered = False
+        # Runs event_callback and other event subscribers off the native library thread, error events are
+        # the last to be dropped when the queue overflows
+        self.event_dispatcher = robot_events.EventDispatcher(keep=lambda event_type:
+                                                             robot_event_info(event_type).is_error)
+        self.__event_token = None
+        # Measured duration of the last connect / disconnect / robot_startup / robot_shutdown, unit (s)
+        self.lifecycle_latency = {}
+        # Configuration applied since connect, {slot: (method name, args)} in the order it was applied,
+        # replayed by robot_session.RobotSession after a reconnect
+        self.session_settings = OrderedDict()
+        # robot_metrics.RobotInstrumentation while method latencies are recorded, None otherwise
+        self.instrumentation = None
         Auboi5Robot.__client_count += 1
 
     def __del__(self):
@@ -436,14 +693,19 @@ class Auboi5Robot:
         * INPUTS: No input
         * OUTPUTS:
         * RETURNS: system event callback function
-        * NOTES:
+        * NOTES: Called on the event dispatcher thread when registered with enable_robot_event
         """
-        print("event={0}".format(event))
-        if event['type'] not in RobotEventType.NoError:
+        logger.info("event={0}".format(event))
+        if robot_event_info(event['type']).is_error:
             self.last_error = RobotError(event['type'], event['code'], event['content'])
         else:
             self.last_event = RobotEvent(event['type'], event['code'], event['content'])
 
+    def __on_robot_event(self, event):
+        # Native library thread: wake the waiters and queue the event, the callback runs on the dispatcher thread
+        self.event_waiter.notify(event)
+        self.event_dispatcher.put(event)
+
     @staticmethod
     def raise_error(error_type, error_code, error_msg):
         """"
@@ -456,17 +718,22 @@ class Auboi5Robot:
         """
         raise RobotError(error_type, error_code, error_msg)
 
-    def check_event(self):
+    def check_event(self, recovering=False):
         """"
         * FUNCTION: check_event
         * DESCRIPTION: Check whether an abnormal event has occurred in the robotic arm
-        * INPUTS: input
+        * INPUTS: recovering: True for the recovery calls, which must still reach the arm while an error that
+        * ends on recovery (RobotEventInfo.clear_on_recover) is pending
         * OUTPUTS: output
         * RETURNS: void
-        * NOTES: If an abnormal event is received, the function throws an abnormal event
-        """
-        if self.last_error.error_type != RobotErrorType.RobotError_SUCC:
-            raise self.last_error
+        * NOTES: If an abnormal event is received, the function throws an abnormal event.
+        * The pending event is classified with robot_event_info: only errors are raised
+        """
+        error = self.last_error
+        if error.error_type != RobotErrorType.RobotError_SUCC:
+            info = robot_event_info(error.error_type)
+            if info.is_error and not (recovering and info.clear_on_recover):
+                raise error
         if self.rshd == -1 or not self.connected:
             self.raise_error(RobotErrorType.RobotError_NoLink, 0, "no socket link")
 
@@ -523,24 +790,44 @@ class Auboi5Robot:
         """
         return self.rshd
 
-    def connect(self, ip='localhost', port=8899):
+    def connect(self, ip='localhost', port=8899, timeout=RobotDefaultParameters.login_timeout):
         """"
         * FUNCTION: connect
         * DESCRIPTION: Link to the robotic arm server
         * INPUTS: ip robotic arm server address
         * port port number
+        * timeout: maximum waiting time for the server to answer after login, unit (s)
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Timeout: RobotError.RobotError_WAIT_TIMEOUT
         * Failure return: other
         *
-        * NOTES:
+        * NOTES: The robot events are registered right after login, whether or not enable_robot_event is called.
+        * libpyauboi5 has no login completion event, so the session counts as acknowledged once the server answers
+        * get_robot_state; a RobotEvent_socketDisconnected or the timeout before that logs out again.
+        * The measured time is kept in self.lifecycle_latency['connect']
+        * self.robot_model is checked against the controller's forward_kin, see verify_robot_model; a mismatch
+        * only logs a warning, the calls that compute with the local kinematics are refused afterwards
         """
         logger.info("ip={0}, port={1}".format(ip, port))
         if self.rshd >= 0:
             if not self.connected:
+                mark = self.event_waiter.mark()
+                start = time.monotonic()
                 if libpyauboi5.login(self.rshd, ip, port) == 0:
                     self.connected = True
-                    time.sleep(0.5)
+                    self.user_frame = None
+                    self.invalidate_parameter_cache()
+                    self.event_callback = None
+                    self.session_settings = OrderedDict()
+                    result = self.__wait_login(mark, start, timeout)
+                    self.lifecycle_latency['connect'] = time.monotonic() - start
+                    if result != RobotErrorType.RobotError_SUCC:
+                        self.disconnect()
+                        return result
+                    error = self.verify_robot_model()
+                    if error is not None:
+                        logger.warn("{0}, local kinematics refused on this link".format(error))
                     return RobotErrorType.RobotError_SUCC
                 else:
                     logger.error("login failed!")
@@ -560,19 +847,31 @@ class Auboi5Robot:
          * OUTPUTS:
          * RETURNS: Successful return: RobotError.RobotError_SUCC
          * Failure return: other
-         * NOTES:
+         * NOTES: logout returns once the session is closed. The measured time is kept in
+         * self.lifecycle_latency['disconnect']
          """
         if self.rshd >= 0 and self.connected:
+            start = time.monotonic()
             libpyauboi5.logout(self.rshd)
+            self.lifecycle_latency['disconnect'] = time.monotonic() - start
             self.connected = False
-            time.sleep(0.5)
+            self.verified_robot_model = None
+            self.user_frame = None
+            self.invalidate_parameter_cache()
+            self.event_dispatcher.unsubscribe(self.__event_token)
+            self.__event_token = None
+            self.event_callback = None
+            self.__events_registered = False
+            # Events already queued are still delivered, then the dispatcher thread exits
+            self.event_dispatcher.stop(wait=False)
             return RobotErrorType.RobotError_SUCC
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
 
     def robot_startup(self, collision=RobotDefaultParameters.collision_grade,
-                      tool_dynamics=RobotDefaultParameters.tool_dynamics):
+                      tool_dynamics=RobotDefaultParameters.tool_dynamics,
+                      timeout=RobotDefaultParameters.startup_timeout):
         """
         * FUNCTION: robot_startup
         * DESCRIPTION: Start the robotic arm
@@ -581,39 +880,93 @@ class Auboi5Robot:
         * tool_dynamics = position, unit (m): {"position": (0.0, 0.0, 0.0),
         * Payload, unit (kg): "payload": 1.0,
         * Inertia: "inertia": (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)}
+        * timeout: maximum waiting time for RobotEvent_robotStartupDoneResult, unit (s)
         *
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Timeout: RobotError.RobotError_WAIT_TIMEOUT
         * Failure return: other
-        * NOTES:
+        * NOTES: Returns when the start-up completion event arrives. Raises RobotError_LIFECYCLE_FAILED with the
+        * event code when that event reports a failure, and RobotError(RobotEvent_socketDisconnected) when the link
+        * is lost first.
+        * The measured time is kept in self.lifecycle_latency['robot_startup']
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            result = libpyauboi5.robot_startup(self.rshd, collision, tool_dynamics)
-            time.sleep(0.5)
-            return result
+            result = self.__wait_lifecycle('robot_startup', RobotEventType.RobotEvent_robotStartupDoneResult,
+                                           timeout, libpyauboi5.robot_startup, self.rshd, collision, tool_dynamics)
+            return self.__store_parameter(result, 'tool_dynamics_param', tool_dynamics)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
 
-    def robot_shutdown(self):
+    def robot_shutdown(self, timeout=RobotDefaultParameters.shutdown_timeout):
         """
         * FUNCTION: robot_shutdown
         * DESCRIPTION: Turn off the robotic arm
-        * INPUTS:
+        * INPUTS: timeout: maximum waiting time for RobotEvent_robotShutdownDone, unit (s)
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Timeout: RobotError.RobotError_WAIT_TIMEOUT
         * Failure return: other
-        * NOTES:
+        * NOTES: Returns when the shutdown completion event arrives, failures are raised as in robot_startup.
+        * The measured time is kept in self.lifecycle_latency['robot_shutdown']
         """
         if self.rshd >= 0 and self.connected:
-            result = libpyauboi5.robot_shutdown(self.rshd)
-            time.sleep(0.5)
-            return result
+            return self.__wait_lifecycle('robot_shutdown', RobotEventType.RobotEvent_robotShutdownDone, timeout,
+                                         libpyauboi5.robot_shutdown, self.rshd)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
 
+    def __wait_lifecycle(self, name, event_type, timeout, function, *args):
+        mark = self.event_waiter.mark()
+        start = time.monotonic()
+        result = function(*args)
+        event = None
+        if result == RobotErrorType.RobotError_SUCC:
+            remaining = None if timeout is None else max(timeout - (time.monotonic() - start), 0.0)
+            event = self.event_waiter.wait((event_type, RobotEventType.RobotEvent_socketDisconnected), mark,
+                                           remaining)
+            if event is None:
+                logger.error("{0}: no completion event within {1}s".format(name, timeout))
+                result = RobotErrorType.RobotError_WAIT_TIMEOUT
+        self.lifecycle_latency[name] = time.monotonic() - start
+        logger.info("{0} took {1:.3f}s".format(name, self.lifecycle_latency[name]))
+        if event is not None and event['type'] != event_type:
+            self.raise_error(event['type'], event['code'], event['content'])
+        if event is not None and event['code'] != RobotErrorType.RobotError_SUCC:
+            logger.error("{0} failed, event code={1}".format(name, event['code']))
+            self.raise_error(RobotErrorType.RobotError_LIFECYCLE_FAILED, event['code'],
+                             "{0} failed: {1}".format(name, event['content']))
+        return result
+
+    def __register_events(self):
+        # The completion waits need the events whether or not a callback is set with set_robot_event_callback
+        if not self.__events_registered:
+            result = libpyauboi5.set_robot_event_callback(self.rshd, self.__on_robot_event)
+            if result != RobotErrorType.RobotError_SUCC:
+                logger.error("set_robot_event_callback failed, result={0}".format(result))
+                return result
+            self.__events_registered = True
+        return RobotErrorType.RobotError_SUCC
+
+    def __wait_login(self, mark, start, timeout):
+        # No login event: the first get_robot_state the server answers acknowledges the session
+        result = self.__register_events()
+        if result != RobotErrorType.RobotError_SUCC:
+            return result
+        while libpyauboi5.get_robot_state(self.rshd) is None:
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0.0:
+                logger.error("login: no answer from the server within {0}s".format(timeout))
+                return RobotErrorType.RobotError_WAIT_TIMEOUT
+            if self.event_waiter.wait((RobotEventType.RobotEvent_socketDisconnected,), mark,
+                                      min(remaining, RobotDefaultParameters.login_poll_interval)) is not None:
+                logger.error("login: link lost before the server answered")
+                return RobotErrorType.RobotError_LOGIN_FAILED
+        return RobotErrorType.RobotError_SUCC
+
     def enable_robot_event(self):
         self.check_event()
         if self.rshd >= 0 and self.connected:
@@ -634,9 +987,18 @@ class Auboi5Robot:
         *
         * NOTES: After the call is successful, the system will automatically clean up the previously set user coordinate system,
         * Speed, acceleration and other attributes
+        * The cached RobotParameterCache.MOVE_PROFILE parameters are dropped: the library does not report the
+        * defaults the controller restores, the next get_* query reads them once
         """
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.init_global_move_profile(self.rshd)
+            result = libpyauboi5.init_global_move_profile(self.rshd)
+            if result == RobotErrorType.RobotError_SUCC:
+                self.user_frame = None
+                self.invalidate_parameter_cache(RobotParameterCache.MOVE_PROFILE)
+                for slot in RobotSessionSettings.MOVE_PROFILE:
+                    self.session_settings.pop(slot, None)
+                self.record_setting(result, 'init_profile')
+            return result
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -653,7 +1015,9 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_joint_maxacc(self.rshd, joint_maxacc)
+            result = libpyauboi5.set_joint_maxacc(self.rshd, joint_maxacc)
+            self.__store_parameter(result, 'joint_maxacc', tuple(joint_maxacc))
+            return self.record_setting(result, 'set_joint_maxacc', joint_maxacc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -666,11 +1030,11 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: Maximum acceleration unit of six joints (rad/s^2)
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_joint_maxacc(self.rshd)
+            return self.__query_parameter('joint_maxacc', libpyauboi5.get_joint_maxacc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -687,7 +1051,9 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_joint_maxvelc(self.rshd, joint_maxvelc)
+            result = libpyauboi5.set_joint_maxvelc(self.rshd, joint_maxvelc)
+            self.__store_parameter(result, 'joint_maxvelc', tuple(joint_maxvelc))
+            return self.record_setting(result, 'set_joint_maxvelc', joint_maxvelc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -700,11 +1066,11 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: Maximum speed of six joints (rad/s)
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_joint_maxvelc(self.rshd)
+            return self.__query_parameter('joint_maxvelc', libpyauboi5.get_joint_maxvelc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -721,7 +1087,9 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_end_max_line_acc(self.rshd, end_maxacc)
+            result = self.__store_parameter(libpyauboi5.set_end_max_line_acc(self.rshd, end_maxacc), 'end_max_line_acc',
+                                            end_maxacc)
+            return self.record_setting(result, 'set_end_max_line_acc', end_maxacc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -734,11 +1102,11 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: the maximum acceleration at the end of the robot arm, unit (m/s^2)
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_end_max_line_acc(self.rshd)
+            return self.__query_parameter('end_max_line_acc', libpyauboi5.get_end_max_line_acc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -755,7 +1123,9 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_end_max_line_velc(self.rshd, end_maxvelc)
+            result = self.__store_parameter(libpyauboi5.set_end_max_line_velc(self.rshd, end_maxvelc),
+                                            'end_max_line_velc', end_maxvelc)
+            return self.record_setting(result, 'set_end_max_line_velc', end_maxvelc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -768,11 +1138,11 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: Maximum speed at the end of the robotic arm, unit (m/s)
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_end_max_line_velc(self.rshd)
+            return self.__query_parameter('end_max_line_velc', libpyauboi5.get_end_max_line_velc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -789,7 +1159,9 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_end_max_angle_acc(self.rshd, end_maxacc)
+            result = self.__store_parameter(libpyauboi5.set_end_max_angle_acc(self.rshd, end_maxacc),
+                                            'end_max_angle_acc', end_maxacc)
+            return self.record_setting(result, 'set_end_max_angle_acc', end_maxacc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -802,11 +1174,11 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: the maximum angular acceleration at the end of the robot arm, unit (m/s^2)
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_end_max_angle_acc(self.rshd)
+            return self.__query_parameter('end_max_angle_acc', libpyauboi5.get_end_max_angle_acc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -823,7 +1195,9 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_end_max_line_velc(self.rshd, end_maxvelc)
+            result = self.__store_parameter(libpyauboi5.set_end_max_angle_velc(self.rshd, end_maxvelc),
+                                            'end_max_angle_velc', end_maxvelc)
+            return self.record_setting(result, 'set_end_max_angle_velc', end_maxvelc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -836,43 +1210,49 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: Maximum speed at the end of the robotic arm, unit (rad/s)
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_end_max_line_velc(self.rshd)
+            return self.__query_parameter('end_max_angle_velc', libpyauboi5.get_end_max_angle_velc)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
 
     #zhar2_rem
-    def move_to_target_in_cartesian(self, pos, rpy_xyz):
+    def move_to_target_in_cartesian(self, pos, rpy_xyz, issync=True):
         """
         * FUNCTION: move_to_target_in_cartesian
         * DESCRIPTION: Given the Cartesian coordinate value and Euler angle, the manipulator axis moves to the target position and attitude
         * INPUTS: pos: position coordinates (x, y, z), unit (m)
         * rpy: Euler angle (rx, ry, rz), unit (degree)
+        * issync: wait until the motion is finished, False returns once it is started
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
         * Failure return: other
-        * NOTES:
+        * NOTES: The joints come from the local inverse_kin, so the motion is refused (RobotError_MODEL_MISMATCH)
+        * unless connect verified self.robot_model against this arm
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            # Degrees -> radians
-            rpy_xyz = [i / 180.0 * pi for i in rpy_xyz]
-            # Euler angle to quaternion
-            ori = libpyauboi5.rpy_to_quaternion(self.rshd, rpy_xyz)
+            if self.verified_robot_model is not True:
+                self.raise_error(RobotErrorType.RobotError_MODEL_MISMATCH, 0,
+                                 "robot_model {0} not verified against the connected arm".format(self.robot_model))
+
+            # Degrees -> radians, Euler angle to quaternion
+            ori = tuple(robot_transforms.rpy_to_quaternion(np.radians(rpy_xyz))[0].tolist())
 
             # Inverse calculation to get the joint angle
             joint_radian = libpyauboi5.get_current_waypoint(self.rshd)
 
-            ik_result = libpyauboi5.inverse_kin(self.rshd, joint_radian['joint'], pos, ori)
+            ik_result = self.inverse_kin(joint_radian['joint'], pos, ori)
+            if ik_result is None:
+                self.raise_error(RobotErrorType.RobotError_ERROR_ARGS, 0, "inverse kinematics has no solution")
 
             logging.info("ik_result====>{0}".format(ik_result))
             
             # Axis moves to the target position
-            result = libpyauboi5.move_joint(self.rshd, ik_result["joint"])
+            result = libpyauboi5.move_joint(self.rshd, ik_result["joint"], issync)
             if result != RobotErrorType.RobotError_SUCC:
                 self.raise_error(RobotErrorType.RobotError_Move, result, "move error")
             else:
@@ -886,6 +1266,7 @@ class Auboi5Robot:
         * FUNCTION: move_joint
         * DESCRIPTION: Robotic arm axis moves
         * INPUTS: joint_radian: joint angle of six joints, unit (rad)
+        * issync: wait until the motion is finished, False returns once it is started
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
         * Failure return: other
@@ -948,7 +1329,8 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.move_rotate(self.rshd, user_coord, rotate_axis, rotate_angle)
+            return libpyauboi5.move_rotate(self.rshd, robot_frames.as_user_coord_dict(user_coord),
+                                           rotate_axis, rotate_angle)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1006,6 +1388,133 @@ class Auboi5Robot:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
 
+    def validate_trajectory(self, waypoints, period=robot_trajectory.OFFLINE_TRACK_PERIOD, max_jump=None):
+        """
+        * FUNCTION: validate_trajectory
+        * DESCRIPTION: Check a joint trajectory against the joint range and the current joint limits
+        * before it is sent with move_track, append_offline_track_waypoint or move_joint
+        * INPUTS: waypoints: (N, 6) array, unit (rad)
+        * period: time between waypoints, unit (s)
+        * max_jump: maximum step between consecutive waypoints, scalar or six values (rad), None to skip
+        * OUTPUTS:
+        * RETURNS: robot_trajectory.TrajectoryReport with per waypoint violation flags
+        * NOTES: joint_maxvelc / joint_maxacc come from self.parameter_cache, whatever its mode; they are read from
+        * the server once and cached until set_joint_maxvelc, set_joint_maxacc, init_profile, connect or disconnect.
+        * Velocity and acceleration are not checked while the handle is not logged in.
+        * Raises RobotError_MODEL_MISMATCH when connect found self.robot_model not to match the arm
+        """
+        self.__check_robot_model('validate_trajectory')
+        joint_maxvelc, joint_maxacc = self.__load_joint_limits()
+        return robot_trajectory.validate_trajectory(waypoints, period, joint_maxvelc, joint_maxacc, max_jump,
+                                                    model=self.robot_model)
+
+    def time_parameterize_track(self, path, velocity_scale=1.0, acceleration_scale=1.0,
+                                period=robot_trajectory.OFFLINE_TRACK_PERIOD):
+        """
+        * FUNCTION: time_parameterize_track
+        * DESCRIPTION: Time a geometric joint path as fast as the current joint limits allow and
+        * resample it for upload_offline_track
+        * INPUTS: path: (N, 6) joint path, unit (rad)
+        * velocity_scale, acceleration_scale: fraction of joint_maxvelc / joint_maxacc to use, (0, 1]
+        * period: track period of the controller, unit (s)
+        * OUTPUTS:
+        * RETURNS: Successful return: robot_trajectory.TimedTrajectory, waypoints ready for upload_offline_track
+        * Failure return: None
+        * NOTES: Uses the same cached joint limits as validate_trajectory
+        """
+        joint_maxvelc, joint_maxacc = self.__load_joint_limits()
+        if joint_maxvelc is None or joint_maxacc is None:
+            logger.error("joint maxvelc / maxacc unavailable!")
+            return None
+        return robot_trajectory.time_parameterize(path, joint_maxvelc, joint_maxacc, period, velocity_scale,
+                                                  acceleration_scale)
+
+    def __load_joint_limits(self):
+        limits = []
+        for name, query in (('joint_maxvelc', 'get_joint_maxvelc'), ('joint_maxacc', 'get_joint_maxacc')):
+            with self.handle_lock:
+                value = self.parameter_cache.get(name)
+            if value is None and self.rshd >= 0 and self.connected and \
+                    self.parameter_cache_mode != RobotParameterCacheMode.CachedOnly:
+                value = getattr(libpyauboi5, query)(self.rshd)
+                if value is not None:
+                    with self.handle_lock:
+                        value = self.parameter_cache.setdefault(name, tuple(value))
+            limits.append(value)
+        return limits
+
+    def upload_offline_track(self, waypoints, chunk_size=robot_track.OFFLINE_TRACK_MAX_CHUNK, startup=True):
+        """
+        * FUNCTION: upload_offline_track
+        * DESCRIPTION: Stream any number of non-online trajectory waypoints to the server
+        * INPUTS: waypoints: (N, 6) array or any iterable of waypoints, unit: radians
+        * chunk_size: waypoints per append_offline_track_waypoint call, at most 2999
+        * startup: start the non-online trajectory movement after the upload
+        * OUTPUTS:
+        * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Failure return: other
+        * NOTES: Calls clear_offline_track first. The next chunk is packed on a worker thread while
+        * the current one is transferred. If a chunk fails the partial track is cleared again.
+        * Throughput is logged and kept in self.last_track_upload (robot_track.TrackUploadStats).
+        """
+        self.check_event()
+        if self.rshd >= 0 and self.connected:
+            result = libpyauboi5.clear_offline_track(self.rshd)
+            if result != RobotErrorType.RobotError_SUCC:
+                return result
+
+            stats = robot_track.TrackUploadStats()
+            self.last_track_upload = stats
+            try:
+                result = robot_track.stream_track_chunks(
+                    waypoints, lambda chunk: libpyauboi5.append_offline_track_waypoint(self.rshd, chunk),
+                    chunk_size, stats)
+            except Exception:
+                libpyauboi5.clear_offline_track(self.rshd)
+                raise
+            logger.info("offline track upload: {0}".format(stats))
+            if result != RobotErrorType.RobotError_SUCC:
+                logger.error("append offline track failed after {0} waypoints, result={1}".format(
+                    stats.waypoints, result))
+                libpyauboi5.clear_offline_track(self.rshd)
+                return result
+
+            if startup:
+                self.check_event()
+                return libpyauboi5.startup_offline_track(self.rshd)
+            return RobotErrorType.RobotError_SUCC
+        else:
+            logger.warn("RSHD uninitialized or not login!!!")
+            return RobotErrorType.RobotError_NotLogin
+
+    def upload_offline_track_file(self, track_file, chunk_size=robot_track.OFFLINE_TRACK_MAX_CHUNK, startup=True):
+        """
+        * FUNCTION: upload_offline_track_file
+        * DESCRIPTION: Stream a binary track file to the server through upload_offline_track
+        * INPUTS: track_file: binary track file, see robot_track.write_track_binary
+        * chunk_size: waypoints per append_offline_track_waypoint call, at most 2999
+        * startup: start the non-online trajectory movement after the upload
+        * OUTPUTS:
+        * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Failure return: other
+        * NOTES: The payload is memory-mapped and sliced into chunks without copying the file.
+        * Text files are passed to append_offline_track_file unchanged.
+        """
+        if not robot_track.is_track_binary(track_file):
+            result = self.clear_offline_track()
+            if result != RobotErrorType.RobotError_SUCC:
+                return result
+            result = self.append_offline_track_file(track_file)
+            if result != RobotErrorType.RobotError_SUCC or not startup:
+                return result
+            return self.startup_offline_track()
+        try:
+            track = robot_track.open_track_binary(track_file)
+        except ValueError as e:
+            logger.error("invalid track file: {0}".format(e))
+            return RobotErrorType.RobotError_ERROR_ARGS
+        return self.upload_offline_track(track, chunk_size, startup)
+
     def startup_offline_track(self):
         """
         * FUNCTION: startup_offline_track
@@ -1138,7 +1647,8 @@ class Auboi5Robot:
         self.check_event()
         if self.rshd >= 0 and self.connected:
             if 0.01 >= blend_radius <= 0.05:
-                return libpyauboi5.set_blend_radius(self.rshd, blend_radius)
+                result = libpyauboi5.set_blend_radius(self.rshd, blend_radius)
+                return self.record_setting(result, 'set_blend_radius', blend_radius)
             else:
                 logger.warn("blend radius value range must be 0.01~0.05")
                 return RobotErrorType.RobotError_ERROR_ARGS
@@ -1160,7 +1670,8 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_circular_loop_times(self.rshd, circular_count)
+            result = libpyauboi5.set_circular_loop_times(self.rshd, circular_count)
+            return self.record_setting(result, 'set_circular_loop_times', circular_count)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1183,11 +1694,20 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
         * Failure return: other
-        * NOTES:
+        * NOTES: user_coord may also be a UserFrame, see compile_user_coord. The controller is not called
+        * again while the same frame is applied (counted in self.user_coord_skipped).
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_user_coord(self.rshd, user_coord)
+            frame = self.compile_user_coord(user_coord)
+            if frame == self.user_frame:
+                self.user_coord_skipped += 1
+                return RobotErrorType.RobotError_SUCC
+            result = libpyauboi5.set_user_coord(self.rshd, frame.user_coord)
+            if result == RobotErrorType.RobotError_SUCC:
+                self.user_frame = frame
+                self.invalidate_ik_cache()
+            return self.record_setting(result, 'set_user_coord', frame)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1204,7 +1724,11 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_base_coord(self.rshd)
+            result = libpyauboi5.set_base_coord(self.rshd)
+            if result == RobotErrorType.RobotError_SUCC:
+                self.user_frame = None
+                self.invalidate_ik_cache()
+            return self.record_setting(result, 'set_base_coord')
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1227,9 +1751,21 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: reasonable return: RobotError.RobotError_SUCC
         * Unreasonable return: other
-        * NOTES:
+        * NOTES: user_coord may also be a UserFrame, see compile_user_coord
+        """
+        return libpyauboi5.check_user_coord(self.rshd, robot_frames.as_user_coord_dict(user_coord))
+
+    def compile_user_coord(self, user_coord):
         """
-        return libpyauboi5.check_user_coord(self.rshd, user_coord)
+        * FUNCTION: compile_user_coord
+        * DESCRIPTION: Compile a user coordinate system dict into a UserFrame
+        * INPUTS: user_coord: user coordinate system, see set_user_coord
+        * OUTPUTS:
+        * RETURNS: robot_frames.UserFrame, hashable, its transform is computed once and cached
+        * NOTES: Pass the UserFrame instead of the dict to move_rotate, set_user_coord,
+        * set_relative_offset_on_user, check_user_coord and the frame conversions to skip rebuilding it
+        """
+        return robot_frames.UserFrame.from_user_coord(user_coord, self.robot_model)
 
     def set_relative_offset_on_base(self, relative_pos, relative_ori):
         """
@@ -1274,7 +1810,8 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_relative_offset_on_user(self.rshd, relative_pos, relative_ori, user_coord)
+            return libpyauboi5.set_relative_offset_on_user(self.rshd, relative_pos, relative_ori,
+                                                           robot_frames.as_user_coord_dict(user_coord))
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1296,7 +1833,7 @@ class Auboi5Robot:
             if result != 0:
                 self.raise_error(RobotErrorType.RobotError_Move, result, "set no arrival ahead error")
             else:
-                return RobotErrorType.RobotError_SUCC
+                return self.record_setting(RobotErrorType.RobotError_SUCC, 'set_no_arrival_ahead')
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1318,7 +1855,7 @@ class Auboi5Robot:
             if result != 0:
                 self.raise_error(RobotErrorType.RobotError_Move, result, "set arrival ahead distance error")
             else:
-                return RobotErrorType.RobotError_SUCC
+                return self.record_setting(RobotErrorType.RobotError_SUCC, 'set_arrival_ahead_distance', distance)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1340,7 +1877,7 @@ class Auboi5Robot:
             if result != 0:
                 self.raise_error(RobotErrorType.RobotError_Move, result, "set arrival ahead time error")
             else:
-                return RobotErrorType.RobotError_SUCC
+                return self.record_setting(RobotErrorType.RobotError_SUCC, 'set_arrival_ahead_time', sec)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1362,7 +1899,7 @@ class Auboi5Robot:
             if result != 0:
                 self.raise_error(RobotErrorType.RobotError_Move, result, "set arrival ahead blend error")
             else:
-                return RobotErrorType.RobotError_SUCC
+                return self.record_setting(RobotErrorType.RobotError_SUCC, 'set_arrival_ahead_blend', distance)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1402,13 +1939,52 @@ class Auboi5Robot:
         *
         * NOTES: Six joint angles {'joint': [1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
         * Position'pos': [-0.06403157614989634, -0.4185973810159096, 0.816883228463401],
-        * Attitude'ori': [-0.11863209307193756, 0.3820514380931854, 0.0, 0.9164950251579285]}
-        """
-        if self.rshd >= 0:
-            return libpyauboi5.forward_kin(self.rshd, joint_radian)
-        else:
-            logger.warn("RSHD uninitialized or not login!!!")
+        * Attitude'ori': [0.11863209307193756, -0.3820514380931854, 0.0, -0.9164950251579285]}
+        * Computed locally by robot_kinematics.forward_kin_batch for self.robot_model, no controller
+        * connection required. The quaternion is normalized to w >= 0, the controller may return -q.
+        * Pass the model of the arm to Auboi5Robot(robot_model=...); raises RobotError_MODEL_MISMATCH when connect
+        * found that it does not match the connected arm, see verify_robot_model
+        """
+        self.__check_robot_model('forward_kin')
+        if len(joint_radian) != 6:
+            logger.warn("joint_radian must contain six joint angles!!!")
             return None
+        pos, ori = robot_kinematics.forward_kin_batch(joint_radian, self.robot_model)
+        return {'joint': list(joint_radian), 'pos': pos[0].tolist(), 'ori': ori[0].tolist()}
+
+    def verify_robot_model(self):
+        """
+        * FUNCTION: verify_robot_model
+        * DESCRIPTION: Check that self.robot_model describes the connected arm
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None when the local forward kinematics match the controller, otherwise the reason
+        * NOTES: Called by connect. forward_kin, inverse_kin, move_to_target_in_cartesian, validate_trajectory and
+        * the frame conversions compute locally with self.robot_model, a wrong model would give wrong poses and
+        * motions without any error. Sets self.verified_robot_model to the result, None when the controller
+        * could not answer
+        """
+        self.verified_robot_model = None
+        joint = RobotDefaultParameters.model_check_joint
+        reference = libpyauboi5.forward_kin(self.rshd, joint)
+        if reference is None:
+            return "controller forward_kin failed, robot_model {0} not verified".format(self.robot_model)
+        pos, ori = robot_kinematics.forward_kin_batch(joint, self.robot_model)
+        error = float(np.linalg.norm(pos[0] - np.asarray(reference['pos'], dtype=np.float64)))
+        # q and -q are the same attitude
+        alignment = abs(float(np.dot(ori[0], np.asarray(reference['ori'], dtype=np.float64))))
+        if error > RobotDefaultParameters.model_check_tolerance or alignment < 1.0 - 1e-6:
+            self.verified_robot_model = False
+            return "robot_model {0} does not match the connected arm: flange position off by {1:.4f} m".format(
+                self.robot_model, error)
+        self.verified_robot_model = True
+        return None
+
+    def __check_robot_model(self, name):
+        if self.verified_robot_model is False:
+            self.raise_error(RobotErrorType.RobotError_MODEL_MISMATCH, 0,
+                             "robot_model {0} does not match the connected arm, {1} refused".format(
+                                 self.robot_model, name))
 
     def inverse_kin(self, joint_radian=(0.000000, 0.000000, 0.000000, 0.000000, 0.000000, 0.000000),
                     pos=(0.0, 0.0, 0.0), ori=(1.0, 0.0, 0.0, 0.0)):
@@ -1425,12 +2001,101 @@ class Auboi5Robot:
         * NOTES: Six joint angles {'joint': [1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
         * Position'pos': [-0.06403157614989634, -0.4185973810159096, 0.816883228463401],
         * Attitude'ori': [-0.11863209307193756, 0.3820514380931854, 0.0, 0.9164950251579285]}
+        * Solved locally by robot_kinematics.inverse_kin_all for self.robot_model, no controller
+        * connection required. Of the (up to 8) closed-form branches the one nearest to joint_radian
+        * is returned, see robot_kinematics.select_nearest_solution.
+        * The pose is the flange pose, the tool is not taken into account (as by the controller's inverse_kin).
+        * Results are cached in self.ik_cache by quantized pose, tool, user frame, model and the branch of
+        * joint_radian.
+        * Raises RobotError_MODEL_MISMATCH when connect found self.robot_model not to match the arm
+        """
+        self.__check_robot_model('inverse_kin')
+        branch = robot_kinematics.ik_branch(joint_radian, self.robot_model)
+        key = self.ik_cache.make_key(pos, ori, self.ik_cache_tool, self.user_frame, self.robot_model, branch)
+        joint = self.ik_cache.lookup(key)
+        if joint is None:
+            solutions, valid = robot_kinematics.inverse_kin_all(pos, ori, self.robot_model)
+            joints, found, _ = robot_kinematics.select_nearest_solution(solutions, valid, joint_radian,
+                                                                        self.robot_model)
+            if not found[0]:
+                logger.warn("inverse kinematics has no solution, pos={0}, ori={1}".format(pos, ori))
+                return None
+            joint = tuple(joints[0].tolist())
+            self.ik_cache.store(key, joint)
+        return {'joint': list(joint), 'pos': list(pos), 'ori': list(ori)}
+
+    def record_setting(self, result, method, *args):
+        """
+        * FUNCTION: record_setting
+        * DESCRIPTION: Remember a successfully applied setter call in self.session_settings
+        * INPUTS: result: result code of the call
+        * method: Auboi5Robot method name, args: its arguments
+        * OUTPUTS:
+        * RETURNS: result
+        * NOTES: Setters of one RobotSessionSettings.GROUP share a slot; a re-applied slot moves to the end
         """
-        if self.rshd >= 0:
-            return libpyauboi5.inverse_kin(self.rshd, joint_radian, pos, ori)
-        else:
-            logger.warn("RSHD uninitialized or not login!!!")
+        if result == RobotErrorType.RobotError_SUCC:
+            slot = RobotSessionSettings.GROUP.get(method, method)
+            self.session_settings.pop(slot, None)
+            self.session_settings[slot] = (method, args)
+        return result
+
+    def invalidate_ik_cache(self):
+        """
+        * FUNCTION: invalidate_ik_cache
+        * DESCRIPTION: Clear the inverse kinematics cache after a tool or user frame change
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Called by set_tool_kinematics_param, set_none_tool_kinematics_param, set_user_coord and
+        * set_base_coord
+        """
+        self.ik_cache.invalidate()
+
+    def invalidate_parameter_cache(self, names=None):
+        """
+        * FUNCTION: invalidate_parameter_cache
+        * DESCRIPTION: Forget cached controller parameters, the next get_* query reads them from the server
+        * INPUTS: names: RobotParameterCache.PARAMETERS names to forget, None for all of them
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Called by connect, disconnect and init_profile. Call it after another client (e.g. the teach
+        * pendant) changed the parameters behind this handle's back
+        """
+        with self.handle_lock:
+            if names is None:
+                self.parameter_cache = {}
+            else:
+                self.parameter_cache = {name: value for name, value in self.parameter_cache.items()
+                                        if name not in names}
+
+    def __query_parameter(self, name, query):
+        # The getters are READ_ONLY: parameter_cache and parameter_cache_hits are only touched under handle_lock,
+        # the controller is queried outside it
+        mode = self.parameter_cache_mode
+        with self.handle_lock:
+            if mode != RobotParameterCacheMode.Off and name in self.parameter_cache:
+                self.parameter_cache_hits += 1
+                return copy.deepcopy(self.parameter_cache[name])
+        if mode == RobotParameterCacheMode.CachedOnly:
             return None
+        value = query(self.rshd)
+        if value is not None:
+            with self.handle_lock:
+                # A setter that completed meanwhile holds the newer value
+                if mode == RobotParameterCacheMode.Off:
+                    self.parameter_cache[name] = copy.deepcopy(value)
+                else:
+                    self.parameter_cache.setdefault(name, copy.deepcopy(value))
+        return value
+
+    def __store_parameter(self, result, name, value):
+        if result == RobotErrorType.RobotError_SUCC:
+            self.parameter_cache[name] = copy.deepcopy(value)
+        else:
+            # The controller may or may not have applied it
+            self.parameter_cache.pop(name, None)
+        return result
 
     def base_to_user(self, pos, ori, user_coord, user_tool):
         """
@@ -1455,9 +2120,46 @@ class Auboi5Robot:
         * RETURNS: Successful return: return position and posture {"pos": (x, y, z), "ori": (w, x, y, z)}
         * Failure return: None
         *
-        * NOTES:
+        * NOTES: Delegates to base_to_user_batch
         """
-        return libpyauboi5.base_to_user(self.rshd, pos, ori, user_coord, user_tool)
+        result = self.base_to_user_batch([pos], [ori], user_coord, user_tool)
+        if result is None:
+            return None
+        return {"pos": result[0][0].tolist(), "ori": result[1][0].tolist()}
+
+    def base_to_user_batch(self, pos, ori, user_coord, user_tool):
+        """
+        * FUNCTION: base_to_user_batch
+        * DESCRIPTION: Batched base_to_user
+        * INPUTS: pos: flange center positions on the base frame, shape (N, 3), unit (m)
+        * ori: flange center attitudes on the base frame (w, x, y, z), shape (N, 4)
+        * user_coord: user coordinate system, see base_to_user
+        * user_tool user tool description
+        * user_tool={"pos": (x, y, z), "ori": (w, x, y, z)}
+        * OUTPUTS:
+        * RETURNS: Successful return: tool end positions (N, 3) and attitudes (N, 4) on the user frame
+        * Failure return: None
+        *
+        * NOTES: The user frame is resolved once into a cached transform (robot_frames.resolve_user_coord),
+        * no controller round trip. The end coordinate type follows the arm and falls back to libpyauboi5.
+        * A degenerate user frame or a failed library call gives None in both cases. The local conversion raises
+        * RobotError_MODEL_MISMATCH when connect found self.robot_model not to match the arm
+        """
+        coord = robot_frames.as_user_coord_dict(user_coord)
+        if coord['coord_type'] == RobotCoordType.Robot_End_Coordinate:
+            results = [libpyauboi5.base_to_user(self.rshd, tuple(p), tuple(o), coord, user_tool)
+                       for p, o in zip(np.atleast_2d(pos), np.atleast_2d(ori))]
+            if any(r is None for r in results):
+                logger.warn("base_to_user failed in the library")
+                return None
+            return (np.array([r['pos'] for r in results], dtype=np.float64).reshape(-1, 3),
+                    np.array([r['ori'] for r in results], dtype=np.float64).reshape(-1, 4))
+        self.__check_robot_model('base_to_user_batch')
+        try:
+            return robot_frames.base_to_user_batch(pos, ori, user_coord, user_tool, self.robot_model)
+        except ValueError as error:
+            logger.warn("base_to_user: {0}".format(error))
+            return None
 
     def user_to_base(self, pos, ori, user_coord, user_tool):
         """
@@ -1482,9 +2184,46 @@ class Auboi5Robot:
         * RETURNS: Successful return: return position and posture {"pos": (x, y, z), "ori": (w, x, y, z)}
         * Failure return: None
         *
-        * NOTES:
+        * NOTES: Delegates to user_to_base_batch
         """
-        return libpyauboi5.user_to_base(self.rshd, pos, ori, user_coord, user_tool)
+        result = self.user_to_base_batch([pos], [ori], user_coord, user_tool)
+        if result is None:
+            return None
+        return {"pos": result[0][0].tolist(), "ori": result[1][0].tolist()}
+
+    def user_to_base_batch(self, pos, ori, user_coord, user_tool):
+        """
+        * FUNCTION: user_to_base_batch
+        * DESCRIPTION: Batched user_to_base
+        * INPUTS: pos: tool end positions on the user frame, shape (N, 3), unit (m)
+        * ori: tool end attitudes on the user frame (w, x, y, z), shape (N, 4)
+        * user_coord: user coordinate system, see user_to_base
+        * user_tool user tool description
+        * user_tool={"pos": (x, y, z), "ori": (w, x, y, z)}
+        * OUTPUTS:
+        * RETURNS: Successful return: flange center positions (N, 3) and attitudes (N, 4) on the base frame
+        * Failure return: None
+        *
+        * NOTES: The user frame is resolved once into a cached transform (robot_frames.resolve_user_coord),
+        * no controller round trip. The end coordinate type follows the arm and falls back to libpyauboi5.
+        * A degenerate user frame or a failed library call gives None in both cases. The local conversion raises
+        * RobotError_MODEL_MISMATCH when connect found self.robot_model not to match the arm
+        """
+        coord = robot_frames.as_user_coord_dict(user_coord)
+        if coord['coord_type'] == RobotCoordType.Robot_End_Coordinate:
+            results = [libpyauboi5.user_to_base(self.rshd, tuple(p), tuple(o), coord, user_tool)
+                       for p, o in zip(np.atleast_2d(pos), np.atleast_2d(ori))]
+            if any(r is None for r in results):
+                logger.warn("user_to_base failed in the library")
+                return None
+            return (np.array([r['pos'] for r in results], dtype=np.float64).reshape(-1, 3),
+                    np.array([r['ori'] for r in results], dtype=np.float64).reshape(-1, 4))
+        self.__check_robot_model('user_to_base_batch')
+        try:
+            return robot_frames.user_to_base_batch(pos, ori, user_coord, user_tool, self.robot_model)
+        except ValueError as error:
+            logger.warn("user_to_base: {0}".format(error))
+            return None
 
     def base_to_base_additional_tool(self, flange_pos, flange_ori, user_tool):
         """
@@ -1498,26 +2237,44 @@ class Auboi5Robot:
         * RETURNS: Successful return: Return the tool end position and posture information based on the base standard system {"pos": (x, y, z), "ori": (w, x, y, z)}
         * Failure return: None
         *
-        * NOTES:
+        * NOTES: Delegates to base_to_base_additional_tool_batch
+        """
+        pos, ori = self.base_to_base_additional_tool_batch([flange_pos], [flange_ori], user_tool)
+        return {"pos": pos[0].tolist(), "ori": ori[0].tolist()}
+
+    @staticmethod
+    def base_to_base_additional_tool_batch(flange_pos, flange_ori, user_tool):
+        """
+        * FUNCTION: base_to_base_additional_tool_batch
+        * DESCRIPTION: Batched base_to_base_additional_tool
+        * INPUTS: flange_pos: flange center positions on the base frame, shape (N, 3), unit (m)
+        * flange_ori: flange center attitudes on the base frame (w, x, y, z), shape (N, 4)
+        * user_tool user tool description
+        * user_tool={"pos": (x, y, z), "ori": (w, x, y, z)}
+        * OUTPUTS:
+        * RETURNS: tool end positions (N, 3) and attitudes (N, 4) on the base frame
+        *
+        * NOTES: Computed locally, no controller round trip
         """
-        return libpyauboi5.base_to_base_additional_tool(self.rshd, flange_pos, flange_ori, user_tool)
+        return robot_frames.base_to_base_additional_tool_batch(flange_pos, flange_ori, user_tool)
 
     def rpy_to_quaternion(self, rpy):
         """
         * FUNCTION: rpy_to_quaternion
         * DESCRIPTION: Euler angle to quaternion
-        * INPUTS: rpy: Euler angle (rx, ry, rz), unit (m)
+        * INPUTS: rpy: Euler angle (rx, ry, rz), unit (rad)
         * OUTPUTS:
         * RETURNS: Successful return: quaternion result, the result is detailed in NOTES
         * Failure return: None
         *
         * NOTES: Four elements (w, x, y, z)
+        * Computed locally by robot_transforms.rpy_to_quaternion, no handle required.
+        * Use robot_transforms directly to convert arrays of orientations.
         """
-        if self.rshd >= 0:
-            return libpyauboi5.rpy_to_quaternion(self.rshd, rpy)
-        else:
-            logger.warn("RSHD uninitialized !!!")
+        if len(rpy) != 3:
+            logger.warn("rpy must contain three angles!!!")
             return None
+        return robot_transforms.rpy_to_quaternion(rpy)[0].tolist()
 
     def quaternion_to_rpy(self, ori):
         """
@@ -1528,13 +2285,14 @@ class Auboi5Robot:
         * RETURNS: Successful return: Euler angle result, see NOTES for details
         * Failure return: None
         *
-        * NOTES: rpy: Euler angle (rx, ry, rz), unit (m)
+        * NOTES: rpy: Euler angle (rx, ry, rz), unit (rad)
+        * Computed locally by robot_transforms.quaternion_to_rpy, no handle required.
+        * Use robot_transforms directly to convert arrays of orientations.
         """
-        if self.rshd >= 0:
-            return libpyauboi5.quaternion_to_rpy(self.rshd, ori)
-        else:
-            logger.warn("RSHD uninitialized !!!")
+        if len(ori) != 4:
+            logger.warn("ori must contain four elements!!!")
             return None
+        return robot_transforms.quaternion_to_rpy(ori)[0].tolist()
 
     def set_tool_end_param(self, tool_end_param):
         """
@@ -1549,7 +2307,8 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_tool_end_param(self.rshd, tool_end_param)
+            result = libpyauboi5.set_tool_end_param(self.rshd, tool_end_param)
+            return self.record_setting(result, 'set_tool_end_param', tool_end_param)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1567,7 +2326,10 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_none_tool_dynamics_param(self.rshd)
+            result = libpyauboi5.set_none_tool_dynamics_param(self.rshd)
+            if result == RobotErrorType.RobotError_SUCC:
+                self.invalidate_parameter_cache(('tool_dynamics_param',))
+            return self.record_setting(result, 'set_none_tool_dynamics_param')
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1588,7 +2350,9 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_tool_dynamics_param(self.rshd, tool_dynamics)
+            result = self.__store_parameter(libpyauboi5.set_tool_dynamics_param(self.rshd, tool_dynamics),
+                                            'tool_dynamics_param', tool_dynamics)
+            return self.record_setting(result, 'set_tool_dynamics_param', tool_dynamics)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1606,11 +2370,11 @@ class Auboi5Robot:
         *
         * Failure return: None
         *
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_tool_dynamics_param(self.rshd)
+            return self.__query_parameter('tool_dynamics_param', libpyauboi5.get_tool_dynamics_param)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1628,7 +2392,12 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_none_tool_kinematics_param(self.rshd)
+            result = libpyauboi5.set_none_tool_kinematics_param(self.rshd)
+            if result == RobotErrorType.RobotError_SUCC:
+                self.ik_cache_tool = None
+                self.invalidate_ik_cache()
+                self.invalidate_parameter_cache(('tool_kinematics_param',))
+            return self.record_setting(result, 'set_none_tool_kinematics_param')
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1646,7 +2415,12 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_tool_kinematics_param(self.rshd, tool_end_param)
+            result = libpyauboi5.set_tool_kinematics_param(self.rshd, tool_end_param)
+            if result == RobotErrorType.RobotError_SUCC:
+                self.ik_cache_tool = tuple(tool_end_param['pos']) + tuple(tool_end_param['ori'])
+                self.invalidate_ik_cache()
+            self.__store_parameter(result, 'tool_kinematics_param', tool_end_param)
+            return self.record_setting(result, 'set_tool_kinematics_param', tool_end_param)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1661,11 +2435,11 @@ class Auboi5Robot:
         * tool_end_param={"pos": (x, y, z), "ori": (w, x, y, z)}
         *
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_tool_kinematics_param(self.rshd)
+            return self.__query_parameter('tool_kinematics_param', libpyauboi5.get_tool_kinematics_param)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1729,11 +2503,16 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
         * Failure return: other
-        * NOTES:
+        * NOTES: Allowed while an error that ends on recovery is pending, which is cleared on success
         """
-        self.check_event()
+        self.check_event(recovering=True)
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.collision_recover(self.rshd)
+            error = self.last_error
+            result = libpyauboi5.collision_recover(self.rshd)
+            if result == RobotErrorType.RobotError_SUCC and error.error_type != RobotErrorType.RobotError_SUCC and \
+                    robot_event_info(error.error_type).clear_on_recover:
+                self.last_error = RobotError()
+            return result
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_NotLogin
@@ -1842,7 +2621,7 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_work_mode(self.rshd, mode)
+            return self.__store_parameter(libpyauboi5.set_work_mode(self.rshd, mode), 'work_mode', mode)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_LOGIN_FAILED
@@ -1860,11 +2639,11 @@ class Auboi5Robot:
         * Robot real mode: RobotRunningMode.RobotModeReal
         *
         * Failure return: None
-        * NOTES:
+        * NOTES: Answered from self.parameter_cache according to self.parameter_cache_mode
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.get_work_mode(self.rshd)
+            return self.__query_parameter('work_mode', libpyauboi5.get_work_mode)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return None
@@ -1881,7 +2660,8 @@ class Auboi5Robot:
         """
         self.check_event()
         if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_collision_class(self.rshd, grade)
+            result = libpyauboi5.set_collision_class(self.rshd, grade)
+            return self.record_setting(result, 'set_collision_class', grade)
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_LOGIN_FAILED
@@ -2204,15 +2984,38 @@ class Auboi5Robot:
         * OUTPUTS:
         * RETURNS: Successful return: RobotError.RobotError_SUCC
         * Failure return: other
-        * NOTES:
-        """
-        if self.rshd >= 0 and self.connected:
-            return libpyauboi5.set_robot_event_callback(self.rshd, callback)
+        * NOTES: connect registers the library callback, which passes the events to self.event_waiter on the
+        * library thread; callback replaces the previous one on the thread of self.event_dispatcher, None removes it.
+        * More callbacks: self.event_dispatcher.subscribe(callback, event_types),
+        * event_types e.g. robot_event_types(min_severity=RobotEventSeverity.WARNING)
+        """
+        if self.rshd >= 0 and self.connected:
+            result = self.__register_events()
+            self.event_dispatcher.unsubscribe(self.__event_token)
+            self.__event_token = None
+            self.event_callback = callback if result == RobotErrorType.RobotError_SUCC else None
+            if self.event_callback is not None:
+                self.__event_token = self.event_dispatcher.subscribe(self.event_callback)
+            return result
         else:
             logger.warn("RSHD uninitialized or not login!!!")
             return RobotErrorType.RobotError_LOGIN_FAILED
 
 
+def _handle_locked(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.handle_lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+for _name, _method in list(vars(Auboi5Robot).items()):
+    if callable(_method) and not _name.startswith('_') and _name not in \
+            RobotConcurrency.READ_ONLY + RobotConcurrency.CONTROL + RobotConcurrency.LOCAL:
+        setattr(Auboi5Robot, _name, _handle_locked(_method))
+
+
 # Test function
 def test(test_count):
     # Initialize logger
@@ -2770,13 +3573,26 @@ class GetRobotWaypointProcess(Process):
             Auboi5Robot.uninitialize()
             print("get waypoint run end-------------------------")
 
-def runWaypoint(queue):
-    while True:
-        # while not queue.empty():
-        print(queue.get(True))
+def runWaypoint(ring_name):
+    # Consumer process: zero-copy views of the shared telemetry ring, newest joint angles once per second
+    import robot_telemetry
+    ring = robot_telemetry.SharedTelemetryRing(ring_name)
+    reader = robot_telemetry.TelemetryReader(ring)
+    try:
+        while True:
+            time.sleep(1)
+            views = reader.read()
+            if views:
+                newest = views[-1][-1]
+                print("seq={0} joint={1} lost={2} intact={3}".format(
+                    int(newest['sequence']), newest['joint'], reader.lost, reader.valid()))
+    finally:
+        ring.close()
 
 
 def test_process_demo():
+    import robot_telemetry
+
     # Initialize logger
     logger_init()
 
@@ -2795,25 +3611,24 @@ def test_process_demo():
     # Print context
     logger.info("robot.rshd={0}".format(handle))
 
-    try:
-
-        # time.sleep(0.2)
-        # process_get_robot_current_status = GetRobotWaypointProcess()
-        # process_get_robot_current_status.daemon = True
-        # process_get_robot_current_status.start()
-        # time.sleep(0.2)
+    # Link server
+    #ip ='localhost'
+    ip = '192.168.1.200'
+    port = 8899
 
-        queue = Queue()
+    # One sampler process publishes the waypoints into shared memory, any number of processes read them
+    ring = robot_telemetry.SharedTelemetryRing(capacity=int(robot_telemetry.TELEMETRY_RATE * 10))
+    stop_event = Event()
+    sampler = Process(target=robot_telemetry.run_sampler_process,
+                      args=(ring.name, ip, port, robot_telemetry.TELEMETRY_RATE, 0, stop_event))
 
-        p = Process(target=runWaypoint, args=(queue,))
+    try:
+        sampler.start()
+        p = Process(target=runWaypoint, args=(ring.name,))
+        p.daemon = True
         p.start()
-        time.sleep(5)
         print("process started.")
 
-        # Link server
-        #ip ='localhost'
-        ip = '192.168.1.200'
-        port = 8899
         result = robot.connect(ip, port)
 
         if result != RobotErrorType.RobotError_SUCC:
@@ -2841,8 +3656,6 @@ def test_process_demo():
 
                 print("-----------------------------")
 
-                queue.put(joint_radian)
-
                 # time.sleep(5)
 
                 # process_get_robot_current_status.test()
@@ -2867,8 +3680,77 @@ def test_process_demo():
             robot.disconnect()
         # Release library resources
         Auboi5Robot.uninitialize()
+        stop_event.set()
+        sampler.join()
+        ring.close()
+        ring.unlink()
         print("run end-------------------------")
 
+def _library_reference(name):
+    # What the library results of the accuracy check below are: the simulator computes them with the local code
+    if name in getattr(libpyauboi5, 'SIM_SELF_CONSISTENT', ()):
+        logger.warn("libpyauboi5.{0} is simulated with the local code, its error is a self-consistency "
+                    "check only".format(name))
+        return 'self-consistency'
+    return 'libpyauboi5'
+
+
+def forward_kin_benchmark(test_count=100000, library_count=1000):
+    # Initialize logger
+    logger_init()
+
+    # Start test
+    logger.info("{0} forward kinematics benchmark beginning...".format(Auboi5Robot.get_local_time()))
+
+    # system initialization
+    Auboi5Robot.initialize()
+
+    # Create a robotic arm control class
+    robot = Auboi5Robot()
+
+    # Create context, the library forward solution only needs the handle, not a link
+    handle = robot.create_context()
+    logger.info("robot.rshd={0}".format(handle))
+
+    result = {}
+    try:
+        joint_limit = 175.0 / 180.0 * pi
+        joints = np.random.uniform(-joint_limit, joint_limit, (test_count, 6))
+
+        # Local batched forward solution
+        start = time.perf_counter()
+        pos, ori = robot_kinematics.forward_kin_batch(joints, robot.robot_model)
+        batch_time = time.perf_counter() - start
+        result['batch_poses_per_sec'] = test_count / batch_time
+
+        # Single pose wrapper
+        start = time.perf_counter()
+        for joint in joints[:library_count]:
+            robot.forward_kin(joint)
+        result['wrapper_poses_per_sec'] = library_count / (time.perf_counter() - start)
+
+        # Library forward solution, one FFI round trip per pose
+        if handle >= 0:
+            max_error = 0.0
+            start = time.perf_counter()
+            lib_results = [libpyauboi5.forward_kin(handle, tuple(joint)) for joint in joints[:library_count]]
+            result['library_poses_per_sec'] = library_count / (time.perf_counter() - start)
+            for i, lib_result in enumerate(lib_results):
+                max_error = max(max_error, float(np.abs(np.asarray(lib_result['pos']) - pos[i]).max()))
+            result['library_max_pos_error'] = max_error
+            result['library_reference'] = _library_reference('forward_kin')
+            result['speedup'] = result['batch_poses_per_sec'] / result['library_poses_per_sec']
+
+        logger.info("forward kinematics benchmark: {0}".format(result))
+
+    finally:
+        # Release library resources
+        Auboi5Robot.uninitialize()
+        logger.info("{0} benchmark completed.".format(Auboi5Robot.get_local_time()))
+
+    return result
+
+
 if __name__ =='__main__':
     #test_process_demo()
     
@@ -0,0 +1,308 @@
+#! /usr/bin/env python
+# coding=utf-8
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('main.robotcontrol')
+
+
+# Events held by EventDispatcher before the oldest ones are dropped
+EVENT_QUEUE_CAPACITY = 1024
+
+# Latency samples kept by EventDispatcher for its percentiles
+EVENT_LATENCY_SAMPLES = 4096
+
+
+class EventWaiter:
+    """
+    * Lets a thread block until the event callback delivers a given event type
+    * Every delivered event gets a sequence number; take mark() before issuing the command and pass it to wait(),
+    * so an event that arrives before wait() is called is not missed and an old one is not mistaken for it
+    """
+
+    def __init__(self):
+        self.__condition = threading.Condition()
+        self.__sequence = 0
+        # event type -> (sequence, event dict) of the latest event of that type
+        self.__latest = {}
+        # Called with every event after it is recorded, replaced as a whole so notify() needs no lock to read it
+        self.__listeners = ()
+
+    def notify(self, event):
+        """
+        * FUNCTION: notify
+        * DESCRIPTION: Record an event from the robot event callback and wake the waiting threads
+        * INPUTS: event: {'type': , 'code': , 'content': }
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        with self.__condition:
+            self.__sequence += 1
+            self.__latest[event['type']] = (self.__sequence, event)
+            self.__condition.notify_all()
+        for listener in self.__listeners:
+            listener(event)
+
+    def add_listener(self, listener):
+        """
+        * FUNCTION: add_listener
+        * DESCRIPTION: Call listener(event) for every event passed to notify()
+        * INPUTS: listener: callable, runs on the thread of the robot event callback and must not block
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        with self.__condition:
+            self.__listeners = self.__listeners + (listener,)
+
+    def remove_listener(self, listener):
+        """
+        * FUNCTION: remove_listener
+        * DESCRIPTION: Stop calling a listener registered with add_listener
+        * INPUTS: listener: callable
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        with self.__condition:
+            self.__listeners = tuple(item for item in self.__listeners if item != listener)
+
+    def mark(self):
+        """
+        * FUNCTION: mark
+        * DESCRIPTION: Sequence number of the last delivered event
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: sequence number to pass to wait()
+        * NOTES:
+        """
+        with self.__condition:
+            return self.__sequence
+
+    def wait(self, event_types, mark, timeout):
+        """
+        * FUNCTION: wait
+        * DESCRIPTION: Wait for one of the event types delivered after mark
+        * INPUTS: event_types: iterable of RobotEventType values
+        * mark: value of mark() taken before the command was sent
+        * timeout: maximum waiting time, unit (s), None to wait forever
+        * OUTPUTS:
+        * RETURNS: Successful return: the event dict
+        * Timeout: None
+        * NOTES:
+        """
+        event_types = tuple(event_types)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__condition:
+            while True:
+                found = None
+                for event_type in event_types:
+                    entry = self.__latest.get(event_type)
+                    if entry is not None and entry[0] > mark and (found is None or entry[0] < found[0]):
+                        found = entry
+                if found is not None:
+                    return found[1]
+                if deadline is None:
+                    self.__condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0.0:
+                        return None
+                    self.__condition.wait(remaining)
+
+
+class EventDispatcher:
+    """
+    * Moves robot event handling off the thread of the native library
+    * put() only appends a compact (type, code, content, time) record to a bounded queue; a dispatcher thread
+    * calls the subscribers, filtered by event type. When the queue is full the oldest record not protected by
+    * keep is dropped and counted, so a stalled handler never blocks the SDK event thread.
+    """
+
+    def __init__(self, capacity=EVENT_QUEUE_CAPACITY, latency_samples=EVENT_LATENCY_SAMPLES, keep=None):
+        self.capacity = capacity
+        # keep(event type) -> True for events dropped only when the queue holds nothing else, None to drop in order
+        self.keep = keep
+        self.__queue = deque()
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__running = False
+        # event type -> tuple of subscribers, None -> subscribers of every type; replaced as a whole
+        self.__subscribers = {}
+        self.__tokens = {}
+        self.__next_token = 0
+        # Records received, delivered to the subscribers, and dropped because the queue was full
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        # Largest queue length seen
+        self.high_water = 0
+        # Exceptions raised by subscribers
+        self.errors = 0
+        # Time from put() to the start of the dispatch, and time spent in one subscriber call, unit (s)
+        self.queue_latency = deque(maxlen=latency_samples)
+        self.callback_latency = deque(maxlen=latency_samples)
+
+    def put(self, event):
+        """
+        * FUNCTION: put
+        * DESCRIPTION: Queue an event for the dispatcher thread
+        * INPUTS: event: {'type': , 'code': , 'content': } as passed by the native library
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Never blocks on a subscriber, starts the dispatcher thread on first use
+        """
+        record = (event['type'], event['code'], event['content'], time.perf_counter())
+        with self.__condition:
+            self.received += 1
+            if len(self.__queue) >= self.capacity:
+                self.__drop_one()
+                self.dropped += 1
+            self.__queue.append(record)
+            self.high_water = max(self.high_water, len(self.__queue))
+            self.__running = True
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='aubo-events', daemon=True)
+                self.__thread.start()
+            self.__condition.notify_all()
+
+    def subscribe(self, callback, event_types=None):
+        """
+        * FUNCTION: subscribe
+        * DESCRIPTION: Call callback(event) on the dispatcher thread for the given event types
+        * INPUTS: callback: callable taking {'type': , 'code': , 'content': }
+        * event_types: iterable of RobotEventType values, None for every event
+        * OUTPUTS:
+        * RETURNS: token for unsubscribe()
+        * NOTES: Subscribers of the event type are called before the ones of every event
+        """
+        keys = (None,) if event_types is None else tuple(set(event_types))
+        with self.__condition:
+            self.__next_token += 1
+            token = self.__next_token
+            self.__tokens[token] = (callback, keys)
+            self.__rebuild()
+        return token
+
+    def unsubscribe(self, token):
+        """
+        * FUNCTION: unsubscribe
+        * DESCRIPTION: Remove a subscription
+        * INPUTS: token: value returned by subscribe()
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Unknown tokens are ignored
+        """
+        with self.__condition:
+            if self.__tokens.pop(token, None) is not None:
+                self.__rebuild()
+
+    def drain(self, timeout=None):
+        """
+        * FUNCTION: drain
+        * DESCRIPTION: Wait until every queued event has been delivered
+        * INPUTS: timeout: maximum waiting time, unit (s), None to wait forever
+        * OUTPUTS:
+        * RETURNS: True when the queue is empty, False on timeout
+        * NOTES: Must not be called from a subscriber
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__condition:
+            while self.__queue or self.delivered + self.dropped < self.received:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0.0:
+                    return False
+                self.__condition.wait(remaining)
+            return True
+
+    def stop(self, wait=True):
+        """
+        * FUNCTION: stop
+        * DESCRIPTION: Stop the dispatcher thread once the queued events are delivered
+        * INPUTS: wait: wait for the thread to finish
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: A later put() starts the thread again. Called from a subscriber, wait is ignored
+        """
+        with self.__condition:
+            self.__running = False
+            thread = self.__thread
+            self.__condition.notify_all()
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def stats(self):
+        """
+        * FUNCTION: stats
+        * DESCRIPTION: Queue counters and latency percentiles
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: {"received": , "delivered": , "dropped": , "queued": , "high_water": , "errors": ,
+        * "queue_p50": , "queue_p99": , "queue_max": , "callback_p50": , "callback_p99": , "callback_max": }
+        * NOTES: Latencies in (s) over the last EVENT_LATENCY_SAMPLES events, None before the first one
+        """
+        with self.__condition:
+            result = {"received": self.received, "delivered": self.delivered, "dropped": self.dropped,
+                      "queued": len(self.__queue), "high_water": self.high_water, "errors": self.errors}
+            samples = (("queue", sorted(self.queue_latency)), ("callback", sorted(self.callback_latency)))
+        for name, values in samples:
+            result[name + "_p50"] = values[len(values) // 2] if values else None
+            result[name + "_p99"] = values[min(len(values) - 1, int(len(values) * 0.99))] if values else None
+            result[name + "_max"] = values[-1] if values else None
+        return result
+
+    def __rebuild(self):
+        subscribers = {}
+        for callback, keys in self.__tokens.values():
+            for key in keys:
+                subscribers[key] = subscribers.get(key, ()) + (callback,)
+        self.__subscribers = subscribers
+
+    def __drop_one(self):
+        # Oldest event that keep() does not protect, the oldest of all when every queued event is protected
+        queue = self.__queue
+        if self.keep is not None and self.keep(queue[0][0]):
+            for position, record in enumerate(queue):
+                if not self.keep(record[0]):
+                    del queue[position]
+                    return
+        queue.popleft()
+
+    def __run(self):
+        condition = self.__condition
+        while True:
+            with condition:
+                while not self.__queue and self.__running:
+                    condition.wait()
+                if not self.__queue:
+                    # Cleared under the lock, put() starts a new thread from here on
+                    self.__thread = None
+                    return
+                event_type, code, content, queued = self.__queue.popleft()
+            subscribers = self.__subscribers
+            callbacks = subscribers.get(event_type, ()) + subscribers.get(None, ())
+            start = time.perf_counter()
+            waited = start - queued
+            event = {'type': event_type, 'code': code, 'content': content}
+            # Recorded under the lock below, stats() copies them under it
+            durations = []
+            errors = 0
+            for callback in callbacks:
+                try:
+                    callback(event)
+                except Exception as error:
+                    errors += 1
+                    logger.error("event subscriber {0} failed: {1}".format(callback, error))
+                end = time.perf_counter()
+                durations.append(end - start)
+                start = end
+            with condition:
+                self.queue_latency.append(waited)
+                self.callback_latency.extend(durations)
+                self.errors += errors
+                self.delivered += 1
+                if not self.__queue:
+                    condition.notify_all()
@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+# coding=utf-8
+import time
+from concurrent.futures import ThreadPoolExecutor
+from robot_control_en import Auboi5Robot, RobotDefaultParameters, RobotErrorType, logger
+from robot_kinematics import RobotModelType
+
+
+class ArmResult:
+    """
+    * Outcome of one fleet call on one arm
+    * value: return value of the call, None when it raised
+    * error: exception raised by the call, or RobotErrorType code when a result code call failed, None on success
+    * seconds: time spent in the call
+    """
+
+    def __init__(self, name, value=None, error=None, seconds=0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __str__(self):
+        if self.ok:
+            return "{0}: ok {1:.3f}s".format(self.name, self.seconds)
+        return "{0}: error {1} {2:.3f}s".format(self.name, self.error, self.seconds)
+
+
+class FleetReport:
+    """
+    * Results of one fleet call, {arm name: ArmResult}
+    """
+
+    def __init__(self, operation, results, seconds):
+        self.operation = operation
+        self.results = results
+        # Wall time of the whole fan-out, about the slowest arm rather than the sum
+        self.seconds = seconds
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    def __iter__(self):
+        return iter(self.results.values())
+
+    def __len__(self):
+        return len(self.results)
+
+    def __str__(self):
+        return "{0}: {1}/{2} ok in {3:.3f}s{4}".format(
+            self.operation, len(self.results) - len(self.errors()), len(self.results), self.seconds,
+            "".join("\n  {0}".format(result) for result in self.results.values() if not result.ok))
+
+    @property
+    def ok(self):
+        return all(result.ok for result in self.results.values())
+
+    def values(self):
+        return {name: result.value for name, result in self.results.items()}
+
+    def errors(self):
+        return {name: result.error for name, result in self.results.items() if not result.ok}
+
+    def latency(self):
+        return {name: result.seconds for name, result in self.results.items()}
+
+
+class RobotFleet:
+    """
+    * Runs the same operation on many arms in parallel, one Auboi5Robot handle per arm
+    * arms: {name: (ip, port)} or [(ip, port)], names default to "ip:port"
+    * Call Auboi5Robot.initialize() once before connect, as for a single robot.
+    * Every operation waits for all arms and returns a FleetReport; a failing arm never stops the others.
+    """
+
+    def __init__(self, arms, robot_model=RobotModelType.Aubo_i5, max_workers=None):
+        if not isinstance(arms, dict):
+            arms = {"{0}:{1}".format(ip, port): (ip, port) for ip, port in arms}
+        self.arms = dict(arms)
+        self.robots = {name: Auboi5Robot(robot_model) for name in self.arms}
+        self.__addresses = {id(self.robots[name]): address for name, address in self.arms.items()}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or max(len(self.arms), 1),
+                                           thread_name_prefix='aubo-fleet')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """
+        * FUNCTION: close
+        * DESCRIPTION: Log out all connected arms and release the worker threads
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: FleetReport of the disconnect
+        * NOTES:
+        """
+        report = self.disconnect()
+        self.executor.shutdown(wait=True)
+        return report
+
+    def map(self, function, names=None, result_code=False, operation=None):
+        """
+        * FUNCTION: map
+        * DESCRIPTION: Call function(robot) on every arm in parallel
+        * INPUTS: function: callable taking an Auboi5Robot
+        * names: arms to use, None for all
+        * result_code: the return value is a RobotErrorType code and anything but RobotError_SUCC is an error
+        * operation: name used in the report and the log
+        * OUTPUTS:
+        * RETURNS: FleetReport
+        * NOTES:
+        """
+        names = list(self.robots) if names is None else list(names)
+        operation = operation or getattr(function, '__name__', 'map')
+        start = time.monotonic()
+        futures = [(name, self.executor.submit(self.__call, name, function, result_code)) for name in names]
+        report = FleetReport(operation, {name: future.result() for name, future in futures},
+                             time.monotonic() - start)
+        if report.ok:
+            logger.info(str(report))
+        else:
+            logger.error(str(report))
+        return report
+
+    def call(self, method, *args, **kwargs):
+        """
+        * FUNCTION: call
+        * DESCRIPTION: Call an Auboi5Robot method with the same arguments on every arm
+        * INPUTS: method: method name, args / kwargs: its arguments
+        * OUTPUTS:
+        * RETURNS: FleetReport, values are the method return values
+        * NOTES: Methods returning a result code (set_*, init_profile, ...) are checked against RobotError_SUCC
+        """
+        result_code = method.startswith(('set_', 'init_', 'move_', 'robot_', 'enable_', 'collision_'))
+        return self.map(lambda robot: getattr(robot, method)(*args, **kwargs), result_code=result_code,
+                        operation=method)
+
+    def connect(self):
+        """
+        * FUNCTION: connect
+        * DESCRIPTION: Create the contexts and log in to every arm
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: FleetReport
+        * NOTES:
+        """
+        return self.map(self.__connect, result_code=True, operation='connect')
+
+    def disconnect(self):
+        """
+        * FUNCTION: disconnect
+        * DESCRIPTION: Log out of every connected arm
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: FleetReport
+        * NOTES:
+        """
+        return self.map(lambda robot: robot.disconnect() if robot.connected else RobotErrorType.RobotError_SUCC,
+                        result_code=True, operation='disconnect')
+
+    def robot_startup(self, collision=RobotDefaultParameters.collision_grade,
+                      tool_dynamics=RobotDefaultParameters.tool_dynamics,
+                      timeout=RobotDefaultParameters.startup_timeout):
+        return self.call('robot_startup', collision, tool_dynamics, timeout)
+
+    def robot_shutdown(self, timeout=RobotDefaultParameters.shutdown_timeout):
+        return self.call('robot_shutdown', timeout)
+
+    def init_profile(self):
+        return self.call('init_profile')
+
+    def set_params(self, **params):
+        """
+        * FUNCTION: set_params
+        * DESCRIPTION: Apply the same motion parameters to every arm
+        * INPUTS: params: setter name without "set_" and its value,
+        * e.g. joint_maxacc=(1.0,) * 6, joint_maxvelc=(1.0,) * 6, end_max_line_acc=0.5
+        * OUTPUTS:
+        * RETURNS: FleetReport, stops at the first failing setter on each arm
+        * NOTES:
+        """
+        setters = [(getattr(Auboi5Robot, 'set_' + name), value) for name, value in params.items()]
+
+        def apply(robot):
+            for setter, value in setters:
+                result = setter(robot, value)
+                if result != RobotErrorType.RobotError_SUCC:
+                    return result
+            return RobotErrorType.RobotError_SUCC
+        return self.map(apply, result_code=True, operation='set_params')
+
+    def get_status(self):
+        """
+        * FUNCTION: get_status
+        * DESCRIPTION: Read the state and current waypoint of every arm
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: FleetReport, values are {'robot_state': , 'waypoint': }
+        * NOTES:
+        """
+        return self.map(lambda robot: {'robot_state': robot.get_robot_state(),
+                                       'waypoint': robot.get_current_waypoint()}, operation='get_status')
+
+    def __connect(self, robot):
+        if robot.rshd < 0:
+            robot.create_context()
+        ip, port = self.__addresses[id(robot)]
+        return robot.connect(ip, port)
+
+    def __call(self, name, function, result_code):
+        start = time.monotonic()
+        try:
+            value = function(self.robots[name])
+        except Exception as error:
+            return ArmResult(name, None, error, time.monotonic() - start)
+        error = value if result_code and value != RobotErrorType.RobotError_SUCC else None
+        return ArmResult(name, value, error, time.monotonic() - start)
@@ -0,0 +1,342 @@
+#! /usr/bin/env python
+# coding=utf-8
+import numpy as np
+from functools import lru_cache
+import robot_kinematics
+import robot_transforms
+
+
+# Values of RobotCoordType and RobotCoordCalMethod in robot_control_en, repeated here to avoid a circular import
+COORD_TYPE_BASE = 0
+COORD_TYPE_END = 1
+COORD_TYPE_WORLD = 2
+
+# Calibration method -> (axis given by point1 -> point2, axis completed from point3), axes are 0: x, 1: y, 2: z
+# point1 is the origin, point2 lies on the positive first axis, point3 on the positive side of the second axis
+CALIBRATE_AXES = {
+    0: (0, 1),  # xOy
+    1: (1, 2),  # yOz
+    2: (2, 0),  # zOx
+    3: (0, 1),  # xOxy
+    4: (0, 2),  # xOxz
+    5: (1, 0),  # yOyx
+    6: (1, 2),  # yOyz
+    7: (2, 0),  # zOzx
+    8: (2, 1),  # zOzy
+}
+
+# Number of resolved user frames kept by resolve_user_coord
+USER_FRAME_CACHE_SIZE = 64
+
+
+def user_coord_key(user_coord):
+    """
+    * FUNCTION: user_coord_key
+    * DESCRIPTION: Hashable form of a user coordinate system dict
+    * INPUTS: user_coord: user coordinate system, see Auboi5Robot.set_user_coord, or a UserFrame
+    * OUTPUTS:
+    * RETURNS: nested tuple (coord_type, calibrate_method, (point1, point2, point3), (tool pos, tool ori))
+    * NOTES:
+    """
+    if isinstance(user_coord, UserFrame):
+        return user_coord.key
+    points = user_coord['calibrate_points']
+    tool = user_coord.get('tool_desc', {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)})
+    return (int(user_coord['coord_type']), int(user_coord['calibrate_method']),
+            tuple(tuple(float(v) for v in points[name]) for name in ("point1", "point2", "point3")),
+            (tuple(float(v) for v in tool['pos']), tuple(float(v) for v in tool['ori'])))
+
+
+def as_user_coord_dict(user_coord):
+    """
+    * FUNCTION: as_user_coord_dict
+    * DESCRIPTION: user_coord dict to pass to libpyauboi5
+    * INPUTS: user_coord: user coordinate system dict or UserFrame
+    * OUTPUTS:
+    * RETURNS: the dict itself, or the prebuilt dict of the UserFrame
+    * NOTES:
+    """
+    if isinstance(user_coord, UserFrame):
+        return user_coord.user_coord
+    return user_coord
+
+
+def tool_key(user_tool):
+    """
+    * FUNCTION: tool_key
+    * DESCRIPTION: Hashable form of a tool description dict
+    * INPUTS: user_tool: {"pos": (x, y, z), "ori": (w, x, y, z)}, None without tool
+    * OUTPUTS:
+    * RETURNS: (pos, ori) tuple
+    * NOTES:
+    """
+    if user_tool is None:
+        return (0.0, 0.0, 0.0), (1.0, 0.0, 0.0, 0.0)
+    return tuple(float(v) for v in user_tool['pos']), tuple(float(v) for v in user_tool['ori'])
+
+
+def _resolve(key, model):
+    coord_type, method, points, (tool_pos, tool_ori) = key
+    if coord_type == COORD_TYPE_BASE:
+        return np.zeros(3), np.array((1.0, 0.0, 0.0, 0.0))
+    if coord_type != COORD_TYPE_WORLD:
+        raise ValueError("coord_type {0} depends on the current pose and cannot be resolved once".format(coord_type))
+    if method not in CALIBRATE_AXES:
+        raise ValueError("unknown calibrate_method {0}".format(method))
+
+    # Calibration points are joint angles, the frame is built from the tool end positions
+    flange_pos, flange_ori = robot_kinematics.forward_kin_batch(np.array(points), model)
+    tool_points = flange_pos + robot_transforms.quaternion_rotate(flange_ori, np.tile(tool_pos, (3, 1)))
+
+    first, second = CALIBRATE_AXES[method]
+    axes = np.zeros((3, 3))
+    axis = tool_points[1] - tool_points[0]
+    helper = tool_points[2] - tool_points[0]
+    if np.linalg.norm(axis) < 1e-9:
+        raise ValueError("calibrate point1 and point2 coincide")
+    axes[first] = axis / np.linalg.norm(axis)
+    helper = helper - np.dot(helper, axes[first]) * axes[first]
+    if np.linalg.norm(helper) < 1e-9:
+        raise ValueError("calibrate points are collinear")
+    axes[second] = helper / np.linalg.norm(helper)
+    # Right-handed completion: x = y cross z, y = z cross x, z = x cross y
+    third = 3 - first - second
+    axes[third] = np.cross(axes[(third + 1) % 3], axes[(third + 2) % 3])
+
+    # Rotation columns are the user axes expressed in the base frame
+    rotation = axes.T
+    return tool_points[0], robot_transforms.rotation_to_quaternion(rotation)[0]
+
+
+@lru_cache(maxsize=USER_FRAME_CACHE_SIZE)
+def _resolve_cached(key, model):
+    pos, ori = _resolve(key, model)
+    pos.flags.writeable = False
+    ori.flags.writeable = False
+    return pos, ori
+
+
+def resolve_user_coord(user_coord, model=robot_kinematics.RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: resolve_user_coord
+    * DESCRIPTION: Compute the user coordinate system locally, cached per distinct user_coord
+    * INPUTS: user_coord: user coordinate system, see Auboi5Robot.set_user_coord
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: origin (3,) and attitude quaternion (w, x, y, z) (4,) of the user frame on the base frame
+    * NOTES: Read-only arrays. Raises ValueError for the end coordinate type, whose frame follows the arm.
+    * Accepts a UserFrame as well, whose pose is computed only once.
+    """
+    if isinstance(user_coord, UserFrame) and user_coord.model == model:
+        return user_coord.pose()
+    return _resolve_cached(user_coord_key(user_coord), model)
+
+
+def user_coord_transform(user_coord, model=robot_kinematics.RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: user_coord_transform
+    * DESCRIPTION: Homogeneous transform of the user coordinate system on the base frame
+    * INPUTS: user_coord: user coordinate system, see Auboi5Robot.set_user_coord
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: 4x4 matrix mapping user coordinates to base coordinates
+    * NOTES:
+    """
+    if isinstance(user_coord, UserFrame) and user_coord.model == model:
+        return user_coord.transform().copy()
+    pos, ori = resolve_user_coord(user_coord, model)
+    transform = np.eye(4)
+    transform[:3, :3] = robot_transforms.quaternion_to_rotation(ori)[0]
+    transform[:3, 3] = pos
+    return transform
+
+
+def compose_poses(pos_a, ori_a, pos_b, ori_b):
+    """
+    * FUNCTION: compose_poses
+    * DESCRIPTION: Pose product a * b, vectorized with broadcasting
+    * INPUTS: pos_a, pos_b: positions shape (N, 3) or (3,); ori_a, ori_b: quaternions shape (N, 4) or (4,)
+    * OUTPUTS:
+    * RETURNS: positions (N, 3), quaternions (N, 4)
+    * NOTES:
+    """
+    pos = np.atleast_2d(pos_a) + robot_transforms.quaternion_rotate(ori_a, pos_b)
+    return pos, robot_transforms.quaternion_multiply(ori_a, ori_b)
+
+
+def invert_pose(pos, ori):
+    """
+    * FUNCTION: invert_pose
+    * DESCRIPTION: Pose inverse, vectorized
+    * INPUTS: pos: positions shape (N, 3) or (3,); ori: unit quaternions shape (N, 4) or (4,)
+    * OUTPUTS:
+    * RETURNS: positions (N, 3), quaternions (N, 4)
+    * NOTES:
+    """
+    inverse_ori = robot_transforms.quaternion_conjugate(ori)
+    return -robot_transforms.quaternion_rotate(inverse_ori, pos), inverse_ori
+
+
+def _normalize(ori):
+    ori = np.atleast_2d(np.asarray(ori, dtype=np.float64))
+    return ori / np.linalg.norm(ori, axis=1)[:, None]
+
+
+def base_to_user_batch(flange_pos, flange_ori, user_coord, user_tool, model=robot_kinematics.RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: base_to_user_batch
+    * DESCRIPTION: Flange center poses on the base frame -> tool end poses on the user frame
+    * INPUTS: flange_pos: positions shape (N, 3), unit (m); flange_ori: quaternions (w, x, y, z) shape (N, 4)
+    * user_coord: user coordinate system, see Auboi5Robot.set_user_coord
+    * user_tool: {"pos": (x, y, z), "ori": (w, x, y, z)}
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: positions (N, 3), quaternions (N, 4)
+    * NOTES: The user frame is resolved once per distinct user_coord, raises ValueError when it is degenerate
+    """
+    user_pos, user_ori = invert_pose(*resolve_user_coord(user_coord, model))
+    tool_pos, tool_ori = tool_key(user_tool)
+    end_pos, end_ori = compose_poses(flange_pos, _normalize(flange_ori), tool_pos, _normalize(tool_ori))
+    return compose_poses(user_pos, user_ori, end_pos, end_ori)
+
+
+def user_to_base_batch(end_pos, end_ori, user_coord, user_tool, model=robot_kinematics.RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: user_to_base_batch
+    * DESCRIPTION: Tool end poses on the user frame -> flange center poses on the base frame
+    * INPUTS: end_pos: positions shape (N, 3), unit (m); end_ori: quaternions (w, x, y, z) shape (N, 4)
+    * user_coord: user coordinate system, see Auboi5Robot.set_user_coord
+    * user_tool: {"pos": (x, y, z), "ori": (w, x, y, z)}
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: positions (N, 3), quaternions (N, 4)
+    * NOTES: The user frame is resolved once per distinct user_coord, raises ValueError when it is degenerate
+    """
+    user_pos, user_ori = resolve_user_coord(user_coord, model)
+    tool_pos, tool_ori = tool_key(user_tool)
+    tool_inv_pos, tool_inv_ori = invert_pose(tool_pos, _normalize(tool_ori))
+    base_pos, base_ori = compose_poses(user_pos, user_ori, end_pos, _normalize(end_ori))
+    return compose_poses(base_pos, base_ori, tool_inv_pos, tool_inv_ori)
+
+
+def base_to_base_additional_tool_batch(flange_pos, flange_ori, user_tool):
+    """
+    * FUNCTION: base_to_base_additional_tool_batch
+    * DESCRIPTION: Flange center poses on the base frame -> tool end poses on the base frame
+    * INPUTS: flange_pos: positions shape (N, 3), unit (m); flange_ori: quaternions (w, x, y, z) shape (N, 4)
+    * user_tool: {"pos": (x, y, z), "ori": (w, x, y, z)}
+    * OUTPUTS:
+    * RETURNS: positions (N, 3), quaternions (N, 4)
+    * NOTES:
+    """
+    tool_pos, tool_ori = tool_key(user_tool)
+    return compose_poses(flange_pos, _normalize(flange_ori), tool_pos, _normalize(tool_ori))
+
+
+class UserFrame:
+    """
+    * Compiled user coordinate system
+    * Built once from a user_coord dict (or its fields), hashable and comparable, resolves its transform
+    * lazily and keeps the dict passed to libpyauboi5 so it is not rebuilt per call
+    """
+
+    def __init__(self, coord_type=COORD_TYPE_BASE, calibrate_method=0,
+                 calibrate_points=None, tool_desc=None, model=robot_kinematics.RobotModelType.Aubo_i5):
+        zero = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        if calibrate_points is None:
+            calibrate_points = {"point1": zero, "point2": zero, "point3": zero}
+        if tool_desc is None:
+            tool_desc = {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)}
+        self.key = user_coord_key({'coord_type': coord_type, 'calibrate_method': calibrate_method,
+                                   'calibrate_points': calibrate_points, 'tool_desc': tool_desc})
+        self.model = model
+        coord_type, calibrate_method, points, (tool_pos, tool_ori) = self.key
+        self.user_coord = {'coord_type': coord_type,
+                           'calibrate_method': calibrate_method,
+                           'calibrate_points': {"point1": points[0], "point2": points[1], "point3": points[2]},
+                           'tool_desc': {"pos": tool_pos, "ori": tool_ori}}
+        self._hash = hash((self.key, model))
+        self._pose = None
+        self._transform = None
+
+    @classmethod
+    def from_user_coord(cls, user_coord, model=robot_kinematics.RobotModelType.Aubo_i5):
+        """
+        * FUNCTION: from_user_coord
+        * DESCRIPTION: Compile a user_coord dict, a UserFrame of the same model is returned as is
+        * INPUTS: user_coord: user coordinate system dict or UserFrame
+        * model: robot model, see class RobotModelType
+        * OUTPUTS:
+        * RETURNS: UserFrame
+        * NOTES:
+        """
+        if isinstance(user_coord, UserFrame) and user_coord.model == model:
+            return user_coord
+        if isinstance(user_coord, UserFrame):
+            user_coord = user_coord.user_coord
+        return cls(user_coord['coord_type'], user_coord['calibrate_method'], user_coord['calibrate_points'],
+                   user_coord.get('tool_desc'), model)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, UserFrame) and self.key == other.key and self.model == other.model
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __str__(self):
+        return "UserFrame coord_type={0}, calibrate_method={1}".format(self.key[0], self.key[1])
+
+    @property
+    def coord_type(self):
+        return self.key[0]
+
+    @property
+    def is_fixed(self):
+        """ False for the end coordinate type, whose frame follows the arm """
+        return self.key[0] != COORD_TYPE_END
+
+    def pose(self):
+        """
+        * FUNCTION: pose
+        * DESCRIPTION: Origin and attitude of the frame on the base frame, computed on first use
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: origin (3,), quaternion (w, x, y, z) (4,)
+        * NOTES: Raises ValueError when the calibration points are degenerate or the frame is not fixed
+        """
+        if self._pose is None:
+            self._pose = _resolve_cached(self.key, self.model)
+        return self._pose
+
+    def transform(self):
+        """
+        * FUNCTION: transform
+        * DESCRIPTION: Homogeneous transform mapping user coordinates to base coordinates
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: 4x4 matrix
+        * NOTES: Computed once per UserFrame
+        """
+        if self._transform is None:
+            pos, ori = self.pose()
+            transform = np.eye(4)
+            transform[:3, :3] = robot_transforms.quaternion_to_rotation(ori)[0]
+            transform[:3, 3] = pos
+            transform.flags.writeable = False
+            self._transform = transform
+        return self._transform
+
+
+def base_user_frame(model=robot_kinematics.RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: base_user_frame
+    * DESCRIPTION: UserFrame equal to the base coordinate system
+    * INPUTS: model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: UserFrame
+    * NOTES:
+    """
+    return UserFrame(COORD_TYPE_BASE, 0, None, None, model)
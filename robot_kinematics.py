@@ -0,0 +1,422 @@
+#! /usr/bin/env python
+# coding=utf-8
+import threading
+import numpy as np
+from collections import OrderedDict
+from math import pi, sin, cos
+from robot_transforms import rotation_to_quaternion, quaternion_to_rotation
+
+
+class RobotModelType:
+    # Aubo i5 robotic arm
+    Aubo_i5 = 0
+    # Aubo i10 robotic arm
+    Aubo_i10 = 1
+
+    def __init__(self):
+        pass
+
+
+# Modified DH parameters of each model, one row per joint: (a_{i-1} (m), alpha_{i-1} (rad), d_i (m), theta offset (rad))
+# All joints at 0 is the upright pose reported by the controller
+RobotDHParameters = {
+    RobotModelType.Aubo_i5: ((0.0, 0.0, 0.0985, pi),
+                             (0.0, -pi / 2, 0.1215, -pi / 2),
+                             (0.408, pi, 0.0, 0.0),
+                             (0.376, pi, 0.0, -pi / 2),
+                             (0.0, -pi / 2, 0.1025, 0.0),
+                             (0.0, pi / 2, 0.094, 0.0)),
+    RobotModelType.Aubo_i10: ((0.0, 0.0, 0.1632, pi),
+                              (0.0, -pi / 2, 0.2013, -pi / 2),
+                              (0.647, pi, 0.0, 0.0),
+                              (0.6005, pi, 0.0, -pi / 2),
+                              (0.0, -pi / 2, 0.1025, 0.0),
+                              (0.0, pi / 2, 0.094, 0.0)),
+}
+
+# Number of poses evaluated per vectorized block, bounds the temporary (N, 3, 3) arrays
+BATCH_BLOCK_SIZE = 65536
+
+
+def _forward_kin_block(joint_radian, dh):
+    count = len(joint_radian)
+    rotation = np.broadcast_to(np.eye(3), (count, 3, 3))
+    position = np.zeros((count, 3))
+    link = np.zeros((count, 3, 3))
+    for i, (a, alpha, d, offset) in enumerate(dh):
+        theta = joint_radian[:, i] + offset
+        ct, st = np.cos(theta), np.sin(theta)
+        ca, sa = np.cos(alpha), np.sin(alpha)
+        # T(i-1, i) = RotX(alpha) * TransX(a) * RotZ(theta) * TransZ(d)
+        position = position + np.matmul(rotation, np.array((a, -sa * d, ca * d)))
+        link[:, 0, 0] = ct
+        link[:, 0, 1] = -st
+        link[:, 1, 0] = st * ca
+        link[:, 1, 1] = ct * ca
+        link[:, 1, 2] = -sa
+        link[:, 2, 0] = st * sa
+        link[:, 2, 1] = ct * sa
+        link[:, 2, 2] = ca
+        rotation = np.matmul(rotation, link)
+    return position, rotation
+
+
+def forward_kin_matrix(joint_radian, model=RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: forward_kin_matrix
+    * DESCRIPTION: Batched forward kinematics of the flange center, returning rotation matrices
+    * INPUTS: joint_radian: joint angles, shape (N, 6) or (6,), unit (rad)
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: position (N, 3) unit (m), rotation matrices (N, 3, 3)
+    * NOTES:
+    """
+    joints = np.atleast_2d(np.asarray(joint_radian, dtype=np.float64))
+    if joints.ndim != 2 or joints.shape[1] != 6:
+        raise ValueError("joint_radian must have shape (N, 6), got {0}".format(joints.shape))
+
+    dh = RobotDHParameters[model]
+    count = len(joints)
+    position = np.empty((count, 3))
+    rotation = np.empty((count, 3, 3))
+    for start in range(0, count, BATCH_BLOCK_SIZE):
+        stop = start + BATCH_BLOCK_SIZE
+        position[start:stop], rotation[start:stop] = _forward_kin_block(joints[start:stop], dh)
+    return position, rotation
+
+
+def forward_kin_batch(joint_radian, model=RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: forward_kin_batch
+    * DESCRIPTION: Batched forward kinematics of the flange center, no controller connection required
+    * INPUTS: joint_radian: joint angles, shape (N, 6) or (6,), unit (rad)
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: position (N, 3) unit (m), attitude quaternions (w, x, y, z) shape (N, 4)
+    * NOTES: Quaternions are normalized to w >= 0, the controller may return the equivalent -q
+    """
+    position, rotation = forward_kin_matrix(joint_radian, model)
+    return position, rotation_to_quaternion(rotation)
+
+
+# Joint ranges of each model, unit (rad)
+RobotJointLimits = {
+    RobotModelType.Aubo_i5: ((-175.0 / 180.0 * pi, 175.0 / 180.0 * pi),) * 6,
+    RobotModelType.Aubo_i10: ((-175.0 / 180.0 * pi, 175.0 / 180.0 * pi),) * 6,
+}
+
+# Number of closed-form inverse kinematics branches: shoulder (2) x wrist (2) x elbow (2)
+IK_BRANCH_COUNT = 8
+
+# |sin(q5)| below this value is treated as a wrist singularity, joint 6 is then set to 0
+IK_SINGULAR_EPS = 1e-9
+
+
+def _dh_transform(alpha, a, theta, d):
+    # Modified DH link transform RotX(alpha) * TransX(a) * RotZ(theta) * TransZ(d), shape (N, 4, 4)
+    ct, st = np.cos(theta), np.sin(theta)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    transform = np.zeros((len(theta), 4, 4))
+    transform[:, 0, 0] = ct
+    transform[:, 0, 1] = -st
+    transform[:, 0, 3] = a
+    transform[:, 1, 0] = st * ca
+    transform[:, 1, 1] = ct * ca
+    transform[:, 1, 2] = -sa
+    transform[:, 1, 3] = -sa * d
+    transform[:, 2, 0] = st * sa
+    transform[:, 2, 1] = ct * sa
+    transform[:, 2, 2] = ca
+    transform[:, 2, 3] = ca * d
+    transform[:, 3, 3] = 1.0
+    return transform
+
+
+def _invert_transform(transform):
+    rotation_t = np.transpose(transform[:, :3, :3], (0, 2, 1))
+    inverse = np.zeros_like(transform)
+    inverse[:, :3, :3] = rotation_t
+    inverse[:, :3, 3] = -np.matmul(rotation_t, transform[:, :3, 3:4])[:, :, 0]
+    inverse[:, 3, 3] = 1.0
+    return inverse
+
+
+def _wrap_angle(angle):
+    # Wrap to (-pi, pi]
+    return pi - np.mod(pi - angle, 2.0 * pi)
+
+
+def inverse_kin_batch(poses, model=RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: inverse_kin_batch
+    * DESCRIPTION: Batched closed-form inverse kinematics returning all branches
+    * INPUTS: poses: flange poses (x, y, z, w, qx, qy, qz), shape (N, 7) or (7,), position unit (m)
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: solutions shape (N, 8, 6) unit (rad), valid mask shape (N, 8)
+    * NOTES: Branch index = shoulder * 4 + wrist * 2 + elbow. Joint angles are wrapped to (-pi, pi].
+    * A branch is valid when the pose is reachable and all joints are inside RobotJointLimits,
+    * invalid branches are filled with NaN where they are unreachable.
+    """
+    poses = np.atleast_2d(np.asarray(poses, dtype=np.float64))
+    if poses.ndim != 2 or poses.shape[1] != 7:
+        raise ValueError("poses must have shape (N, 7), got {0}".format(poses.shape))
+
+    dh = RobotDHParameters[model]
+    count = len(poses)
+    d1, d2 = dh[0][2], dh[1][2]
+    a2, a3 = dh[2][0], dh[3][0]
+    d6 = dh[5][2]
+    offsets = np.array([row[3] for row in dh])
+
+    target = np.zeros((count, 4, 4))
+    target[:, :3, :3] = quaternion_to_rotation(poses[:, 3:])
+    target[:, :3, 3] = poses[:, :3]
+    target[:, 3, 3] = 1.0
+    z6 = target[:, :3, 2]
+
+    # Shoulder: joints 2, 3, 4 are parallel, so the wrist center p5 keeps a constant offset d2 from the arm plane
+    p5 = poses[:, :3] - d6 * z6
+    radius = np.hypot(p5[:, 0], p5[:, 1])
+    phi = np.arctan2(p5[:, 1], p5[:, 0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = d2 / radius
+    shoulder_ok = np.abs(ratio) <= 1.0
+    shoulder_offset = np.arcsin(np.clip(ratio, -1.0, 1.0))
+    theta1_list = (phi - shoulder_offset, phi - pi + shoulder_offset)
+
+    base_inverse = _invert_transform(_dh_transform(dh[0][1], dh[0][0], np.zeros(count), d1))
+    zero = np.zeros(count)
+
+    solutions = np.full((count, IK_BRANCH_COUNT, 6), np.nan)
+    reachable = np.zeros((count, IK_BRANCH_COUNT), dtype=bool)
+    for shoulder, theta1 in enumerate(theta1_list):
+        # Wrist: the joint 6 axis makes the angle q5 with the common axis of joints 2, 3, 4
+        axis2 = np.stack((-np.sin(theta1), np.cos(theta1), zero), axis=1)
+        cos5 = np.einsum('ij,ij->i', axis2, z6)
+        wrist_ok = np.abs(cos5) <= 1.0 + 1e-12
+        acos5 = np.arccos(np.clip(cos5, -1.0, 1.0))
+        axis2_on_6 = np.matmul(np.transpose(target[:, :3, :3], (0, 2, 1)), axis2[:, :, None])[:, :, 0]
+
+        for wrist, theta5 in enumerate((acos5, -acos5)):
+            sin5 = np.sin(theta5)
+            singular = np.abs(sin5) < IK_SINGULAR_EPS
+            sign5 = np.where(sin5 < 0.0, -1.0, 1.0)
+            theta6 = np.where(singular, offsets[5],
+                              np.arctan2(sign5 * axis2_on_6[:, 1], -sign5 * axis2_on_6[:, 0]))
+
+            # Remove joints 5, 6 and joint 1, leaving the planar joints 2, 3, 4
+            wrist_transform = np.matmul(_dh_transform(dh[4][1], dh[4][0], theta5, dh[4][2]),
+                                        _dh_transform(dh[5][1], dh[5][0], theta6, dh[5][2]))
+            t04 = np.matmul(target, _invert_transform(wrist_transform))
+            rot1 = _dh_transform(0.0, 0.0, theta1, 0.0)
+            t14 = np.matmul(np.matmul(_invert_transform(rot1), base_inverse), t04)
+            planar = np.matmul(_dh_transform(-dh[1][1], 0.0, zero, 0.0), t14)
+            px, py = planar[:, 0, 3], planar[:, 1, 3]
+            plane_angle = np.arctan2(planar[:, 1, 0], planar[:, 0, 0])
+
+            cos3 = (px * px + py * py - a2 * a2 - a3 * a3) / (2.0 * a2 * a3)
+            elbow_ok = np.abs(cos3) <= 1.0 + 1e-12
+            acos3 = np.arccos(np.clip(cos3, -1.0, 1.0))
+
+            for elbow, theta3 in enumerate((acos3, -acos3)):
+                theta2 = np.arctan2(py, px) + np.arctan2(a3 * np.sin(theta3), a2 + a3 * np.cos(theta3))
+                theta4 = plane_angle - theta2 + theta3
+                branch = shoulder * 4 + wrist * 2 + elbow
+                ok = shoulder_ok & wrist_ok & elbow_ok
+                theta = np.stack((theta1, theta2, theta3, theta4, theta5, theta6), axis=1)
+                solutions[ok, branch] = _wrap_angle(theta[ok] - offsets)
+                reachable[:, branch] = ok
+
+    lower = np.array([limit[0] for limit in RobotJointLimits[model]])
+    upper = np.array([limit[1] for limit in RobotJointLimits[model]])
+    with np.errstate(invalid='ignore'):
+        in_limits = np.all((solutions >= lower) & (solutions <= upper), axis=2)
+    return solutions, reachable & in_limits
+
+
+def inverse_kin_all(pos, ori, model=RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: inverse_kin_all
+    * DESCRIPTION: Closed-form inverse kinematics of a single flange pose returning all branches
+    * INPUTS: pos: position (x, y, z) unit (m)
+    * ori: attitude (w, x, y, z)
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: solutions shape (8, 6) unit (rad), valid mask shape (8,)
+    * NOTES: See inverse_kin_batch
+    """
+    solutions, valid = inverse_kin_batch(np.concatenate((np.asarray(pos, dtype=np.float64),
+                                                         np.asarray(ori, dtype=np.float64))), model)
+    return solutions[0], valid[0]
+
+
+def select_nearest_solution(solutions, valid, seed, model=RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: select_nearest_solution
+    * DESCRIPTION: Pick the valid branch closest to the seed joint angles
+    * INPUTS: solutions: shape (N, 8, 6) or (8, 6), see inverse_kin_batch
+    * valid: valid mask shape (N, 8) or (8,)
+    * seed: starting joint angles shape (N, 6) or (6,), unit (rad)
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: joint angles shape (N, 6), found mask shape (N,), branch index shape (N,)
+    * NOTES: Each joint is first shifted by a multiple of 2*pi towards the seed when the shifted
+    * value stays inside RobotJointLimits, then the branch with the smallest joint-space distance wins,
+    * the same seed rule as move_to_target_in_cartesian (the current waypoint is the seed).
+    """
+    solutions = np.asarray(solutions, dtype=np.float64)
+    valid = np.asarray(valid, dtype=bool)
+    if solutions.ndim == 2:
+        solutions, valid = solutions[None], valid[None]
+    seed = np.broadcast_to(np.asarray(seed, dtype=np.float64), (len(solutions), 6))[:, None, :]
+
+    lower = np.array([limit[0] for limit in RobotJointLimits[model]])
+    upper = np.array([limit[1] for limit in RobotJointLimits[model]])
+    shifted = solutions + np.round((seed - solutions) / (2.0 * pi)) * (2.0 * pi)
+    with np.errstate(invalid='ignore'):
+        candidates = np.where((shifted >= lower) & (shifted <= upper), shifted, solutions)
+
+    distance = np.where(valid, np.linalg.norm(candidates - seed, axis=2), np.inf)
+    branch = np.argmin(distance, axis=1)
+    index = np.arange(len(candidates))
+    return candidates[index, branch], valid[index, branch], branch
+
+
+def ik_branch(joint_radian, model=RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: ik_branch
+    * DESCRIPTION: Closed-form branch index of a joint configuration
+    * INPUTS: joint_radian: joint angle of six joints, unit (rad)
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: branch index 0~7, same numbering as inverse_kin_batch
+    * NOTES: Plain float math, cheap enough to evaluate for every command
+    """
+    dh = RobotDHParameters[model]
+    theta2 = joint_radian[1] + dh[1][3]
+    theta3 = joint_radian[2] + dh[2][3]
+    theta4 = joint_radian[3] + dh[3][3]
+    # Reach of the wrist center along the arm plane, negative when the arm leans over the base
+    reach = dh[2][0] * cos(theta2) + dh[3][0] * cos(theta2 - theta3) - dh[4][2] * sin(theta2 - theta3 + theta4)
+    shoulder = 0 if reach >= 0.0 else 1
+    wrist = 0 if sin(joint_radian[4] + dh[4][3]) >= 0.0 else 1
+    elbow = 0 if sin(theta3) >= 0.0 else 1
+    return shoulder * 4 + wrist * 2 + elbow
+
+
+class IkResultCache:
+    """
+    * Size bounded LRU cache of inverse kinematics results
+    * Key: quantized position and attitude, tool kinematics parameters, user frame, robot model and seed branch
+    * lookup, store and invalidate may be called from several threads
+    """
+    # Default number of cached poses
+    DEFAULT_MAX_SIZE = 4096
+    # Default quantization step of the position, unit (m)
+    DEFAULT_POS_RESOLUTION = 1e-6
+    # Default quantization step of the quaternion components
+    DEFAULT_ORI_RESOLUTION = 1e-6
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, pos_resolution=DEFAULT_POS_RESOLUTION,
+                 ori_resolution=DEFAULT_ORI_RESOLUTION):
+        self.max_size = max_size
+        self.pos_resolution = pos_resolution
+        self.ori_resolution = ori_resolution
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "IkResultCache size={0}/{1}, hits={2}, misses={3}".format(len(self._entries), self.max_size,
+                                                                         self.hits, self.misses)
+
+    def make_key(self, pos, ori, tool, frame, model, branch):
+        """
+        * FUNCTION: make_key
+        * DESCRIPTION: Build the cache key of a pose
+        * INPUTS: pos: position (x, y, z) unit (m)
+        * ori: attitude (w, x, y, z), q and -q give the same key
+        * tool: hashable tool kinematics parameters, None without tool
+        * frame: hashable user frame (robot_frames.UserFrame), None for the base frame
+        * model: robot model, see class RobotModelType
+        * branch: seed branch, see ik_branch
+        * OUTPUTS:
+        * RETURNS: hashable key
+        * NOTES:
+        """
+        sign = -1.0 if ori[0] < 0.0 else 1.0
+        return (tuple(int(round(v / self.pos_resolution)) for v in pos),
+                tuple(int(round(sign * v / self.ori_resolution)) for v in ori),
+                tool, frame, model, branch)
+
+    def lookup(self, key):
+        """
+        * FUNCTION: lookup
+        * DESCRIPTION: Look up a cached result, counts a hit or a miss
+        * INPUTS: key: see make_key
+        * OUTPUTS:
+        * RETURNS: cached value, None on miss
+        * NOTES:
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def store(self, key, value):
+        """
+        * FUNCTION: store
+        * DESCRIPTION: Store a result, evicting the least recently used entry when full
+        * INPUTS: key: see make_key
+        * value: result to cache, must not be None
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        * FUNCTION: invalidate
+        * DESCRIPTION: Drop all cached results
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        """
+        * FUNCTION: stats
+        * DESCRIPTION: Cache counters
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: {"size": , "max_size": , "hits": , "misses": , "evictions": , "invalidations": , "hit_rate": }
+        * NOTES:
+        """
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions, "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,361 @@
+#! /usr/bin/env python
+# coding=utf-8
+import functools
+import threading
+import time
+import robot_control_en
+from robot_control_en import Auboi5Robot, RobotErrorType, logger
+
+
+# Sub-bucket bits of LatencyHistogram: values are kept with a relative error below 2 ** -(bits - 1), about 1.6 %
+HISTOGRAM_SUB_BUCKET_BITS = 7
+
+# Methods returning a RobotErrorType code, anything but RobotError_SUCC is counted as an error
+RESULT_CODE_PREFIX = ('set_', 'init_', 'move_', 'robot_', 'enable_', 'collision_', 'connect', 'disconnect',
+                      'startup_', 'stop_', 'clear_', 'append_', 'add_', 'remove_', 'upload_', 'enter_', 'leave_',
+                      'exit_', 'project_', 'rs_')
+
+# Auboi5Robot methods that are never timed
+UNTIMED_METHODS = ('raise_error', 'get_local_time', 'initialize', 'uninitialize')
+
+# Default time between two log summaries, unit (s)
+METRICS_LOG_INTERVAL = 60.0
+
+# RobotInstrumentation whose native=True wrapper currently replaces robot_control_en.libpyauboi5, at most one
+_native_owner = None
+_native_lock = threading.Lock()
+
+
+class LatencyHistogram:
+    """
+    * HDR style latency histogram: log-linear integer buckets in nanoseconds, constant memory, O(1) record
+    * Buckets below 2 ** HISTOGRAM_SUB_BUCKET_BITS ns are exact, above that every power of two is split into
+    * 2 ** (HISTOGRAM_SUB_BUCKET_BITS - 1) equal buckets.
+    """
+
+    def __init__(self, sub_bucket_bits=HISTOGRAM_SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.__half = 1 << (sub_bucket_bits - 1)
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.__lock:
+            self.counts = [0] * (self.__half * 2)
+            self.count = 0
+            self.total = 0
+            self.max = 0
+
+    def record(self, seconds):
+        """
+        * FUNCTION: record
+        * DESCRIPTION: Add one latency
+        * INPUTS: seconds: duration, unit (s)
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        value = max(int(seconds * 1e9), 0)
+        shift = max(value.bit_length() - self.sub_bucket_bits, 0)
+        index = shift * self.__half + (value >> shift)
+        with self.__lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentiles(self, fractions):
+        """
+        * FUNCTION: percentiles
+        * DESCRIPTION: Latencies below which the given fractions of the recorded values lie
+        * INPUTS: fractions: e.g. (0.5, 0.95, 0.99)
+        * OUTPUTS:
+        * RETURNS: list of latencies, unit (s), None when nothing was recorded
+        * NOTES: A bucket is reported by its middle, capped at the largest recorded value
+        """
+        with self.__lock:
+            counts, count, maximum = list(self.counts), self.count, self.max
+        if not count:
+            return [None] * len(fractions)
+        targets = sorted((max(int(fraction * count + 0.5), 1), position) for position, fraction in enumerate(fractions))
+        results = [None] * len(fractions)
+        seen = 0
+        pending = 0
+        for index, bucket in enumerate(counts):
+            if not bucket:
+                continue
+            seen += bucket
+            while pending < len(targets) and targets[pending][0] <= seen:
+                results[targets[pending][1]] = min(self.__bucket_value(index), maximum) / 1e9
+                pending += 1
+            if pending == len(targets):
+                break
+        return results
+
+    def __bucket_value(self, index):
+        shift = max(index // self.__half - 1, 0)
+        low = (index - shift * self.__half) << shift
+        return low + ((1 << shift) >> 1)
+
+
+class MethodStats:
+    """
+    * Call count, error count and latency histogram of one method
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.errors = 0
+        self.histogram = LatencyHistogram()
+        self.__lock = threading.Lock()
+
+    def reset(self):
+        with self.__lock:
+            self.errors = 0
+        self.histogram.reset()
+
+    def error(self):
+        # Calls of the same method on several threads fail concurrently
+        with self.__lock:
+            self.errors += 1
+
+    def snapshot(self):
+        histogram = self.histogram
+        p50, p95, p99 = histogram.percentiles((0.5, 0.95, 0.99))
+        count = histogram.count
+        with self.__lock:
+            errors = self.errors
+        return {"count": count, "errors": errors, "p50": p50, "p95": p95, "p99": p99,
+                "max": histogram.max / 1e9 if count else None,
+                "mean": histogram.total / count / 1e9 if count else None,
+                "total": histogram.total / 1e9}
+
+
+class RobotInstrumentation:
+    """
+    * Opt-in latency instrumentation of one Auboi5Robot
+    * While enabled every public method is shadowed on the instance by a timed wrapper, so internal calls such as
+    * self.check_event() are timed as well. Disabled, the instance attributes are removed again and calls go
+    * straight to the class methods: no overhead at all.
+    * native=True also times every libpyauboi5 function, under "libpyauboi5.<name>"; that replaces the module
+    * used by robot_control_en process-wide, for all robots, until disable(). Only one instrumentation at a time
+    * can be native, enabling a second one raises RuntimeError.
+    """
+
+    def __init__(self, robot, native=False):
+        self.robot = robot
+        self.native = native
+        self.enabled = False
+        self.stats = {}
+        self.__stats_lock = threading.Lock()
+        self.__library = None
+        self.__shadowed = []
+        self.__log_thread = None
+        self.__log_stop = threading.Event()
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.disable()
+
+    def enable(self):
+        """
+        * FUNCTION: enable
+        * DESCRIPTION: Start timing the robot methods (and the library functions when native)
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: self
+        * NOTES: Raises RuntimeError when native and another instrumentation already times libpyauboi5
+        """
+        global _native_owner
+        if self.enabled:
+            return self
+        if self.native:
+            with _native_lock:
+                if _native_owner is not None:
+                    raise RuntimeError("libpyauboi5 is already timed by the instrumentation of {0}".format(
+                        _native_owner.robot))
+                _native_owner = self
+                self.__library = robot_control_en.libpyauboi5
+                robot_control_en.libpyauboi5 = _TimedLibrary(self.__library, self)
+        for name, attribute in vars(Auboi5Robot).items():
+            if name.startswith('_') or name in UNTIMED_METHODS or not callable(getattr(self.robot, name)):
+                continue
+            if isinstance(attribute, (property, type)):
+                continue
+            setattr(self.robot, name, self.__timed(name, getattr(self.robot, name),
+                                                   name.startswith(RESULT_CODE_PREFIX)))
+            self.__shadowed.append(name)
+        self.robot.instrumentation = self
+        self.enabled = True
+        return self
+
+    def disable(self):
+        """
+        * FUNCTION: disable
+        * DESCRIPTION: Stop timing, the collected statistics are kept
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        global _native_owner
+        if not self.enabled:
+            return
+        self.stop_log()
+        for name in self.__shadowed:
+            delattr(self.robot, name)
+        self.__shadowed = []
+        if self.__library is not None:
+            with _native_lock:
+                robot_control_en.libpyauboi5 = self.__library
+                _native_owner = None
+            self.__library = None
+        self.robot.instrumentation = None
+        self.enabled = False
+
+    def method_stats(self, name):
+        stats = self.stats.get(name)
+        if stats is None:
+            with self.__stats_lock:
+                stats = self.stats.setdefault(name, MethodStats(name))
+        return stats
+
+    def snapshot(self):
+        """
+        * FUNCTION: snapshot
+        * DESCRIPTION: Statistics of every method called so far
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: {method name: {"count": , "errors": , "p50": , "p95": , "p99": , "max": , "mean": , "total": }}
+        * NOTES: Times in (s); library functions are named "libpyauboi5.<name>"
+        """
+        return {name: stats.snapshot() for name, stats in sorted(self.stats.items())}
+
+    def reset(self):
+        """
+        * FUNCTION: reset
+        * DESCRIPTION: Clear all statistics
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        with self.__stats_lock:
+            for stats in self.stats.values():
+                stats.reset()
+
+    def summary(self, top=10):
+        """
+        * FUNCTION: summary
+        * DESCRIPTION: Text table of the methods with the largest total time
+        * INPUTS: top: number of methods
+        * OUTPUTS:
+        * RETURNS: str
+        * NOTES:
+        """
+        rows = sorted(((name, row) for name, row in self.snapshot().items() if row["count"]),
+                      key=lambda item: item[1]["total"], reverse=True)[:top]
+        lines = ["{0:<36s} {1:>8s} {2:>6s} {3:>9s} {4:>9s} {5:>9s} {6:>9s}".format(
+            "method", "count", "errors", "p50 ms", "p95 ms", "p99 ms", "max ms")]
+        for name, row in rows:
+            lines.append("{0:<36s} {1:>8d} {2:>6d} {3:>9.3f} {4:>9.3f} {5:>9.3f} {6:>9.3f}".format(
+                name, row["count"], row["errors"], row["p50"] * 1e3, row["p95"] * 1e3, row["p99"] * 1e3,
+                row["max"] * 1e3))
+        return "\n".join(lines)
+
+    def start_log(self, interval=METRICS_LOG_INTERVAL, top=10, reset=True):
+        """
+        * FUNCTION: start_log
+        * DESCRIPTION: Log summary() periodically on a background thread
+        * INPUTS: interval: time between two summaries, unit (s)
+        * top: number of methods per summary
+        * reset: clear the statistics after each summary, so every summary covers one interval
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        self.stop_log()
+        self.__log_stop.clear()
+
+        def run():
+            while not self.__log_stop.wait(interval):
+                if any(stats.histogram.count for stats in list(self.stats.values())):
+                    logger.info("method latency, last {0:g}s:\n{1}".format(interval, self.summary(top)))
+                    if reset:
+                        self.reset()
+        self.__log_thread = threading.Thread(target=run, name='aubo-metrics', daemon=True)
+        self.__log_thread.start()
+
+    def stop_log(self):
+        """
+        * FUNCTION: stop_log
+        * DESCRIPTION: Stop the periodic summary started by start_log
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        if self.__log_thread is not None:
+            self.__log_stop.set()
+            self.__log_thread.join()
+            self.__log_thread = None
+
+    def __timed(self, name, method, result_code):
+        stats = self.method_stats(name)
+        record = stats.histogram.record
+        perf_counter = time.perf_counter
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except BaseException:
+                record(perf_counter() - start)
+                stats.error()
+                raise
+            record(perf_counter() - start)
+            if result_code and isinstance(result, int) and result != RobotErrorType.RobotError_SUCC:
+                stats.error()
+            return result
+        return timed
+
+    def timed_function(self, name, function):
+        return self.__timed(name, function, False)
+
+
+class _TimedLibrary:
+    # Stand-in for the libpyauboi5 module whose functions are timed wrappers of the real ones
+    def __init__(self, library, instrumentation):
+        self.__library = library
+        self.__instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        attribute = getattr(self.__library, name)
+        if callable(attribute):
+            attribute = self.__instrumentation.timed_function('libpyauboi5.' + name, attribute)
+        setattr(self, name, attribute)
+        return attribute
+
+
+def instrument(robot, native=False, log_interval=None):
+    """
+    * FUNCTION: instrument
+    * DESCRIPTION: Enable latency instrumentation on a robot
+    * INPUTS: robot: Auboi5Robot
+    * native: also time the libpyauboi5 functions (process wide)
+    * log_interval: log a summary every log_interval seconds, None for no log
+    * OUTPUTS:
+    * RETURNS: RobotInstrumentation, call disable() to remove it
+    * NOTES:
+    """
+    instrumentation = RobotInstrumentation(robot, native).enable()
+    if log_interval is not None:
+        instrumentation.start_log(log_interval)
+    return instrumentation
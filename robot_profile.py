@@ -0,0 +1,194 @@
+#! /usr/bin/env python
+# coding=utf-8
+from collections import OrderedDict
+from robot_control_en import RobotErrorType, RobotSessionSettings, logger
+
+
+# Setters whose value is diffed against the controller state: setter name -> RobotParameterCache parameter it changes
+PROFILE_SETTERS = OrderedDict([('set_joint_maxacc', 'joint_maxacc'),
+                               ('set_joint_maxvelc', 'joint_maxvelc'),
+                               ('set_end_max_line_acc', 'end_max_line_acc'),
+                               ('set_end_max_line_velc', 'end_max_line_velc'),
+                               ('set_end_max_angle_acc', 'end_max_angle_acc'),
+                               ('set_end_max_angle_velc', 'end_max_angle_velc')])
+
+# Calls that move the arm with the motion profile: a deferred init_profile and its setters are sent before them
+MOTION_CALLS = ('move_joint', 'move_line', 'move_track', 'move_to_target_in_cartesian', 'move_rotate',
+                'startup_offline_track', 'upload_offline_track', 'upload_offline_track_file')
+
+
+def _normalized(value):
+    # Comparable form of a setter argument: lists, tuples and arrays become tuples, numbers become floats
+    if hasattr(value, 'tolist'):
+        value = value.tolist()
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalized(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalized(item) for item in value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+class RobotProfile:
+    """
+    * Auboi5Robot (or robot_session.RobotSession) wrapper that only sends the motion profile calls that change
+    * something on the controller
+    * Calls go through the profile (profile.init_profile(), profile.set_joint_maxacc(...), profile.move_line(...)):
+    * - a PROFILE_SETTERS call whose value the controller already holds (robot.parameter_cache) is not sent;
+    * - init_profile is deferred: the setters following it are collected and, at the next MOTION_CALLS call (or
+    *   an explicit flush), compared with the profile applied since the last init_profile
+    *   (robot.session_settings). When the collected setters set every one of those again, the reset is dropped
+    *   and only the values that differ are sent, otherwise init_profile and the setters are sent in order.
+    * Other calls are forwarded as they are. A deferred call returns RobotError_SUCC at once; when sending it
+    * fails, the motion raises RobotError with the failing result code and "motion profile flush failed" instead
+    * of running.
+    * self.saved_round_trips counts the calls not sent, self.sent_calls the profile calls that were.
+    """
+
+    def __init__(self, robot):
+        self.robot = robot
+        self.saved_round_trips = 0
+        self.sent_calls = 0
+        self.__reset_pending = False
+        # Setters collected while init_profile is deferred, {setter name: value} in call order
+        self.__pending = OrderedDict()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.robot, name)
+        if name not in MOTION_CALLS:
+            return attribute
+
+        def call(*args, **kwargs):
+            result = self.flush()
+            if result != RobotErrorType.RobotError_SUCC:
+                self.robot.raise_error(result, 0, "motion profile flush failed before {0}".format(name))
+            return attribute(*args, **kwargs)
+        return call
+
+    def init_profile(self):
+        """
+        * FUNCTION: init_profile
+        * DESCRIPTION: Reset the motion profile, deferred until the next MOTION_CALLS call
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: RobotError.RobotError_SUCC
+        * NOTES: Not sent at all when nothing was applied since the last init_profile
+        """
+        if self.__reset_pending or self.__at_defaults():
+            self.saved_round_trips += 1
+            return RobotErrorType.RobotError_SUCC
+        self.__reset_pending = True
+        self.__pending = OrderedDict()
+        return RobotErrorType.RobotError_SUCC
+
+    def set_joint_maxacc(self, joint_maxacc=(1.0, 1.0, 1.0, 1.0, 1.0, 1.0)):
+        return self.__set('set_joint_maxacc', joint_maxacc)
+
+    def set_joint_maxvelc(self, joint_maxvelc=(1.0, 1.0, 1.0, 1.0, 1.0, 1.0)):
+        return self.__set('set_joint_maxvelc', joint_maxvelc)
+
+    def set_end_max_line_acc(self, end_maxacc=0.1):
+        return self.__set('set_end_max_line_acc', end_maxacc)
+
+    def set_end_max_line_velc(self, end_maxvelc=0.1):
+        return self.__set('set_end_max_line_velc', end_maxvelc)
+
+    def set_end_max_angle_acc(self, end_maxacc=0.1):
+        return self.__set('set_end_max_angle_acc', end_maxacc)
+
+    def set_end_max_angle_velc(self, end_maxvelc=0.1):
+        return self.__set('set_end_max_angle_velc', end_maxvelc)
+
+    def flush(self):
+        """
+        * FUNCTION: flush
+        * DESCRIPTION: Send a deferred init_profile and the setters collected after it
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Failure return: result code of the first call that failed, the remaining ones are not sent
+        * NOTES: Called before every MOTION_CALLS call made through the profile
+        """
+        if not self.__reset_pending:
+            return RobotErrorType.RobotError_SUCC
+        pending = self.__pending
+        self.__reset_pending = False
+        self.__pending = OrderedDict()
+        with self.robot.handle_lock:
+            settings = self.robot.session_settings
+            applied = OrderedDict((slot, args) for slot, (method, args) in settings.items()
+                                  if slot in RobotSessionSettings.MOVE_PROFILE)
+            # Without the reset, a profile value not set again would keep its old value instead of the default
+            reset = 'init_profile' not in settings or any(slot not in pending for slot in applied)
+            if reset:
+                self.sent_calls += 1
+                result = self.robot.init_profile()
+                if result != RobotErrorType.RobotError_SUCC:
+                    logger.error("init_profile failed, result={0}".format(result))
+                    return result
+            else:
+                self.saved_round_trips += 1
+            for method, value in pending.items():
+                if not reset and method in applied and _normalized(applied[method]) == _normalized((value,)):
+                    self.saved_round_trips += 1
+                    continue
+                result = self.__set(method, value)
+                if result != RobotErrorType.RobotError_SUCC:
+                    return result
+        return RobotErrorType.RobotError_SUCC
+
+    def discard(self):
+        """
+        * FUNCTION: discard
+        * DESCRIPTION: Drop a deferred init_profile and the setters collected after it without sending them
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Only MOTION_CALLS send them, so a disconnect without a motion drops them as well
+        """
+        self.__reset_pending = False
+        self.__pending = OrderedDict()
+
+    def __at_defaults(self):
+        # Profile known to be the controller defaults: init_profile applied on this link and nothing since
+        settings = self.robot.session_settings
+        return 'init_profile' in settings and \
+            not any(slot in RobotSessionSettings.MOVE_PROFILE for slot in settings)
+
+    def __set(self, method, value):
+        if self.__reset_pending:
+            self.__pending.pop(method, None)
+            self.__pending[method] = value
+            return RobotErrorType.RobotError_SUCC
+        cache = self.robot.parameter_cache
+        parameter = PROFILE_SETTERS[method]
+        if parameter in cache and _normalized(cache[parameter]) == _normalized(value):
+            self.saved_round_trips += 1
+            return RobotErrorType.RobotError_SUCC
+        self.sent_calls += 1
+        return getattr(self.robot, method)(value)
+
+
+if __name__ == '__main__':
+    from robot_control_en import Auboi5Robot, logger_init
+
+    logger_init()
+    Auboi5Robot.initialize()
+    profile = RobotProfile(Auboi5Robot())
+    profile.create_context()
+    if profile.connect('localhost', 8899) == RobotErrorType.RobotError_SUCC:
+        profile.robot_startup()
+        for joint in ((0.0, -0.127, -1.327, 0.364, -1.571, 0.0), (0.0, 0.127, -1.327, 0.364, -1.571, 0.0)) * 3:
+            # The preamble of test(), repeated before every move
+            profile.init_profile()
+            profile.set_joint_maxacc((1.5,) * 6)
+            profile.set_joint_maxvelc((1.5,) * 6)
+            profile.set_end_max_line_acc(0.5)
+            profile.set_end_max_line_velc(0.2)
+            profile.move_joint(joint)
+        logger.info("profile calls sent={0}, round trips saved={1}".format(profile.sent_calls,
+                                                                           profile.saved_round_trips))
+        profile.discard()
+        profile.disconnect()
+    Auboi5Robot.uninitialize()
@@ -0,0 +1,484 @@
+#! /usr/bin/env python
+# coding=utf-8
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from robot_control_en import logger
+from robot_telemetry import TELEMETRY_DTYPE, TelemetryReader
+
+
+# Telemetry file layout:
+#   file header, then chunks, then the chunk index and the trailer
+#   file header: TELEMETRY_FILE_HEADER (magic, version, JSON size) + JSON {"dtype": descr, "resolution": {field: step}}
+#   chunk: TELEMETRY_CHUNK_HEADER (kind, records, first time, last time, payload size) + payload
+#   sample chunk payload: for every dtype field, TELEMETRY_COLUMN_HEADER (size, encoding) + compressed column
+#   event chunk payload: compressed JSON list of [time, type, code, content]
+#   index: one TELEMETRY_INDEX_ENTRY per chunk, trailer: TELEMETRY_FILE_TRAILER (index offset, chunks, magic)
+TELEMETRY_FILE_MAGIC = b'AUBOTLM\x00'
+TELEMETRY_FILE_VERSION = 1
+TELEMETRY_FILE_HEADER = struct.Struct('<8sHI')
+TELEMETRY_CHUNK_HEADER = struct.Struct('<4sIddQ')
+TELEMETRY_INDEX_ENTRY = struct.Struct('<Q4sIdd')
+TELEMETRY_FILE_TRAILER = struct.Struct('<QQ8s')
+TELEMETRY_COLUMN_HEADER = struct.Struct('<IB')
+TELEMETRY_COLUMN_XOR = 0
+TELEMETRY_COLUMN_QUANTIZED = 1
+TELEMETRY_SAMPLE_CHUNK = b'SMPL'
+TELEMETRY_EVENT_CHUNK = b'EVNT'
+
+# Records per sample chunk, about 40 s at 250 Hz
+TELEMETRY_CHUNK_RECORDS = 10000
+
+# zlib level of the columns
+TELEMETRY_COMPRESSION = 6
+
+# Default storage resolution of float fields, unit (rad) for joints, (m) for positions.
+# Well below the encoder and controller resolution; other fields, and NaN holding columns, are stored lossless
+TELEMETRY_RESOLUTION = {'joint': 1e-7, 'pos': 1e-7, 'ori': 1e-8}
+
+
+def _encode_column(values, level, resolution=None):
+    # Lossless: XOR every record with the previous one, then group the bytes by significance, then zlib:
+    # slowly changing floats leave long runs of zero bytes in the high planes.
+    # With a resolution the floats are rounded to integer steps and delta coded instead, sensor noise below the
+    # resolution no longer fills the low bytes. Columns holding NaN are always stored lossless.
+    raw = np.ascontiguousarray(values).reshape(len(values), -1)
+    if resolution is not None and np.isfinite(raw).all():
+        steps = np.rint(raw / resolution).astype('<i8')
+        delta = steps.copy()
+        delta[1:] -= steps[:-1]
+        bits = ((delta << 1) ^ (delta >> 63)).view('<u8')
+        mode = TELEMETRY_COLUMN_QUANTIZED
+    else:
+        itemsize = raw.dtype.itemsize
+        bits = raw.view('<u{0}'.format(itemsize)) if itemsize in (1, 2, 4, 8) else raw.view(np.uint8)
+        bits = bits.copy()
+        bits[1:] ^= raw.view(bits.dtype)[:-1]
+        mode = TELEMETRY_COLUMN_XOR
+    planes = bits.view(np.uint8).reshape(len(values), -1, bits.dtype.itemsize).transpose(2, 1, 0)
+    return mode, zlib.compress(np.ascontiguousarray(planes).tobytes(), level)
+
+
+def _decode_column(payload, mode, dtype, count, resolution=None):
+    # dtype: field dtype, possibly a sub-array dtype such as ('<f8', (6,))
+    base = dtype.base
+    width = int(np.prod(dtype.shape)) if dtype.shape else 1
+    if mode == TELEMETRY_COLUMN_QUANTIZED:
+        unsigned = np.dtype('<u8')
+    else:
+        itemsize = base.itemsize
+        unsigned = np.dtype('<u{0}'.format(itemsize)) if itemsize in (1, 2, 4, 8) else np.dtype(np.uint8)
+    planes = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(unsigned.itemsize, width, count)
+    bits = np.ascontiguousarray(planes.transpose(2, 1, 0)).view(unsigned).reshape(count, -1)
+    if mode == TELEMETRY_COLUMN_QUANTIZED:
+        delta = (bits >> np.uint64(1)).view('<i8') ^ -(bits & np.uint64(1)).view('<i8')
+        values = (np.cumsum(delta, axis=0) * resolution).astype(base)
+    else:
+        values = np.bitwise_xor.accumulate(bits, axis=0).view(base)
+    return values.reshape((count,) + dtype.shape)
+
+
+class TelemetryRecorder:
+    """
+    * Writes telemetry records and robot events to a chunked, column compressed file
+    * append() buffers structured records (TELEMETRY_DTYPE by default) and writes a chunk every chunk_records;
+    * append_event() buffers events and writes them with the next chunk. close() writes the time index.
+    * resolution: {field: storage step} for float fields that may be rounded, None to store everything lossless
+    * All methods may be called from several threads.
+    """
+
+    def __init__(self, path, dtype=TELEMETRY_DTYPE, chunk_records=TELEMETRY_CHUNK_RECORDS,
+                 level=TELEMETRY_COMPRESSION, resolution=TELEMETRY_RESOLUTION):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.chunk_records = chunk_records
+        self.level = level
+        self.resolution = {name: step for name, step in (resolution or {}).items() if name in self.dtype.names}
+        self.records = 0
+        self.events = 0
+        self.raw_bytes = 0
+        self.__file = open(path, 'wb')
+        self.__lock = threading.RLock()
+        self.__buffer = np.zeros(chunk_records, dtype=self.dtype)
+        self.__buffered = 0
+        self.__pending_events = []
+        self.__index = []
+        self.__thread = None
+        self.__running = False
+        self.__robot = None
+        description = json.dumps({'dtype': self.dtype.descr, 'resolution': self.resolution}).encode('utf-8')
+        self.__file.write(TELEMETRY_FILE_HEADER.pack(TELEMETRY_FILE_MAGIC, TELEMETRY_FILE_VERSION, len(description)))
+        self.__file.write(description)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def bytes_written(self):
+        return self.__file.tell() if not self.__file.closed else os.path.getsize(self.path)
+
+    def append(self, records):
+        """
+        * FUNCTION: append
+        * DESCRIPTION: Add telemetry records
+        * INPUTS: records: structured array of the recorder dtype, in time order
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: The records are copied, views of a TelemetryRing may be passed
+        """
+        with self.__lock:
+            done = 0
+            while done < len(records):
+                take = min(len(records) - done, self.chunk_records - self.__buffered)
+                self.__buffer[self.__buffered:self.__buffered + take] = records[done:done + take]
+                self.__buffered += take
+                done += take
+                if self.__buffered == self.chunk_records:
+                    self.__write_samples()
+
+    def append_event(self, event, timestamp=None):
+        """
+        * FUNCTION: append_event
+        * DESCRIPTION: Add a robot event
+        * INPUTS: event: {'type': , 'code': , 'content': } as passed to the robot event callback
+        * timestamp: event time (s, time.time base), None for now
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Can be registered as listener: robot.event_waiter.add_listener(recorder.append_event)
+        """
+        entry = [time.time() if timestamp is None else timestamp, event['type'], event['code'],
+                 str(event.get('content', ''))]
+        with self.__lock:
+            self.__pending_events.append(entry)
+
+    def drain(self, reader):
+        """
+        * FUNCTION: drain
+        * DESCRIPTION: Append everything a TelemetryReader has not returned yet
+        * INPUTS: reader: TelemetryReader over the sampler ring
+        * OUTPUTS:
+        * RETURNS: number of records appended
+        * NOTES: Records overwritten while they were copied are dropped and counted in reader.lost
+        """
+        count = 0
+        for view in reader.read():
+            records = view.copy()
+            if not reader.valid():
+                first = reader.ring.written - reader.ring.capacity + 1
+                dropped = np.count_nonzero(records['sequence'] <= first)
+                reader.lost += dropped
+                records = records[records['sequence'] > first]
+            self.append(records)
+            count += len(records)
+        return count
+
+    def start(self, ring, robot=None, interval=0.5):
+        """
+        * FUNCTION: start
+        * DESCRIPTION: Record a TelemetryRing, and optionally the events of a robot, on a background thread
+        * INPUTS: ring: TelemetryRing filled by a TelemetrySampler
+        * robot: Auboi5Robot whose events are recorded, None for samples only
+        * interval: time between two drains of the ring, unit (s)
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: interval must be well below the time the ring needs to wrap around
+        """
+        reader = TelemetryReader(ring, ring.written)
+        if robot is not None:
+            robot.event_waiter.add_listener(self.append_event)
+            self.__robot = robot
+        self.__running = True
+
+        def run():
+            while self.__running:
+                time.sleep(interval)
+                self.drain(reader)
+            self.drain(reader)
+            if reader.lost:
+                logger.warn("telemetry recorder lost {0} records".format(reader.lost))
+        self.__thread = threading.Thread(target=run, name='aubo-recorder', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        * FUNCTION: stop
+        * DESCRIPTION: Stop the background recording started by start()
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if self.__robot is not None:
+            self.__robot.event_waiter.remove_listener(self.append_event)
+            self.__robot = None
+
+    def flush(self):
+        """
+        * FUNCTION: flush
+        * DESCRIPTION: Write the buffered records and events as a chunk
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        with self.__lock:
+            if self.__buffered:
+                self.__write_samples()
+            self.__write_events()
+            self.__file.flush()
+
+    def close(self):
+        """
+        * FUNCTION: close
+        * DESCRIPTION: Flush, write the time index and close the file
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: A file that was not closed can still be read, the index is then rebuilt from the chunk headers
+        """
+        self.stop()
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.flush()
+            index_offset = self.__file.tell()
+            for entry in self.__index:
+                self.__file.write(TELEMETRY_INDEX_ENTRY.pack(*entry))
+            self.__file.write(TELEMETRY_FILE_TRAILER.pack(index_offset, len(self.__index), TELEMETRY_FILE_MAGIC))
+            self.__file.close()
+
+    def __write_samples(self):
+        records = self.__buffer[:self.__buffered]
+        columns = [_encode_column(records[name], self.level, self.resolution.get(name)) for name in self.dtype.names]
+        payload = b''.join(TELEMETRY_COLUMN_HEADER.pack(len(column), mode) + column for mode, column in columns)
+        times = records['time'] if 'time' in self.dtype.names else np.zeros(1)
+        self.__write_chunk(TELEMETRY_SAMPLE_CHUNK, len(records), float(times[0]), float(times[-1]), payload)
+        self.records += len(records)
+        self.raw_bytes += records.nbytes
+        self.__buffered = 0
+        self.__write_events()
+
+    def __write_events(self):
+        if not self.__pending_events:
+            return
+        events = sorted(self.__pending_events, key=lambda entry: entry[0])
+        self.__pending_events = []
+        payload = zlib.compress(json.dumps(events).encode('utf-8'), self.level)
+        self.__write_chunk(TELEMETRY_EVENT_CHUNK, len(events), events[0][0], events[-1][0], payload)
+        self.events += len(events)
+
+    def __write_chunk(self, kind, count, first, last, payload):
+        offset = self.__file.tell()
+        self.__file.write(TELEMETRY_CHUNK_HEADER.pack(kind, count, first, last, len(payload)))
+        self.__file.write(payload)
+        self.__index.append((offset, kind, count, first, last))
+
+
+class TelemetryFile:
+    """
+    * Reader of a TelemetryRecorder file
+    * read(start, end) only decompresses the chunks whose time range overlaps [start, end]
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            raw = f.read(TELEMETRY_FILE_HEADER.size)
+            if len(raw) < TELEMETRY_FILE_HEADER.size:
+                raise ValueError("{0}: truncated telemetry header".format(path))
+            magic, version, size = TELEMETRY_FILE_HEADER.unpack(raw)
+            if magic != TELEMETRY_FILE_MAGIC:
+                raise ValueError("{0}: not a telemetry file".format(path))
+            if version != TELEMETRY_FILE_VERSION:
+                raise ValueError("{0}: unsupported telemetry file version {1}".format(path, version))
+            description = json.loads(f.read(size).decode('utf-8'))
+            self.dtype = np.dtype([tuple(field) if len(field) == 2 else (field[0], field[1], tuple(field[2]))
+                                   for field in description['dtype']])
+            # Storage step of the quantized fields, read() values are within half a step of the recorded ones
+            self.resolution = description['resolution']
+            self.__data_offset = f.tell()
+            self.index = self.__read_index(f)
+
+    def __len__(self):
+        return sum(entry[2] for entry in self.index if entry[1] == TELEMETRY_SAMPLE_CHUNK)
+
+    def time_range(self):
+        """
+        * FUNCTION: time_range
+        * DESCRIPTION: First and last sample time
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: (first, last), None when the file has no samples
+        * NOTES:
+        """
+        samples = [entry for entry in self.index if entry[1] == TELEMETRY_SAMPLE_CHUNK]
+        if not samples:
+            return None
+        return min(entry[3] for entry in samples), max(entry[4] for entry in samples)
+
+    def read(self, start=None, end=None, fields=None):
+        """
+        * FUNCTION: read
+        * DESCRIPTION: Samples with start <= time <= end
+        * INPUTS: start, end: time window (s, time.time base), None for open ended
+        * fields: field names to decode, None for all
+        * OUTPUTS:
+        * RETURNS: structured array
+        * NOTES:
+        """
+        names = self.dtype.names if fields is None else tuple(fields)
+        dtype = np.dtype([(name, self.dtype.fields[name][0]) for name in names])
+        parts = []
+        with open(self.path, 'rb') as f:
+            for offset, kind, count, first, last in self.__chunks(TELEMETRY_SAMPLE_CHUNK, start, end):
+                f.seek(offset + TELEMETRY_CHUNK_HEADER.size)
+                part = np.empty(count, dtype=dtype)
+                for name in self.dtype.names:
+                    size, mode = TELEMETRY_COLUMN_HEADER.unpack(f.read(TELEMETRY_COLUMN_HEADER.size))
+                    if name not in names:
+                        f.seek(size, os.SEEK_CUR)
+                        continue
+                    part[name] = _decode_column(f.read(size), mode, self.dtype.fields[name][0], count,
+                                                self.resolution.get(name))
+                if 'time' in names and (start is not None or end is not None):
+                    times = part['time']
+                    keep = np.ones(count, dtype=bool)
+                    if start is not None:
+                        keep &= times >= start
+                    if end is not None:
+                        keep &= times <= end
+                    part = part[keep]
+                parts.append(part)
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    def events(self, start=None, end=None):
+        """
+        * FUNCTION: events
+        * DESCRIPTION: Recorded robot events with start <= time <= end
+        * INPUTS: start, end: time window (s, time.time base), None for open ended
+        * OUTPUTS:
+        * RETURNS: [{'time': , 'type': , 'code': , 'content': }] in time order
+        * NOTES:
+        """
+        result = []
+        with open(self.path, 'rb') as f:
+            for offset, kind, count, first, last in self.__chunks(TELEMETRY_EVENT_CHUNK, start, end):
+                f.seek(offset)
+                size = TELEMETRY_CHUNK_HEADER.unpack(f.read(TELEMETRY_CHUNK_HEADER.size))[4]
+                for timestamp, event_type, code, content in json.loads(zlib.decompress(f.read(size))):
+                    if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+                        result.append({'time': timestamp, 'type': event_type, 'code': code, 'content': content})
+        result.sort(key=lambda event: event['time'])
+        return result
+
+    def __chunks(self, kind, start, end):
+        for entry in self.index:
+            if entry[1] != kind:
+                continue
+            if start is not None and entry[4] < start:
+                continue
+            if end is not None and entry[3] > end:
+                continue
+            yield entry
+
+    def __read_index(self, f):
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size >= self.__data_offset + TELEMETRY_FILE_TRAILER.size:
+            f.seek(file_size - TELEMETRY_FILE_TRAILER.size)
+            index_offset, chunks, magic = TELEMETRY_FILE_TRAILER.unpack(f.read(TELEMETRY_FILE_TRAILER.size))
+            if magic == TELEMETRY_FILE_MAGIC and \
+                    index_offset + chunks * TELEMETRY_INDEX_ENTRY.size + TELEMETRY_FILE_TRAILER.size == file_size:
+                f.seek(index_offset)
+                raw = f.read(chunks * TELEMETRY_INDEX_ENTRY.size)
+                return [TELEMETRY_INDEX_ENTRY.unpack_from(raw, i * TELEMETRY_INDEX_ENTRY.size)
+                        for i in range(chunks)]
+        # Recorder did not close the file: walk the chunk headers, a torn last chunk is ignored
+        logger.warn("{0}: no index, scanning chunk headers".format(self.path))
+        index = []
+        offset = self.__data_offset
+        while offset + TELEMETRY_CHUNK_HEADER.size <= file_size:
+            f.seek(offset)
+            kind, count, first, last, size = TELEMETRY_CHUNK_HEADER.unpack(f.read(TELEMETRY_CHUNK_HEADER.size))
+            if kind not in (TELEMETRY_SAMPLE_CHUNK, TELEMETRY_EVENT_CHUNK) or \
+                    offset + TELEMETRY_CHUNK_HEADER.size + size > file_size:
+                break
+            index.append((offset, kind, count, first, last))
+            offset += TELEMETRY_CHUNK_HEADER.size + size
+        return index
+
+
+def benchmark_recorder(path, rate=250.0, seconds=600.0, shift_hours=8.0, resolution=TELEMETRY_RESOLUTION):
+    """
+    * FUNCTION: benchmark_recorder
+    * DESCRIPTION: Record synthetic telemetry (smooth joint motion with sensor noise, joint status every 10th sample)
+    * and project the size of a shift
+    * INPUTS: path: output file, rate: sample rate (Hz), seconds: recorded duration (s), shift_hours: projection
+    * resolution: TelemetryRecorder resolution, None for lossless
+    * OUTPUTS:
+    * RETURNS: {"records": , "file_bytes": , "raw_bytes": , "ratio": , "shift_megabytes": ,
+    * "write_records_per_sec": , "window_read_seconds": , "full_read_seconds": }
+    * NOTES:
+    """
+    count = int(rate * seconds)
+    t0 = time.time()
+    t = np.arange(count) / rate
+    records = np.zeros(count, dtype=TELEMETRY_DTYPE)
+    records['time'] = t0 + t + np.random.normal(0.0, 2e-5, count)
+    records['sequence'] = np.arange(1, count + 1)
+    records['jitter'] = np.abs(np.random.normal(0.0, 1e-4, count))
+    phase = np.linspace(0.0, 2.0 * np.pi, 6, endpoint=False)
+    records['joint'] = 1.2 * np.sin(0.3 * t[:, None] + phase) + np.random.normal(0.0, 1e-5, (count, 6))
+    records['pos'] = 0.4 * np.cos(0.3 * t[:, None] + phase[:3]) + np.random.normal(0.0, 1e-6, (count, 3))
+    ori = np.cos(0.1 * t[:, None] + phase[:4])
+    records['ori'] = ori / np.linalg.norm(ori, axis=1)[:, None]
+    status = np.zeros(count, dtype=bool)
+    status[::10] = True
+    for name, level, noise in (('current', 800.0, 20.0), ('voltage', 48.0, 0.05), ('temperature', 35.0, 0.0)):
+        values = np.full((count, 6), np.nan, dtype=np.float32)
+        values[status] = np.round(level + np.random.normal(0.0, noise, (int(status.sum()), 6)), 2)
+        records[name] = values
+
+    start = time.perf_counter()
+    with TelemetryRecorder(path, resolution=resolution) as recorder:
+        for begin in range(0, count, 250):
+            recorder.append(records[begin:begin + 250])
+        raw_bytes = recorder.raw_bytes + records[recorder.records:].nbytes
+    write_seconds = time.perf_counter() - start
+    file_bytes = os.path.getsize(path)
+
+    telemetry = TelemetryFile(path)
+    start = time.perf_counter()
+    window = telemetry.read(t0 + seconds / 2, t0 + seconds / 2 + 10.0)
+    window_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    everything = telemetry.read()
+    full_seconds = time.perf_counter() - start
+    for name in TELEMETRY_DTYPE.names:
+        step = telemetry.resolution.get(name)
+        same = np.allclose(everything[name], records[name], rtol=0.0, atol=step * 0.51) if step else \
+            np.array_equal(everything[name], records[name], equal_nan=True)
+        if not same:
+            raise RuntimeError("telemetry round trip mismatch in {0}".format(name))
+    return {"records": count, "file_bytes": file_bytes, "raw_bytes": raw_bytes, "ratio": raw_bytes / file_bytes,
+            "shift_megabytes": file_bytes / seconds * shift_hours * 3600.0 / 1e6,
+            "write_records_per_sec": count / write_seconds, "window_records": len(window),
+            "window_read_seconds": window_seconds, "full_read_seconds": full_seconds}
+
+
+if __name__ == '__main__':
+    for resolution in (TELEMETRY_RESOLUTION, None):
+        print("resolution {0}".format(resolution))
+        for name, value in benchmark_recorder('./telemetry-benchmark.tlm', resolution=resolution).items():
+            print("  {0:<22s} {1}".format(name, value))
+    os.remove('./telemetry-benchmark.tlm')
@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+# coding=utf-8
+import time
+from robot_control_en import Auboi5Robot, RobotError, RobotErrorType, RobotEventType, logger
+
+
+# Reconnect delay: first delay, growth factor and largest delay, unit (s)
+RECONNECT_BACKOFF = (0.2, 2.0, 5.0)
+
+# Reconnect attempts before recover() gives up, None to retry forever
+RECONNECT_ATTEMPTS = 20
+
+# Calls that are not repeated after a reconnect, the arm must not start a motion the caller believes failed
+NO_RETRY_PREFIX = ('move_', 'startup_offline_track', 'upload_offline_track', 'robot_startup', 'robot_shutdown')
+
+
+class RobotSession:
+    """
+    * Auboi5Robot with automatic reconnect
+    * Calls go through the session (session.set_joint_maxacc(...), session.move_line(...), ...). When the link is lost
+    * (RobotEvent_socketDisconnected or RobotError_NoLink) the session logs in again with exponential backoff,
+    * re-registers the event callback, replays robot.session_settings (everything applied since connect, in order)
+    * and repeats the failed call, except for motions which are raised to the caller after the recovery.
+    * Recovery times are kept in self.recovery_seconds.
+    """
+
+    def __init__(self, robot=None, ip='localhost', port=8899, backoff=RECONNECT_BACKOFF,
+                 max_attempts=RECONNECT_ATTEMPTS):
+        self.robot = robot if robot is not None else Auboi5Robot()
+        self.ip = ip
+        self.port = port
+        self.backoff = backoff
+        self.max_attempts = max_attempts
+        # Duration of every successful recovery, unit (s)
+        self.recovery_seconds = []
+        self.failed_recoveries = 0
+        # Set from the event callback thread when RobotEvent_socketDisconnected arrives
+        self.link_down = False
+        self.robot.event_waiter.add_listener(self.__on_robot_event)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.robot, name)
+        if not callable(attribute):
+            return attribute
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def connect(self):
+        """
+        * FUNCTION: connect
+        * DESCRIPTION: Create the context if needed and log in
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Failure return: other
+        * NOTES:
+        """
+        if self.robot.rshd < 0:
+            self.robot.create_context()
+        return self.robot.connect(self.ip, self.port)
+
+    def call(self, method, *args, **kwargs):
+        """
+        * FUNCTION: call
+        * DESCRIPTION: Call an Auboi5Robot method, recovering the session when the link is lost
+        * INPUTS: method: method name, args / kwargs: its arguments
+        * OUTPUTS:
+        * RETURNS: return value of the method
+        * NOTES: Raises the original RobotError when the recovery fails or the call is a motion.
+        * A disconnect event seen since the last call is recovered before the call is made
+        """
+        if self.link_down and self.recover() != RobotErrorType.RobotError_SUCC:
+            self.robot.raise_error(RobotErrorType.RobotError_NoLink, 0, "session recovery failed")
+        try:
+            return getattr(self.robot, method)(*args, **kwargs)
+        except RobotError as error:
+            if not self.link_lost(error):
+                raise
+            if self.recover() != RobotErrorType.RobotError_SUCC or method.startswith(NO_RETRY_PREFIX):
+                raise
+        return getattr(self.robot, method)(*args, **kwargs)
+
+    def link_lost(self, error=None):
+        """
+        * FUNCTION: link_lost
+        * DESCRIPTION: Whether an error, or the last error of the robot, means the server link is gone
+        * INPUTS: error: RobotError, None for robot.last_error
+        * OUTPUTS:
+        * RETURNS: True / False
+        * NOTES:
+        """
+        if error is None:
+            if self.link_down:
+                return True
+            error = self.robot.last_error
+        return error.error_type in (RobotEventType.RobotEvent_socketDisconnected, RobotErrorType.RobotError_NoLink)
+
+    def recover(self):
+        """
+        * FUNCTION: recover
+        * DESCRIPTION: Log in again and restore the session configuration
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Failure return: result of the last login attempt or of the failing setter
+        * NOTES: robot_startup is not repeated, a lost socket does not power the arm off
+        """
+        robot = self.robot
+        self.link_down = False
+        start = time.monotonic()
+        settings = list(robot.session_settings.values())
+        callback = robot.event_callback
+        logger.warn("link to {0}:{1} lost, reconnecting".format(self.ip, self.port))
+
+        if robot.connected:
+            try:
+                robot.disconnect()
+            except Exception as error:
+                logger.info("logout after link loss: {0}".format(error))
+            robot.connected = False
+        robot.last_error = RobotError()
+
+        result = self.__reconnect()
+        if result == RobotErrorType.RobotError_SUCC and callback is not None:
+            result = robot.set_robot_event_callback(callback)
+        if result == RobotErrorType.RobotError_SUCC:
+            result = self.replay(settings)
+        if result != RobotErrorType.RobotError_SUCC:
+            self.link_down = True
+            self.failed_recoveries += 1
+            logger.error("session recovery failed, result={0}".format(result))
+            return result
+
+        elapsed = time.monotonic() - start
+        self.recovery_seconds.append(elapsed)
+        logger.info("session recovered in {0:.3f}s, {1} settings replayed".format(elapsed, len(settings)))
+        return RobotErrorType.RobotError_SUCC
+
+    def replay(self, settings):
+        """
+        * FUNCTION: replay
+        * DESCRIPTION: Apply recorded settings in order
+        * INPUTS: settings: [(method name, args)], e.g. robot.session_settings.values()
+        * OUTPUTS:
+        * RETURNS: Successful return: RobotError.RobotError_SUCC
+        * Failure return: result of the first failing setter
+        * NOTES:
+        """
+        for method, args in settings:
+            try:
+                result = getattr(self.robot, method)(*args)
+            except RobotError as error:
+                logger.error("replay {0} failed: {1}".format(method, error))
+                return error.error_type
+            if result != RobotErrorType.RobotError_SUCC:
+                logger.error("replay {0} failed, result={1}".format(method, result))
+                return result
+        return RobotErrorType.RobotError_SUCC
+
+    def recovery_stats(self):
+        """
+        * FUNCTION: recovery_stats
+        * DESCRIPTION: Summary of the recovery time metric
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: {"recoveries": , "failed": , "last": , "mean": , "max": }, times in (s)
+        * NOTES:
+        """
+        times = self.recovery_seconds
+        return {"recoveries": len(times), "failed": self.failed_recoveries,
+                "last": times[-1] if times else None,
+                "mean": sum(times) / len(times) if times else None,
+                "max": max(times) if times else None}
+
+    def __on_robot_event(self, event):
+        if event['type'] == RobotEventType.RobotEvent_socketDisconnected:
+            self.link_down = True
+
+    def __reconnect(self):
+        delay, factor, max_delay = self.backoff
+        attempt = 0
+        while True:
+            attempt += 1
+            result = self.robot.connect(self.ip, self.port)
+            if result == RobotErrorType.RobotError_SUCC:
+                return result
+            if self.max_attempts is not None and attempt >= self.max_attempts:
+                return result
+            time.sleep(delay)
+            delay = min(delay * factor, max_delay)
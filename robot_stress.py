@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# coding=utf-8
+import threading
+import time
+import robot_control_en
+import robot_kinematics
+from robot_control_en import Auboi5Robot, RobotEventType, RobotModelType
+
+
+class FakeLibpyauboi5:
+    """
+    * Minimal stand-in for libpyauboi5 that checks the concurrency model of Auboi5Robot
+    * Commands (anything but get_* / is_* queries and move_stop) are counted while they run; two at once on one
+    * handle is a violation. move_line blocks for move_seconds or until move_stop.
+    """
+
+    def __init__(self, move_seconds=0.02):
+        self.move_seconds = move_seconds
+        self.violations = 0
+        self.commands = 0
+        self.polls = 0
+        self.polls_during_motion = 0
+        self.moving = False
+        self.callback = None
+        self.__lock = threading.Lock()
+        self.__active = 0
+        self.__stop = threading.Event()
+        self.__waypoint = {'joint': [0.0] * 6, 'pos': [0.0, 0.0, 0.0], 'ori': [1.0, 0.0, 0.0, 0.0]}
+
+    def __getattr__(self, name):
+        if name.startswith('get_') or name.startswith('is_'):
+            return lambda *args: 0
+        return lambda *args: self.__command(lambda: 0)
+
+    def __command(self, body):
+        with self.__lock:
+            self.__active += 1
+            self.commands += 1
+            if self.__active > 1:
+                self.violations += 1
+        try:
+            return body()
+        finally:
+            with self.__lock:
+                self.__active -= 1
+
+    def create_context(self):
+        return 1
+
+    def login(self, rshd, ip, port):
+        return self.__command(lambda: 0)
+
+    def set_robot_event_callback(self, rshd, callback):
+        self.callback = callback
+        return self.__command(lambda: 0)
+
+    def move_line(self, rshd, joint_radian):
+        def move():
+            self.__stop.clear()
+            self.moving = True
+            self.__stop.wait(self.move_seconds)
+            self.__waypoint = {'joint': list(joint_radian), 'pos': [0.0, 0.0, 0.0], 'ori': [1.0, 0.0, 0.0, 0.0]}
+            self.moving = False
+            return 0
+        return self.__command(move)
+
+    def move_stop(self, rshd):
+        self.__stop.set()
+        return 0
+
+    def forward_kin(self, rshd, joint_radian):
+        # An Aubo_i5, so connect accepts the default robot_model
+        pos, ori = robot_kinematics.forward_kin_batch(joint_radian, RobotModelType.Aubo_i5)
+        return {'joint': list(joint_radian), 'pos': pos[0].tolist(), 'ori': ori[0].tolist()}
+
+    def get_current_waypoint(self, rshd):
+        with self.__lock:
+            self.polls += 1
+            if self.moving:
+                self.polls_during_motion += 1
+        return self.__waypoint
+
+
+def handle_stress_test(duration=2.0, pollers=2, commanders=2, move_seconds=0.02):
+    """
+    * FUNCTION: handle_stress_test
+    * DESCRIPTION: Hammer one Auboi5Robot handle from several threads against FakeLibpyauboi5
+    * INPUTS: duration: test time, unit (s)
+    * pollers: threads polling get_current_waypoint
+    * commanders: threads issuing setters while the motion thread runs move_line
+    * move_seconds: duration of one fake move_line
+    * OUTPUTS:
+    * RETURNS: {"ok": , "violations": , "errors": , "moves": , "commands": , "polls": , "polls_during_motion": ,
+    * "max_poll_seconds": , "stops": , "events": }
+    * NOTES: ok requires no overlapping commands, no exceptions and polls answered during motions.
+    * The real libpyauboi5 module is swapped out only for the duration of the test
+    """
+    fake = FakeLibpyauboi5(move_seconds)
+    real = robot_control_en.libpyauboi5
+    robot_control_en.libpyauboi5 = fake
+    errors = []
+    counters = {"moves": 0, "stops": 0, "events": 0, "max_poll_seconds": 0.0}
+    deadline = time.monotonic() + duration
+
+    def guarded(body):
+        def run():
+            try:
+                while time.monotonic() < deadline:
+                    body()
+            except Exception as error:
+                errors.append(repr(error))
+        return run
+
+    try:
+        robot = Auboi5Robot()
+        robot.create_context()
+        robot.connect('localhost', 8899)
+        robot.set_robot_event_callback(lambda event: None)
+
+        def move():
+            robot.move_line((0.1, 0.2, 0.3, 0.4, 0.5, 0.6))
+            counters["moves"] += 1
+
+        def poll():
+            start = time.monotonic()
+            if robot.get_current_waypoint() is None:
+                raise RuntimeError("get_current_waypoint returned None")
+            counters["max_poll_seconds"] = max(counters["max_poll_seconds"], time.monotonic() - start)
+
+        def configure():
+            robot.set_joint_maxacc((1.0,) * 6)
+            robot.set_end_max_line_velc(0.2)
+            robot.set_arrival_ahead_distance(0.01)
+
+        def stop():
+            time.sleep(move_seconds * 3)
+            robot.move_stop()
+            counters["stops"] += 1
+
+        def events():
+            fake.callback({'type': RobotEventType.RobotEvent_atTrackTargetPos, 'code': 0, 'content': ''})
+            counters["events"] += 1
+            time.sleep(0.001)
+
+        threads = [threading.Thread(target=guarded(move)), threading.Thread(target=guarded(stop)),
+                   threading.Thread(target=guarded(events))]
+        threads += [threading.Thread(target=guarded(poll)) for _ in range(pollers)]
+        threads += [threading.Thread(target=guarded(configure)) for _ in range(commanders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        robot.disconnect()
+    finally:
+        robot_control_en.libpyauboi5 = real
+
+    result = {"violations": fake.violations, "errors": errors, "commands": fake.commands, "polls": fake.polls,
+              "polls_during_motion": fake.polls_during_motion}
+    result.update(counters)
+    result["ok"] = not fake.violations and not errors and fake.polls_during_motion > 0
+    return result
+
+
+if __name__ == '__main__':
+    for name, value in handle_stress_test().items():
+        print("{0:<20s} {1}".format(name, value))
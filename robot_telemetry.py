@@ -0,0 +1,556 @@
+#! /usr/bin/env python
+# coding=utf-8
+import os
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from robot_control_en import RobotError, logger
+
+
+# One telemetry record: sample time (s, time.time base), sequence number, scheduling delay (s),
+# waypoint and, when sampled, joint current (mA), voltage (V) and temperature (degree Celsius)
+TELEMETRY_DTYPE = np.dtype([('time', 'f8'), ('sequence', 'u8'), ('jitter', 'f4'),
+                            ('joint', 'f8', (6,)), ('pos', 'f8', (3,)), ('ori', 'f8', (4,)),
+                            ('current', 'f4', (6,)), ('voltage', 'f4', (6,)), ('temperature', 'f4', (6,))])
+
+# Default sampling rate, unit (Hz)
+TELEMETRY_RATE = 250.0
+
+# Default ring capacity, one minute at the default rate
+TELEMETRY_CAPACITY = 15000
+
+# Time before a deadline spent busy waiting instead of sleeping, unit (s)
+TELEMETRY_SPIN = 0.0002
+
+# Words of the ring header: records written, capacity, record size
+TELEMETRY_HEADER_WORDS = 8
+
+JOINT_NAMES = ('joint1', 'joint2', 'joint3', 'joint4', 'joint5', 'joint6')
+
+
+class TelemetryRing:
+    """
+    * Preallocated ring of TELEMETRY_DTYPE records
+    * One writer fills slot(), then commit() publishes it. Readers copy with latest() / since() without locking:
+    * every record carries its sequence number (1, 2, ...), slot() zeroes it before the record is refilled, and a
+    * copied record is kept only when its slot still holds the same sequence number after the copy (seqlock check).
+    * Records the writer reused while they were copied, including the one it is filling, are dropped.
+    * header / data may be given to place the ring in an existing buffer, see SharedTelemetryRing.
+    """
+
+    def __init__(self, capacity=TELEMETRY_CAPACITY, dtype=TELEMETRY_DTYPE, header=None, data=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        # header[0]: number of records committed so far
+        self.header = np.zeros(TELEMETRY_HEADER_WORDS, dtype=np.uint64) if header is None else header
+        self.data = np.zeros(capacity, dtype=dtype) if data is None else data
+        self.sequence = self.data['sequence']
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    @property
+    def written(self):
+        return int(self.header[0])
+
+    def slot(self):
+        """
+        * FUNCTION: slot
+        * DESCRIPTION: Index of the record the writer fills next
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: index into self.data
+        * NOTES: Marks the slot as being written (sequence number 0) until commit()
+        """
+        index = int(self.header[0]) % self.capacity
+        self.sequence[index] = 0
+        return index
+
+    def commit(self):
+        """
+        * FUNCTION: commit
+        * DESCRIPTION: Publish the record at slot()
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: The record, then its sequence number, then the counter are stored, in that order
+        """
+        written = int(self.header[0])
+        self.sequence[written % self.capacity] = written + 1
+        self.header[0] = written + 1
+
+    def latest(self, count=None):
+        """
+        * FUNCTION: latest
+        * DESCRIPTION: Copy of the newest records, oldest first
+        * INPUTS: count: number of records, None for all retained records
+        * OUTPUTS:
+        * RETURNS: structured array
+        * NOTES: A full ring returns at most capacity - 1 records, the oldest slot is the next one written
+        """
+        written = self.written
+        available = min(written, self.capacity)
+        count = available if count is None else min(count, available)
+        start = (written - count) % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            records = self.data[start:end].copy()
+            current = self.sequence[start:end].copy()
+        else:
+            records = np.concatenate((self.data[start:], self.data[:end - self.capacity]))
+            current = np.concatenate((self.sequence[start:], self.sequence[:end - self.capacity]))
+        # The writer has since reused the slots of the oldest records, including the one being filled now
+        oldest = self.written - self.capacity + 1
+        sequence = records['sequence']
+        # A slot refilled during the copy no longer holds the sequence number copied with its record
+        return records[(sequence == current) & (sequence > oldest) & (sequence <= written)]
+
+    def since(self, sequence):
+        """
+        * FUNCTION: since
+        * DESCRIPTION: Records committed after a given sequence number
+        * INPUTS: sequence: last sequence number already seen, 0 for everything
+        * OUTPUTS:
+        * RETURNS: (records, lost): structured array oldest first, number of records overwritten before they were read
+        * NOTES:
+        """
+        written = self.written
+        lost = max(written - self.capacity + 1 - sequence, 0)
+        records = self.latest(written - sequence - lost)
+        return records[records['sequence'] > sequence], lost
+
+    def views(self, sequence):
+        """
+        * FUNCTION: views
+        * DESCRIPTION: Zero-copy views of the records committed after a given sequence number
+        * INPUTS: sequence: last sequence number already seen, 0 for everything
+        * OUTPUTS:
+        * RETURNS: (views, first, last, lost): one or two structured array views oldest first, sequence numbers
+        * of the first and last record in them, number of records overwritten before they were read
+        * NOTES: The writer keeps running; check overwritten(first) after using the views
+        """
+        written = self.written
+        first = max(sequence + 1, written - self.capacity + 2, 1)
+        lost = first - sequence - 1
+        if first > written:
+            return (), first, written, lost
+        start = (first - 1) % self.capacity
+        end = start + written - first + 1
+        if end <= self.capacity:
+            return (self.data[start:end],), first, written, lost
+        return (self.data[start:], self.data[:end - self.capacity]), first, written, lost
+
+    def overwritten(self, sequence):
+        """
+        * FUNCTION: overwritten
+        * DESCRIPTION: Whether the record with a given sequence number has been reused by the writer
+        * INPUTS: sequence: record sequence number
+        * OUTPUTS:
+        * RETURNS: True / False
+        * NOTES: The slot being filled counts as reused
+        """
+        return sequence <= self.written - self.capacity + 1
+
+
+def _attach_shared_memory(name):
+    # Attaching registers the block with this process's resource tracker, which would unlink it at exit
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == 'posix':
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SharedTelemetryRing(TelemetryRing):
+    """
+    * TelemetryRing in multiprocessing.shared_memory, written by one sampler process, read by any number of processes
+    * SharedTelemetryRing(capacity=...) creates a block, SharedTelemetryRing(name) attaches to an existing one.
+    * The creator calls unlink() when the bus is no longer needed; every process calls close().
+    * Readers use TelemetryReader, or since() / latest() for copies; both re-check the record sequence numbers after
+    * reading the records, see TelemetryRing.
+    """
+
+    def __init__(self, name=None, capacity=TELEMETRY_CAPACITY, dtype=TELEMETRY_DTYPE):
+        header_size = TELEMETRY_HEADER_WORDS * 8
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_size + capacity * dtype.itemsize)
+            header = np.ndarray(TELEMETRY_HEADER_WORDS, dtype=np.uint64, buffer=self.shm.buf)
+            header[:] = 0
+            header[1] = capacity
+            header[2] = dtype.itemsize
+            self.owner = True
+        else:
+            self.shm = _attach_shared_memory(name)
+            header = np.ndarray(TELEMETRY_HEADER_WORDS, dtype=np.uint64, buffer=self.shm.buf)
+            capacity, itemsize = int(header[1]), int(header[2])
+            if itemsize != dtype.itemsize:
+                # The header view must be gone before the block is unmapped
+                del header
+                self.shm.close()
+                raise ValueError("shared telemetry record size {0} does not match dtype size {1}".format(
+                    itemsize, dtype.itemsize))
+            self.owner = False
+        data = np.ndarray(capacity, dtype=dtype, buffer=self.shm.buf, offset=header_size)
+        TelemetryRing.__init__(self, capacity, dtype, header, data)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        """
+        * FUNCTION: close
+        * DESCRIPTION: Detach from the shared memory block
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES: Views handed out by this ring must not be used afterwards
+        """
+        self.header = self.data = self.sequence = None
+        self.shm.close()
+
+    def unlink(self):
+        """
+        * FUNCTION: unlink
+        * DESCRIPTION: Free the shared memory block, called once by its creator
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        # A reader process sharing this process's resource tracker may have unregistered the block when attaching
+        if os.name == 'posix' and sys.version_info < (3, 13):
+            resource_tracker.register(self.shm._name, "shared_memory")
+        self.shm.unlink()
+
+
+class TelemetryReader:
+    """
+    * Cursor over a TelemetryRing for one consumer
+    * read() returns zero-copy views of the records published since the previous read();
+    * valid() tells whether they were still intact once the consumer is done with them.
+    """
+
+    def __init__(self, ring, sequence=0):
+        self.ring = ring
+        # Sequence number of the last record returned
+        self.sequence = sequence
+        # Records the writer overwrote before this reader got to them
+        self.lost = 0
+        self.__first = sequence + 1
+        self.__views = ()
+
+    def read(self):
+        """
+        * FUNCTION: read
+        * DESCRIPTION: Views of the records published since the last call
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: tuple of zero, one or two structured array views, oldest first
+        * NOTES:
+        """
+        views, first, last, lost = self.ring.views(self.sequence)
+        self.lost += lost
+        self.__first = first
+        self.__views = views
+        self.sequence = max(last, self.sequence)
+        return views
+
+    def valid(self):
+        """
+        * FUNCTION: valid
+        * DESCRIPTION: Whether the views of the last read() have not been overwritten yet
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: True / False
+        * NOTES: Copy what is kept beyond the current processing step, or call valid() before trusting it.
+        * Every record must still carry the sequence number it was published with (seqlock check)
+        """
+        if self.ring.overwritten(self.__first):
+            return False
+        expected = self.__first
+        for view in self.__views:
+            if not np.array_equal(view['sequence'], np.arange(expected, expected + len(view), dtype=np.uint64)):
+                return False
+            expected += len(view)
+        return True
+
+
+class TelemetrySampler:
+    """
+    * Background thread sampling get_current_waypoint (and optionally get_joint_status) on a fixed schedule
+    * Deadlines are absolute (start + k * period), so delays do not accumulate. A sample more than one period
+    * late skips the missed deadlines instead of bursting to catch up; they are counted in self.missed.
+    * Values are written in place into self.ring, no Python objects are built per sample beyond what
+    * libpyauboi5 returns.
+    """
+
+    def __init__(self, robot, rate=TELEMETRY_RATE, capacity=TELEMETRY_CAPACITY, joint_status_every=0,
+                 spin=TELEMETRY_SPIN, ring=None):
+        """
+        * robot: Auboi5Robot, or anything with get_current_waypoint / get_joint_status
+        * rate: sampling rate, unit (Hz)
+        * capacity: ring capacity in records
+        * joint_status_every: also read get_joint_status every n-th sample, 0 to never read it; records without a
+        * successful read hold NaN current, voltage and temperature
+        * spin: busy wait before each deadline, unit (s)
+        * ring: TelemetryRing to write to, e.g. a SharedTelemetryRing, None for a new ring of the given capacity
+        """
+        if rate <= 0.0:
+            raise ValueError("rate must be positive")
+        self.robot = robot
+        self.period = 1.0 / rate
+        self.ring = TelemetryRing(capacity) if ring is None else ring
+        self.joint_status_every = joint_status_every
+        self.spin = spin
+        self.missed = 0
+        self.errors = 0
+        self.__thread = None
+        self.__running = False
+        data = self.ring.data
+        self.__columns = (data['time'], data['jitter'], data['joint'], data['pos'], data['ori'],
+                          data['current'], data['voltage'], data['temperature'])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def running(self):
+        return self.__running
+
+    def start(self):
+        """
+        * FUNCTION: start
+        * DESCRIPTION: Start the sampling thread
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        if self.__running:
+            return
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='aubo-telemetry', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        * FUNCTION: stop
+        * DESCRIPTION: Stop the sampling thread and wait for it
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: None
+        * NOTES:
+        """
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self):
+        """
+        * FUNCTION: stats
+        * DESCRIPTION: Sampling statistics over the records in the ring
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: {"samples": , "missed": , "errors": , "rate": , "jitter_mean": , "jitter_p99": , "jitter_max": }
+        * NOTES: rate in (Hz), jitter is the delay after the scheduled deadline in (s)
+        """
+        records = self.ring.latest()
+        result = {"samples": self.ring.written, "missed": self.missed, "errors": self.errors,
+                  "rate": 0.0, "jitter_mean": 0.0, "jitter_p99": 0.0, "jitter_max": 0.0}
+        if len(records) >= 2:
+            result["rate"] = float((len(records) - 1) / (records['time'][-1] - records['time'][0]))
+        if len(records):
+            jitter = records['jitter']
+            result["jitter_mean"] = float(jitter.mean())
+            result["jitter_p99"] = float(np.percentile(jitter, 99))
+            result["jitter_max"] = float(jitter.max())
+        return result
+
+    def __run(self):
+        period = self.period
+        spin = self.spin
+        clock = time.perf_counter
+        # time.time at the perf_counter origin, keeps the stored timestamps comparable between processes
+        epoch = time.time() - clock()
+        deadline = clock()
+        count = 0
+        while self.__running:
+            deadline += period
+            remaining = deadline - clock()
+            if remaining > spin:
+                time.sleep(remaining - spin)
+            while clock() < deadline:
+                pass
+            now = clock()
+            late = now - deadline
+            if late >= period:
+                skipped = int(late / period)
+                self.missed += skipped
+                deadline += skipped * period
+            self.__sample(now + epoch, late, count)
+            count += 1
+
+    def __sample(self, timestamp, late, count):
+        times, jitter, joint, pos, ori, current, voltage, temperature = self.__columns
+        ring = self.ring
+        index = ring.slot()
+        try:
+            waypoint = self.robot.get_current_waypoint()
+            if waypoint is None:
+                self.errors += 1
+                return
+            joint[index] = waypoint['joint']
+            pos[index] = waypoint['pos']
+            ori[index] = waypoint['ori']
+            status = None
+            if self.joint_status_every and count % self.joint_status_every == 0:
+                status = self.robot.get_joint_status()
+            if status is not None:
+                for axis, name in enumerate(JOINT_NAMES):
+                    values = status[name]
+                    current[index, axis] = values['current']
+                    voltage[index, axis] = values['voltage']
+                    temperature[index, axis] = values['temperature']
+            else:
+                # Skipped or failed read: NaN rather than the values left in the slot by an older record
+                current[index] = np.nan
+                voltage[index] = np.nan
+                temperature[index] = np.nan
+        except RobotError as error:
+            self.errors += 1
+            if self.errors == 1:
+                logger.error("telemetry sampling failed: {0}".format(error))
+            return
+        times[index] = timestamp
+        jitter[index] = late
+        ring.commit()
+
+
+def run_sampler_process(ring_name, ip='localhost', port=8899, rate=TELEMETRY_RATE, joint_status_every=0,
+                        stop_event=None):
+    """
+    * FUNCTION: run_sampler_process
+    * DESCRIPTION: Target of the sampler process feeding a SharedTelemetryRing
+    * INPUTS: ring_name: name of a SharedTelemetryRing created by the parent process
+    * ip, port: robotic arm server
+    * rate, joint_status_every: see TelemetrySampler
+    * stop_event: multiprocessing.Event ending the sampling, None to sample until interrupted
+    * OUTPUTS:
+    * RETURNS: None
+    * NOTES: multiprocessing.Process(target=run_sampler_process, args=(ring.name, ip, port)).start()
+    """
+    from robot_control_en import Auboi5Robot, RobotErrorType
+    ring = SharedTelemetryRing(ring_name)
+    Auboi5Robot.initialize()
+    robot = Auboi5Robot()
+    robot.create_context()
+    try:
+        if robot.connect(ip, port) != RobotErrorType.RobotError_SUCC:
+            logger.error("telemetry process: connect server {0}:{1} failed.".format(ip, port))
+            return
+        with TelemetrySampler(robot, rate, joint_status_every=joint_status_every, ring=ring):
+            try:
+                while stop_event is None or not stop_event.is_set():
+                    time.sleep(0.1)
+            except KeyboardInterrupt:
+                pass
+        robot.disconnect()
+    finally:
+        ring.close()
+        Auboi5Robot.uninitialize()
+
+
+def _queue_consumer(queue, done):
+    received = 0
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        received += 1
+    done.put(received)
+
+
+def _ring_consumer(ring_name, count, done):
+    ring = SharedTelemetryRing(ring_name)
+    reader = TelemetryReader(ring)
+    received = 0
+    checksum = 0.0
+    while reader.sequence < count:
+        for view in reader.read():
+            received += len(view)
+            checksum += float(view['joint'][:, 0].sum())
+    done.put((received, reader.lost))
+    ring.close()
+
+
+def benchmark_telemetry_bus(count=200000, readers=2, capacity=65536):
+    """
+    * FUNCTION: benchmark_telemetry_bus
+    * DESCRIPTION: Publish count waypoint samples to several consumer processes through multiprocessing.Queue
+    * (one queue per consumer, every sample pickled) and through a SharedTelemetryRing
+    * INPUTS: count: samples, readers: consumer processes, capacity: ring capacity
+    * OUTPUTS:
+    * RETURNS: {"queue": {"seconds": , "samples_per_sec": }, "shared_ring": {"seconds": , "samples_per_sec": , "lost": }}
+    * NOTES: A sample is a joint tuple for the queue and a full TELEMETRY_DTYPE record for the ring
+    """
+    import multiprocessing
+    joint = (0.541678, 0.225068, -0.948709, 0.397018, -1.570800, 0.541673)
+    result = {}
+
+    done = multiprocessing.Queue()
+    queues = [multiprocessing.Queue() for _ in range(readers)]
+    processes = [multiprocessing.Process(target=_queue_consumer, args=(queue, done)) for queue in queues]
+    for process in processes:
+        process.start()
+    start = time.perf_counter()
+    for _ in range(count):
+        for queue in queues:
+            queue.put(joint)
+    for queue in queues:
+        queue.put(None)
+    received = [done.get() for _ in processes]
+    seconds = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    result["queue"] = {"seconds": seconds, "samples_per_sec": count / seconds, "received": received}
+
+    ring = SharedTelemetryRing(capacity=capacity)
+    try:
+        processes = [multiprocessing.Process(target=_ring_consumer, args=(ring.name, count, done))
+                     for _ in range(readers)]
+        for process in processes:
+            process.start()
+        data = ring.data
+        column = data['joint']
+        times = data['time']
+        start = time.perf_counter()
+        for _ in range(count):
+            index = ring.slot()
+            column[index] = joint
+            times[index] = time.time()
+            ring.commit()
+        received = [done.get() for _ in processes]
+        seconds = time.perf_counter() - start
+        for process in processes:
+            process.join()
+        result["shared_ring"] = {"seconds": seconds, "samples_per_sec": count / seconds,
+                                 "received": [item[0] for item in received], "lost": [item[1] for item in received]}
+    finally:
+        ring.close()
+        ring.unlink()
+    return result
+
+
+if __name__ == '__main__':
+    for name, value in benchmark_telemetry_bus().items():
+        print("{0:<12s} {1}".format(name, value))
@@ -0,0 +1,332 @@
+#! /usr/bin/env python
+# coding=utf-8
+import os
+import struct
+import threading
+import time
+from itertools import islice
+from queue import Queue, Full
+import numpy as np
+
+
+# append_offline_track_waypoint accepts less than 3000 waypoints per call
+OFFLINE_TRACK_MAX_CHUNK = 2999
+
+# Number of packed chunks waiting for transfer, packing stays at most this far ahead of the transfer
+OFFLINE_TRACK_PREFETCH = 2
+
+
+def iter_track_chunks(waypoints, chunk_size=OFFLINE_TRACK_MAX_CHUNK):
+    """
+    * FUNCTION: iter_track_chunks
+    * DESCRIPTION: Split waypoints into chunks of at most chunk_size waypoints
+    * INPUTS: waypoints: (N, 6) array, or any iterable of six joint angles, unit (rad)
+    * chunk_size: waypoints per chunk, 1 ~ OFFLINE_TRACK_MAX_CHUNK
+    * OUTPUTS:
+    * RETURNS: generator of (M, 6) float64 arrays, array input is sliced without copying
+    * NOTES: Iterables are consumed lazily, so generators of any length can be streamed
+    """
+    if not 0 < chunk_size <= OFFLINE_TRACK_MAX_CHUNK:
+        raise ValueError("chunk_size must be in 1~{0}, got {1}".format(OFFLINE_TRACK_MAX_CHUNK, chunk_size))
+
+    if isinstance(waypoints, np.ndarray):
+        if waypoints.ndim != 2 or waypoints.shape[1] != 6:
+            raise ValueError("waypoints must have shape (N, 6), got {0}".format(waypoints.shape))
+        for start in range(0, len(waypoints), chunk_size):
+            yield waypoints[start:start + chunk_size]
+        return
+
+    iterator = iter(waypoints)
+    while True:
+        block = list(islice(iterator, chunk_size))
+        if not block:
+            return
+        chunk = np.asarray(block, dtype=np.float64)
+        if chunk.ndim != 2 or chunk.shape[1] != 6:
+            raise ValueError("each waypoint must contain six joint angles")
+        yield chunk
+
+
+def pack_track_chunk(chunk):
+    """
+    * FUNCTION: pack_track_chunk
+    * DESCRIPTION: Convert a chunk to the tuple of tuples expected by append_offline_track_waypoint
+    * INPUTS: chunk: (M, 6) array, unit (rad)
+    * OUTPUTS:
+    * RETURNS: ((j1, ..., j6), ...)
+    * NOTES:
+    """
+    if not np.all(np.isfinite(chunk)):
+        raise ValueError("waypoints contain NaN or infinite values")
+    return tuple(map(tuple, np.asarray(chunk, dtype=np.float64).tolist()))
+
+
+class TrackUploadStats:
+    def __init__(self):
+        self.waypoints = 0
+        self.chunks = 0
+        self.seconds = 0.0
+        # Time spent inside append_offline_track_waypoint
+        self.transfer_seconds = 0.0
+        # Time spent packing, overlapped with the transfer
+        self.pack_seconds = 0.0
+
+    @property
+    def waypoints_per_sec(self):
+        return self.waypoints / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self):
+        return {"waypoints": self.waypoints, "chunks": self.chunks, "seconds": self.seconds,
+                "transfer_seconds": self.transfer_seconds, "pack_seconds": self.pack_seconds,
+                "waypoints_per_sec": self.waypoints_per_sec}
+
+    def __str__(self):
+        return "waypoints={0}, chunks={1}, seconds={2:.3f}, waypoints_per_sec={3:.0f}".format(
+            self.waypoints, self.chunks, self.seconds, self.waypoints_per_sec)
+
+
+def stream_track_chunks(waypoints, append, chunk_size=OFFLINE_TRACK_MAX_CHUNK, stats=None):
+    """
+    * FUNCTION: stream_track_chunks
+    * DESCRIPTION: Pack chunks on a worker thread while the caller thread transfers the previous one
+    * INPUTS: waypoints: see iter_track_chunks
+    * append: function(packed_chunk) -> result code, 0 on success
+    * chunk_size: waypoints per chunk
+    * stats: TrackUploadStats to fill, optional
+    * OUTPUTS:
+    * RETURNS: 0 on success, otherwise the first non-zero append result (the stream stops there)
+    * NOTES: Errors raised while packing are re-raised in the caller thread
+    """
+    if stats is None:
+        stats = TrackUploadStats()
+    packed = Queue(maxsize=OFFLINE_TRACK_PREFETCH)
+    stop = threading.Event()
+    done = object()
+
+    def packer():
+        try:
+            for chunk in iter_track_chunks(waypoints, chunk_size):
+                start = time.perf_counter()
+                item = (len(chunk), pack_track_chunk(chunk))
+                stats.pack_seconds += time.perf_counter() - start
+                while not stop.is_set():
+                    try:
+                        packed.put(item, timeout=0.1)
+                        break
+                    except Full:
+                        continue
+                if stop.is_set():
+                    return
+            packed.put(done)
+        except BaseException as e:
+            packed.put(e)
+
+    worker = threading.Thread(target=packer, name="track-packer")
+    worker.daemon = True
+    start_time = time.perf_counter()
+    worker.start()
+    result = 0
+    try:
+        while True:
+            item = packed.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            count, chunk = item
+            start = time.perf_counter()
+            result = append(chunk)
+            stats.transfer_seconds += time.perf_counter() - start
+            if result != 0:
+                break
+            stats.waypoints += count
+            stats.chunks += 1
+    finally:
+        stop.set()
+        # Unblock the packer if it waits on a full queue
+        while worker.is_alive():
+            while not packed.empty():
+                packed.get_nowait()
+            worker.join(0.05)
+        stats.seconds = time.perf_counter() - start_time
+    return result
+
+
+# Binary track file: 64 byte little-endian header followed by an (N, 6) C-order payload
+# magic (8s), version (H), dtype code (H), joint count (I), sample count (Q), sample period in seconds (d)
+TRACK_FILE_MAGIC = b'AUBOTRK\x00'
+TRACK_FILE_VERSION = 1
+TRACK_FILE_HEADER = struct.Struct('<8sHHIQd')
+TRACK_FILE_HEADER_SIZE = 64
+TRACK_FILE_DTYPES = {0: np.dtype('<f8'), 1: np.dtype('<f4')}
+
+# Lines parsed per block when converting text track files
+TRACK_TEXT_BLOCK = 65536
+
+
+def _dtype_code(dtype):
+    dtype = np.dtype(dtype).newbyteorder('<')
+    for code, value in TRACK_FILE_DTYPES.items():
+        if value == dtype:
+            return code
+    raise ValueError("track dtype must be float64 or float32, got {0}".format(dtype))
+
+
+def _write_track_header(f, dtype_code, count, period):
+    header = TRACK_FILE_HEADER.pack(TRACK_FILE_MAGIC, TRACK_FILE_VERSION, dtype_code, 6, count, period)
+    f.seek(0)
+    f.write(header.ljust(TRACK_FILE_HEADER_SIZE, b'\x00'))
+
+
+def read_track_header(path):
+    """
+    * FUNCTION: read_track_header
+    * DESCRIPTION: Read and validate the header of a binary track file
+    * INPUTS: path: binary track file
+    * OUTPUTS:
+    * RETURNS: {"version": , "dtype": numpy dtype, "count": waypoints, "period": seconds, 0 when unknown}
+    * NOTES: Raises ValueError when the file is not a complete binary track file
+    """
+    with open(path, 'rb') as f:
+        raw = f.read(TRACK_FILE_HEADER_SIZE)
+    if len(raw) < TRACK_FILE_HEADER_SIZE:
+        raise ValueError("{0}: truncated track header".format(path))
+    magic, version, dtype_code, joints, count, period = TRACK_FILE_HEADER.unpack_from(raw)
+    if magic != TRACK_FILE_MAGIC:
+        raise ValueError("{0}: not a binary track file".format(path))
+    if version != TRACK_FILE_VERSION:
+        raise ValueError("{0}: unsupported track file version {1}".format(path, version))
+    if dtype_code not in TRACK_FILE_DTYPES or joints != 6:
+        raise ValueError("{0}: unsupported payload dtype={1}, joints={2}".format(path, dtype_code, joints))
+    dtype = TRACK_FILE_DTYPES[dtype_code]
+    expected = TRACK_FILE_HEADER_SIZE + count * 6 * dtype.itemsize
+    if os.path.getsize(path) != expected:
+        raise ValueError("{0}: payload size does not match {1} waypoints".format(path, count))
+    return {"version": version, "dtype": dtype, "count": count, "period": period}
+
+
+def is_track_binary(path):
+    """
+    * FUNCTION: is_track_binary
+    * DESCRIPTION: Whether a file starts with the binary track magic
+    * INPUTS: path: track file
+    * OUTPUTS:
+    * RETURNS: True / False
+    * NOTES:
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(TRACK_FILE_MAGIC)) == TRACK_FILE_MAGIC
+
+
+def write_track_binary(path, waypoints, dtype=np.float64, period=0.0):
+    """
+    * FUNCTION: write_track_binary
+    * DESCRIPTION: Write waypoints to a binary track file
+    * INPUTS: path: output file
+    * waypoints: (N, 6) array or any iterable of waypoints, unit: radians
+    * dtype: payload type, float64 or float32
+    * period: sample period in seconds, 0 when unknown
+    * OUTPUTS:
+    * RETURNS: number of waypoints written
+    * NOTES: Iterables are written chunk by chunk, the count is patched into the header at the end
+    """
+    dtype_code = _dtype_code(dtype)
+    payload_dtype = TRACK_FILE_DTYPES[dtype_code]
+    count = 0
+    with open(path, 'wb') as f:
+        _write_track_header(f, dtype_code, 0, period)
+        for chunk in iter_track_chunks(waypoints, OFFLINE_TRACK_MAX_CHUNK):
+            f.write(np.ascontiguousarray(chunk, dtype=payload_dtype).tobytes())
+            count += len(chunk)
+        _write_track_header(f, dtype_code, count, period)
+    return count
+
+
+def open_track_binary(path, mode='r'):
+    """
+    * FUNCTION: open_track_binary
+    * DESCRIPTION: Memory-map the payload of a binary track file
+    * INPUTS: path: binary track file
+    * mode: 'r' read only, 'r+' read and write in place
+    * OUTPUTS:
+    * RETURNS: (N, 6) numpy.memmap, slices are views of the file (no copy)
+    * NOTES: The header is validated first, see read_track_header
+    """
+    header = read_track_header(path)
+    if header["count"] == 0:
+        return np.zeros((0, 6), dtype=header["dtype"])
+    return np.memmap(path, dtype=header["dtype"], mode=mode, offset=TRACK_FILE_HEADER_SIZE,
+                     shape=(header["count"], 6))
+
+
+def validate_track_binary(path, joint_limit=None):
+    """
+    * FUNCTION: validate_track_binary
+    * DESCRIPTION: Validate the header and the payload values of a binary track file
+    * INPUTS: path: binary track file
+    * joint_limit: absolute joint angle limit, unit (rad), None to skip the range check
+    * OUTPUTS:
+    * RETURNS: header dict, see read_track_header
+    * NOTES: Raises ValueError with the first offending waypoint index. The payload is scanned in blocks
+    * through the memory map, so files larger than memory can be checked.
+    """
+    header = read_track_header(path)
+    track = open_track_binary(path)
+    for start in range(0, len(track), TRACK_TEXT_BLOCK):
+        block = track[start:start + TRACK_TEXT_BLOCK]
+        bad = ~np.all(np.isfinite(block), axis=1)
+        if joint_limit is not None:
+            with np.errstate(invalid='ignore'):
+                bad |= np.any(np.abs(block) > joint_limit, axis=1)
+        if bad.any():
+            raise ValueError("{0}: invalid waypoint at index {1}".format(path, start + int(np.argmax(bad))))
+    return header
+
+
+def _iter_text_track(path):
+    with open(path, 'r') as f:
+        while True:
+            lines = [line for line in islice(f, TRACK_TEXT_BLOCK) if line.strip()]
+            if not lines:
+                return
+            block = np.loadtxt(lines, delimiter=',', dtype=np.float64, ndmin=2)
+            if block.shape[1] != 6:
+                raise ValueError("{0}: each line must contain six joint angles".format(path))
+            yield block
+
+
+def track_text_to_binary(text_path, binary_path, dtype=np.float64, period=0.0):
+    """
+    * FUNCTION: track_text_to_binary
+    * DESCRIPTION: Convert an append_offline_track_file text file to a binary track file
+    * INPUTS: text_path: text file, six comma separated radians per line
+    * binary_path: output binary track file
+    * dtype: payload type, float64 or float32
+    * period: sample period in seconds, 0 when unknown
+    * OUTPUTS:
+    * RETURNS: number of waypoints
+    * NOTES: The text file is parsed in blocks
+    """
+    def rows():
+        for block in _iter_text_track(text_path):
+            for row in block:
+                yield row
+    return write_track_binary(binary_path, rows(), dtype, period)
+
+
+def track_binary_to_text(binary_path, text_path, fmt='%.6f'):
+    """
+    * FUNCTION: track_binary_to_text
+    * DESCRIPTION: Convert a binary track file to the append_offline_track_file text format
+    * INPUTS: binary_path: binary track file
+    * text_path: output text file, six comma separated radians per line
+    * fmt: number format
+    * OUTPUTS:
+    * RETURNS: number of waypoints
+    * NOTES:
+    """
+    track = open_track_binary(binary_path)
+    with open(text_path, 'w') as f:
+        for start in range(0, len(track), TRACK_TEXT_BLOCK):
+            np.savetxt(f, track[start:start + TRACK_TEXT_BLOCK], fmt=fmt, delimiter=',')
+    return len(track)
@@ -0,0 +1,362 @@
+#! /usr/bin/env python
+# coding=utf-8
+import time
+import numpy as np
+import robot_kinematics
+
+
+# Sample period of non-online trajectory movement on the controller, unit (s)
+OFFLINE_TRACK_PERIOD = 0.005
+
+# Relative tolerance applied to the velocity and acceleration limits
+LIMIT_TOLERANCE = 1e-6
+
+# Fraction of the joint acceleration time_parameterize keeps for following the path curvature
+PATH_CURVATURE_SHARE = 0.5
+
+# Direction change of a joint at a vertex below which the path counts as straight there
+PATH_STRAIGHT_TOLERANCE = 1e-9
+
+
+class TrajectoryViolation:
+    # Bit flags of TrajectoryReport.flags
+    NONE = 0
+    # NaN or infinite joint angle
+    NOT_FINITE = 1
+    # Joint angle outside the joint range
+    JOINT_LIMIT = 2
+    # Finite difference velocity above joint_maxvelc
+    VELOCITY = 4
+    # Finite difference acceleration above joint_maxacc
+    ACCELERATION = 8
+    # Step from the previous waypoint above max_jump
+    JUMP = 16
+
+    def __init__(self):
+        pass
+
+
+class TrajectoryReport:
+    """
+    * Result of validate_trajectory
+    * flags: (N,) uint8 array of TrajectoryViolation bits per waypoint
+    * Velocity and jump violations are reported on the later waypoint of the step,
+    * acceleration violations on the middle waypoint of the three samples
+    """
+
+    def __init__(self, flags, max_velocity, max_acceleration, max_jump):
+        self.flags = flags
+        # Largest absolute finite difference velocity / acceleration / step per joint
+        self.max_velocity = max_velocity
+        self.max_acceleration = max_acceleration
+        self.max_jump = max_jump
+
+    def __bool__(self):
+        return self.ok
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        return "TrajectoryReport ok={0}, waypoints={1}, counts={2}".format(self.ok, len(self.flags), self.counts())
+
+    @property
+    def ok(self):
+        return not self.flags.any()
+
+    def mask(self, violation):
+        """
+        * FUNCTION: mask
+        * DESCRIPTION: Per waypoint mask of one or more violation kinds
+        * INPUTS: violation: TrajectoryViolation bits
+        * OUTPUTS:
+        * RETURNS: (N,) bool array
+        * NOTES:
+        """
+        return (self.flags & violation) != 0
+
+    def first_violation(self):
+        """
+        * FUNCTION: first_violation
+        * DESCRIPTION: Index of the first offending waypoint
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: index, -1 when the trajectory is valid
+        * NOTES:
+        """
+        bad = np.flatnonzero(self.flags)
+        return int(bad[0]) if len(bad) else -1
+
+    def counts(self):
+        """
+        * FUNCTION: counts
+        * DESCRIPTION: Number of offending waypoints per violation kind
+        * INPUTS:
+        * OUTPUTS:
+        * RETURNS: {"not_finite": , "joint_limit": , "velocity": , "acceleration": , "jump": }
+        * NOTES:
+        """
+        return {name: int(np.count_nonzero(self.flags & bit)) for name, bit in (
+            ("not_finite", TrajectoryViolation.NOT_FINITE),
+            ("joint_limit", TrajectoryViolation.JOINT_LIMIT),
+            ("velocity", TrajectoryViolation.VELOCITY),
+            ("acceleration", TrajectoryViolation.ACCELERATION),
+            ("jump", TrajectoryViolation.JUMP))}
+
+
+def validate_trajectory(waypoints, period=OFFLINE_TRACK_PERIOD, joint_maxvelc=None, joint_maxacc=None,
+                        max_jump=None, joint_limits=None, model=robot_kinematics.RobotModelType.Aubo_i5):
+    """
+    * FUNCTION: validate_trajectory
+    * DESCRIPTION: Check a whole joint trajectory in one vectorized pass
+    * INPUTS: waypoints: (N, 6) array, unit (rad)
+    * period: time between waypoints, unit (s)
+    * joint_maxvelc: maximum speed of six joints (rad/s), None to skip
+    * joint_maxacc: maximum acceleration of six joints (rad/s^2), None to skip
+    * max_jump: maximum step between consecutive waypoints, scalar or six values (rad), None to skip
+    * joint_limits: ((min, max), ...) per joint (rad), None for RobotJointLimits of the model
+    * model: robot model, see class RobotModelType
+    * OUTPUTS:
+    * RETURNS: TrajectoryReport
+    * NOTES: Works joint by joint on a contiguous (6, N) copy, and limits are scaled to per-step units,
+    * so every pass is a contiguous 1-D operation without division
+    """
+    q = np.asarray(waypoints)
+    if q.ndim != 2 or q.shape[1] != 6:
+        raise ValueError("waypoints must have shape (N, 6), got {0}".format(q.shape))
+    if period <= 0.0:
+        raise ValueError("period must be positive")
+    count = len(q)
+    columns = np.ascontiguousarray(q.T, dtype=np.float64)
+    if joint_limits is None:
+        joint_limits = robot_kinematics.RobotJointLimits[model]
+    joint_limits = np.asarray(joint_limits, dtype=np.float64)
+    velc_step = None if joint_maxvelc is None else \
+        np.asarray(joint_maxvelc, dtype=np.float64) * (period * (1.0 + LIMIT_TOLERANCE))
+    acc_step = None if joint_maxacc is None else \
+        np.asarray(joint_maxacc, dtype=np.float64) * (period * period * (1.0 + LIMIT_TOLERANCE))
+    jump_step = None if max_jump is None else np.broadcast_to(np.asarray(max_jump, dtype=np.float64), (6,))
+
+    not_finite = np.zeros(count, dtype=bool)
+    outside = np.zeros(count, dtype=bool)
+    jump = np.zeros(max(count - 1, 0), dtype=bool)
+    fast = np.zeros(max(count - 1, 0), dtype=bool)
+    hard = np.zeros(max(count - 2, 0), dtype=bool)
+    max_step = np.zeros(6)
+    max_curvature = np.zeros(6)
+
+    with np.errstate(invalid='ignore'):
+        for j in range(6):
+            column = columns[j]
+            not_finite |= ~np.isfinite(column)
+            outside |= (column < joint_limits[j, 0]) | (column > joint_limits[j, 1])
+            if count < 2:
+                continue
+            delta = np.diff(column)
+            step = np.abs(delta)
+            max_step[j] = np.nanmax(step) if len(step) else 0.0
+            if jump_step is not None:
+                jump |= step > jump_step[j]
+            if velc_step is not None:
+                fast |= step > velc_step[j]
+            if count < 3:
+                continue
+            # Second difference of the joint angle is acceleration * period^2
+            curvature = np.diff(delta)
+            np.abs(curvature, out=curvature)
+            max_curvature[j] = np.nanmax(curvature)
+            if acc_step is not None:
+                hard |= curvature > acc_step[j]
+
+    flags = np.zeros(count, dtype=np.uint8)
+    flags[not_finite] |= TrajectoryViolation.NOT_FINITE
+    flags[outside] |= TrajectoryViolation.JOINT_LIMIT
+    if count >= 2:
+        flags[1:][jump] |= TrajectoryViolation.JUMP
+        flags[1:][fast] |= TrajectoryViolation.VELOCITY
+    if count >= 3:
+        flags[1:-1][hard] |= TrajectoryViolation.ACCELERATION
+    max_step = np.nan_to_num(max_step)
+    return TrajectoryReport(flags, max_step / period, np.nan_to_num(max_curvature) / (period * period), max_step)
+
+
+class TimedTrajectory:
+    """
+    * Result of time_parameterize
+    * waypoints: (M, 6) joint angles sampled every period, unit (rad)
+    * path_times: (N,) time at which each vertex of the deduplicated path is reached, unit (s)
+    * duration: total movement time, unit (s)
+    """
+
+    def __init__(self, waypoints, period, path_times):
+        self.waypoints = waypoints
+        self.period = period
+        self.path_times = path_times
+        self.duration = float(path_times[-1]) if len(path_times) else 0.0
+
+    def __len__(self):
+        return len(self.waypoints)
+
+    def __str__(self):
+        return "TimedTrajectory vertices={0}, samples={1}, duration={2:.3f}s".format(
+            len(self.path_times), len(self.waypoints), self.duration)
+
+
+def _as_limits(values, name):
+    values = np.broadcast_to(np.asarray(values, dtype=np.float64), (6,))
+    if not np.all(values > 0.0):
+        raise ValueError("{0} must be positive".format(name))
+    return values
+
+
+def time_parameterize(path, joint_maxvelc, joint_maxacc, period=OFFLINE_TRACK_PERIOD,
+                      velocity_scale=1.0, acceleration_scale=1.0, curvature_share=PATH_CURVATURE_SHARE):
+    """
+    * FUNCTION: time_parameterize
+    * DESCRIPTION: Time-optimal timing of a geometric joint path under joint velocity and acceleration limits,
+    * resampled at the controller track period
+    * INPUTS: path: (N, 6) joint path, unit (rad), interpolated linearly between vertices
+    * joint_maxvelc: maximum speed of six joints (rad/s)
+    * joint_maxacc: maximum acceleration of six joints (rad/s^2)
+    * period: output sample period, unit (s)
+    * velocity_scale, acceleration_scale: fraction of the limits to use, (0, 1]
+    * curvature_share: fraction of the joint acceleration reserved for following the path curvature at the
+    * vertices where the path turns, (0, 1)
+    * OUTPUTS:
+    * RETURNS: TimedTrajectory, starting and ending at rest
+    * NOTES: The path speed is limited per segment by the joint limits and at every vertex by the direction change,
+    * which must fit into curvature_share of the joint acceleration, so sharp corners are passed slowly and
+    * reversals almost at rest. Only the segments touching such a vertex keep that share back from the path
+    * acceleration, straight stretches use the full joint acceleration (a straight line is the plain trapezoid). The forward and backward acceleration passes are cumulative minima, and every segment is a
+    * trapezoid (accelerate, cruise, decelerate), so the whole computation has no Python loop over the path.
+    """
+    q = np.asarray(path, dtype=np.float64)
+    if q.ndim != 2 or q.shape[1] != 6:
+        raise ValueError("path must have shape (N, 6), got {0}".format(q.shape))
+    if not np.isfinite(q).all():
+        raise ValueError("path contains non-finite joint angles")
+    if period <= 0.0:
+        raise ValueError("period must be positive")
+    if not (0.0 < velocity_scale <= 1.0 and 0.0 < acceleration_scale <= 1.0):
+        raise ValueError("velocity_scale and acceleration_scale must be in (0, 1]")
+    if not 0.0 < curvature_share < 1.0:
+        raise ValueError("curvature_share must be in (0, 1)")
+    maxvelc = _as_limits(joint_maxvelc, "joint_maxvelc") * velocity_scale
+    maxacc = _as_limits(joint_maxacc, "joint_maxacc") * acceleration_scale
+
+    # Drop repeated vertices, they carry no geometry and would give zero length segments
+    if len(q) > 1:
+        keep = np.empty(len(q), dtype=bool)
+        keep[0] = True
+        keep[1:] = np.abs(np.diff(q, axis=0)).max(axis=1) > 0.0
+        q = q[keep]
+    if len(q) < 2:
+        return TimedTrajectory(q.copy(), period, np.zeros(len(q)))
+
+    delta = np.diff(q, axis=0)
+    length = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+    # Joint motion per unit of path length on every segment
+    tangent = delta / length[:, None]
+    slope = np.abs(tangent)
+    # Direction change of every joint at the inner vertices
+    turn = np.abs(np.diff(tangent, axis=0))
+    curved = np.zeros(len(q), dtype=bool)
+    curved[1:-1] = turn.max(axis=1) > PATH_STRAIGHT_TOLERANCE
+    # Where the path turns part of the acceleration budget is kept for the curvature, the rest drives the path
+    # speed; between straight vertices the whole budget does
+    normal_acc = maxacc * curvature_share
+    tangential_acc = np.where((curved[:-1] | curved[1:])[:, None], maxacc * (1.0 - curvature_share), maxacc)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        segment_velc = np.min(maxvelc / slope, axis=1)
+        segment_acc = np.min(tangential_acc / slope, axis=1)
+        # A single corner turns within one period (v * turn / period), a dense path turns continuously
+        # (v^2 * turn / ds); both together must stay below the reserved acceleration, the positive root of
+        # the quadratic in v
+        spacing = 0.5 * (length[:-1] + length[1:])[:, None]
+        linear = turn / period
+        quadratic = turn / spacing
+        corner_velc = np.min(2.0 * normal_acc / (linear + np.sqrt(linear * linear + 4.0 * quadratic * normal_acc)),
+                             axis=1)
+
+    # Squared path speed limit at every vertex, at rest on both ends
+    cap = np.empty(len(q))
+    cap[0] = cap[-1] = 0.0
+    cap[1:-1] = np.minimum(np.minimum(segment_velc[:-1], segment_velc[1:]), corner_velc) ** 2
+
+    # u[i+1] <= u[i] + 2 * a[i] * ds[i] is a cumulative minimum after removing the running sum of the increments
+    reach = 2.0 * segment_acc * length
+    offset = np.concatenate(([0.0], np.cumsum(reach)))
+    speed2 = np.minimum.accumulate(cap - offset) + offset
+    offset = np.concatenate(([0.0], np.cumsum(reach[::-1])))
+    speed2 = np.minimum(speed2, (np.minimum.accumulate(speed2[::-1] - offset) + offset)[::-1])
+    np.maximum(speed2, 0.0, out=speed2)
+
+    # Trapezoid on every segment: accelerate from v0, cruise at the peak, decelerate to v1
+    u0 = speed2[:-1]
+    u1 = speed2[1:]
+    peak2 = np.minimum(segment_velc ** 2, 0.5 * (u0 + u1) + 0.5 * reach)
+    peak2 = np.maximum(peak2, np.maximum(u0, u1))
+    v0 = np.sqrt(u0)
+    v1 = np.sqrt(u1)
+    peak = np.sqrt(peak2)
+    acc_distance = (peak2 - u0) / (2.0 * segment_acc)
+    dec_distance = (peak2 - u1) / (2.0 * segment_acc)
+    cruise_distance = np.maximum(length - acc_distance - dec_distance, 0.0)
+    acc_time = (peak - v0) / segment_acc
+    cruise_time = cruise_distance / peak
+    dec_time = (peak - v1) / segment_acc
+    path_times = np.concatenate(([0.0], np.cumsum(acc_time + cruise_time + dec_time)))
+
+    # Resample the timed path at the track period
+    times = np.arange(int(np.floor(path_times[-1] / period)) + 1) * period
+    segment = np.searchsorted(path_times, times, side='right') - 1
+    np.clip(segment, 0, len(length) - 1, out=segment)
+    local = times - path_times[segment]
+    a = segment_acc[segment]
+    t_acc = acc_time[segment]
+    t_dec_start = t_acc + cruise_time[segment]
+    vp = peak[segment]
+    after_acc = np.maximum(local - t_acc, 0.0)
+    after_cruise = np.maximum(local - t_dec_start, 0.0)
+    in_acc = np.minimum(local, t_acc)
+    distance = v0[segment] * in_acc + 0.5 * a * in_acc * in_acc + \
+        vp * np.minimum(after_acc, cruise_time[segment]) + \
+        vp * after_cruise - 0.5 * a * after_cruise * after_cruise
+    np.clip(distance, 0.0, length[segment], out=distance)
+    samples = q[segment] + tangent[segment] * distance[:, None]
+    if times[-1] < path_times[-1] - 1e-12:
+        samples = np.concatenate((samples, q[-1:]))
+    else:
+        samples[-1] = q[-1]
+    return TimedTrajectory(samples, period, path_times)
+
+
+def benchmark_time_parameterize(count=100000, joint_maxvelc=1.0, joint_maxacc=2.0):
+    """
+    * FUNCTION: benchmark_time_parameterize
+    * DESCRIPTION: Time the parameterization and the validator on a smooth random path
+    * INPUTS: count: number of path vertices
+    * joint_maxvelc, joint_maxacc: joint limits used for the parameterization
+    * OUTPUTS:
+    * RETURNS: {"path_vertices": , "samples": , "duration": , "parameterize_seconds": ,
+    * "validate_seconds": , "violations": }
+    * NOTES:
+    """
+    s = np.linspace(0.0, 1.0, count)[:, None]
+    phase = np.random.uniform(0.0, 2.0 * np.pi, 6)
+    frequency = np.random.uniform(1.0, 4.0, 6)
+    path = 1.2 * np.sin(2.0 * np.pi * frequency * s + phase)
+
+    start = time.perf_counter()
+    timed = time_parameterize(path, joint_maxvelc, joint_maxacc)
+    parameterize_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    report = validate_trajectory(timed.waypoints, timed.period, [joint_maxvelc] * 6, [joint_maxacc] * 6)
+    validate_seconds = time.perf_counter() - start
+    return {"path_vertices": count, "samples": len(timed), "duration": timed.duration,
+            "parameterize_seconds": parameterize_seconds, "validate_seconds": validate_seconds,
+            "violations": report.counts()}
+
+
+if __name__ == '__main__':
+    for name, value in benchmark_time_parameterize().items():
+        print("{0:<22s} {1}".format(name, value))
@@ -0,0 +1,295 @@
+#! /usr/bin/env python
+# coding=utf-8
+import time
+import numpy as np
+
+
+# Euler angles follow the controller convention: rpy = (rx, ry, rz), R = Rz(rz) * Ry(ry) * Rx(rx), unit (rad)
+# Quaternions are (w, x, y, z)
+
+
+def _as_batch(values, width, name):
+    array = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    if array.ndim != 2 or array.shape[1] != width:
+        raise ValueError("{0} must have shape (N, {1}), got {2}".format(name, width, array.shape))
+    return array
+
+
+def rpy_to_quaternion(rpy):
+    """
+    * FUNCTION: rpy_to_quaternion
+    * DESCRIPTION: Euler angle to quaternion, vectorized
+    * INPUTS: rpy: Euler angles (rx, ry, rz), shape (N, 3) or (3,), unit (rad)
+    * OUTPUTS:
+    * RETURNS: quaternions (w, x, y, z), shape (N, 4)
+    * NOTES:
+    """
+    half = _as_batch(rpy, 3, "rpy") * 0.5
+    cr, sr = np.cos(half[:, 0]), np.sin(half[:, 0])
+    cp, sp = np.cos(half[:, 1]), np.sin(half[:, 1])
+    cy, sy = np.cos(half[:, 2]), np.sin(half[:, 2])
+    quat = np.empty((len(half), 4))
+    quat[:, 0] = cr * cp * cy + sr * sp * sy
+    quat[:, 1] = sr * cp * cy - cr * sp * sy
+    quat[:, 2] = cr * sp * cy + sr * cp * sy
+    quat[:, 3] = cr * cp * sy - sr * sp * cy
+    return quat
+
+
+def quaternion_to_rpy(ori):
+    """
+    * FUNCTION: quaternion_to_rpy
+    * DESCRIPTION: Quaternion to Euler angle, vectorized
+    * INPUTS: ori: quaternions (w, x, y, z), shape (N, 4) or (4,)
+    * OUTPUTS:
+    * RETURNS: Euler angles (rx, ry, rz), shape (N, 3), unit (rad)
+    * NOTES: ry is in [-pi/2, pi/2], the quaternions are normalized first.
+    * At ry = +-pi/2 (gimbal lock) rx is set to 0, like rotation_to_rpy
+    """
+    q = _as_batch(ori, 4, "ori")
+    q = q / np.linalg.norm(q, axis=1)[:, None]
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    rpy = np.empty((len(q), 3))
+    # Rotation matrix entries r00, r10 give cos(ry); r01, r11 give rz once rx is fixed at the lock
+    cos_pitch = np.hypot(1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y + w * z))
+    locked = cos_pitch < 1e-9
+    rpy[:, 0] = np.where(locked, 0.0, np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y)))
+    rpy[:, 1] = np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0))
+    rpy[:, 2] = np.where(locked, np.arctan2(-2.0 * (x * y - w * z), 1.0 - 2.0 * (x * x + z * z)),
+                         np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z)))
+    return rpy
+
+
+def quaternion_to_rotation(ori):
+    """
+    * FUNCTION: quaternion_to_rotation
+    * DESCRIPTION: Quaternion to rotation matrix, vectorized
+    * INPUTS: ori: quaternions (w, x, y, z), shape (N, 4) or (4,)
+    * OUTPUTS:
+    * RETURNS: rotation matrices, shape (N, 3, 3)
+    * NOTES: The quaternions are normalized first
+    """
+    q = _as_batch(ori, 4, "ori")
+    q = q / np.linalg.norm(q, axis=1)[:, None]
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    rotation = np.empty((len(q), 3, 3))
+    rotation[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    rotation[:, 0, 1] = 2.0 * (x * y - w * z)
+    rotation[:, 0, 2] = 2.0 * (x * z + w * y)
+    rotation[:, 1, 0] = 2.0 * (x * y + w * z)
+    rotation[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    rotation[:, 1, 2] = 2.0 * (y * z - w * x)
+    rotation[:, 2, 0] = 2.0 * (x * z - w * y)
+    rotation[:, 2, 1] = 2.0 * (y * z + w * x)
+    rotation[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return rotation
+
+
+def rotation_to_quaternion(rotation):
+    """
+    * FUNCTION: rotation_to_quaternion
+    * DESCRIPTION: Rotation matrix to quaternion, vectorized
+    * INPUTS: rotation: rotation matrices, shape (N, 3, 3) or (3, 3)
+    * OUTPUTS:
+    * RETURNS: quaternions (w, x, y, z), shape (N, 4)
+    * NOTES: q and -q describe the same attitude, the result is normalized to w >= 0
+    """
+    r = np.asarray(rotation, dtype=np.float64)
+    if r.ndim == 2:
+        r = r[None]
+    m00, m11, m22 = r[:, 0, 0], r[:, 1, 1], r[:, 2, 2]
+    # Shepperd's method: use the largest of w, x, y, z as the pivot to stay numerically stable
+    pivots = np.stack((m00 + m11 + m22, m00 - m11 - m22, m11 - m00 - m22, m22 - m00 - m11), axis=1)
+    index = np.argmax(pivots, axis=1)
+    s = 2.0 * np.sqrt(1.0 + pivots[np.arange(len(r)), index])
+
+    quat = np.empty((len(r), 4))
+    zy, yz = r[:, 2, 1], r[:, 1, 2]
+    xz, zx = r[:, 0, 2], r[:, 2, 0]
+    yx, xy = r[:, 1, 0], r[:, 0, 1]
+    for i, (w, x, y, z) in enumerate((
+            (0.25 * s, (zy - yz) / s, (xz - zx) / s, (yx - xy) / s),
+            ((zy - yz) / s, 0.25 * s, (xy + yx) / s, (xz + zx) / s),
+            ((xz - zx) / s, (xy + yx) / s, 0.25 * s, (yz + zy) / s),
+            ((yx - xy) / s, (xz + zx) / s, (yz + zy) / s, 0.25 * s))):
+        mask = index == i
+        quat[mask, 0] = w[mask]
+        quat[mask, 1] = x[mask]
+        quat[mask, 2] = y[mask]
+        quat[mask, 3] = z[mask]
+
+    quat[quat[:, 0] < 0] *= -1.0
+    return quat
+
+
+def rpy_to_rotation(rpy):
+    """
+    * FUNCTION: rpy_to_rotation
+    * DESCRIPTION: Euler angle to rotation matrix, vectorized
+    * INPUTS: rpy: Euler angles (rx, ry, rz), shape (N, 3) or (3,), unit (rad)
+    * OUTPUTS:
+    * RETURNS: rotation matrices, shape (N, 3, 3)
+    * NOTES:
+    """
+    angles = _as_batch(rpy, 3, "rpy")
+    cr, sr = np.cos(angles[:, 0]), np.sin(angles[:, 0])
+    cp, sp = np.cos(angles[:, 1]), np.sin(angles[:, 1])
+    cy, sy = np.cos(angles[:, 2]), np.sin(angles[:, 2])
+    rotation = np.empty((len(angles), 3, 3))
+    rotation[:, 0, 0] = cy * cp
+    rotation[:, 0, 1] = cy * sp * sr - sy * cr
+    rotation[:, 0, 2] = cy * sp * cr + sy * sr
+    rotation[:, 1, 0] = sy * cp
+    rotation[:, 1, 1] = sy * sp * sr + cy * cr
+    rotation[:, 1, 2] = sy * sp * cr - cy * sr
+    rotation[:, 2, 0] = -sp
+    rotation[:, 2, 1] = cp * sr
+    rotation[:, 2, 2] = cp * cr
+    return rotation
+
+
+def rotation_to_rpy(rotation):
+    """
+    * FUNCTION: rotation_to_rpy
+    * DESCRIPTION: Rotation matrix to Euler angle, vectorized
+    * INPUTS: rotation: rotation matrices, shape (N, 3, 3) or (3, 3)
+    * OUTPUTS:
+    * RETURNS: Euler angles (rx, ry, rz), shape (N, 3), unit (rad)
+    * NOTES: At ry = +-pi/2 (gimbal lock) rx is set to 0
+    """
+    r = np.asarray(rotation, dtype=np.float64)
+    if r.ndim == 2:
+        r = r[None]
+    rpy = np.empty((len(r), 3))
+    cos_pitch = np.hypot(r[:, 0, 0], r[:, 1, 0])
+    locked = cos_pitch < 1e-9
+    rpy[:, 1] = np.arctan2(-r[:, 2, 0], cos_pitch)
+    rpy[:, 0] = np.where(locked, 0.0, np.arctan2(r[:, 2, 1], r[:, 2, 2]))
+    rpy[:, 2] = np.where(locked, np.arctan2(-r[:, 0, 1], r[:, 1, 1]), np.arctan2(r[:, 1, 0], r[:, 0, 0]))
+    return rpy
+
+
+def axis_angle_to_quaternion(axis, angle):
+    """
+    * FUNCTION: axis_angle_to_quaternion
+    * DESCRIPTION: Rotation axis and angle to quaternion, vectorized
+    * INPUTS: axis: rotation axes (x, y, z), shape (N, 3) or (3,), need not be normalized
+    * angle: rotation angles, shape (N,) or scalar, unit (rad)
+    * OUTPUTS:
+    * RETURNS: quaternions (w, x, y, z), shape (N, 4)
+    * NOTES: A zero axis gives the identity quaternion
+    """
+    axis = _as_batch(axis, 3, "axis")
+    half = np.broadcast_to(np.asarray(angle, dtype=np.float64), (len(axis),)) * 0.5
+    norm = np.linalg.norm(axis, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unit = np.where(norm[:, None] > 0.0, axis / norm[:, None], 0.0)
+    quat = np.empty((len(axis), 4))
+    quat[:, 0] = np.where(norm > 0.0, np.cos(half), 1.0)
+    quat[:, 1:] = unit * np.sin(half)[:, None]
+    return quat
+
+
+def quaternion_to_axis_angle(ori):
+    """
+    * FUNCTION: quaternion_to_axis_angle
+    * DESCRIPTION: Quaternion to rotation axis and angle, vectorized
+    * INPUTS: ori: quaternions (w, x, y, z), shape (N, 4) or (4,)
+    * OUTPUTS:
+    * RETURNS: unit rotation axes shape (N, 3), rotation angles shape (N,) in [0, pi], unit (rad)
+    * NOTES: The identity rotation returns the axis (1, 0, 0) with angle 0
+    """
+    q = _as_batch(ori, 4, "ori")
+    q = q / np.linalg.norm(q, axis=1)[:, None]
+    q[q[:, 0] < 0] *= -1.0
+    sin_half = np.linalg.norm(q[:, 1:], axis=1)
+    angle = 2.0 * np.arctan2(sin_half, q[:, 0])
+    axis = np.tile(np.array((1.0, 0.0, 0.0)), (len(q), 1))
+    nonzero = sin_half > 1e-12
+    axis[nonzero] = q[nonzero, 1:] / sin_half[nonzero, None]
+    return axis, angle
+
+
+def quaternion_multiply(lhs, rhs):
+    """
+    * FUNCTION: quaternion_multiply
+    * DESCRIPTION: Hamilton product lhs * rhs, vectorized with broadcasting
+    * INPUTS: lhs, rhs: quaternions (w, x, y, z), shape (N, 4) or (4,)
+    * OUTPUTS:
+    * RETURNS: quaternions (w, x, y, z), shape (N, 4)
+    * NOTES:
+    """
+    a = _as_batch(lhs, 4, "lhs")
+    b = _as_batch(rhs, 4, "rhs")
+    aw, ax, ay, az = a[:, 0], a[:, 1], a[:, 2], a[:, 3]
+    bw, bx, by, bz = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    return np.stack((aw * bw - ax * bx - ay * by - az * bz,
+                     aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw), axis=1)
+
+
+def quaternion_rotate(ori, vectors):
+    """
+    * FUNCTION: quaternion_rotate
+    * DESCRIPTION: Rotate vectors by quaternions, vectorized with broadcasting
+    * INPUTS: ori: unit quaternions (w, x, y, z), shape (N, 4) or (4,)
+    * vectors: vectors (x, y, z), shape (N, 3) or (3,)
+    * OUTPUTS:
+    * RETURNS: rotated vectors, shape (N, 3)
+    * NOTES: v' = v + 2w(u x v) + 2u x (u x v), u = (x, y, z)
+    """
+    q = _as_batch(ori, 4, "ori")
+    v = _as_batch(vectors, 3, "vectors")
+    u = q[:, 1:]
+    uv = np.cross(u, v)
+    return v + 2.0 * q[:, :1] * uv + 2.0 * np.cross(u, uv)
+
+
+def quaternion_conjugate(ori):
+    """
+    * FUNCTION: quaternion_conjugate
+    * DESCRIPTION: Conjugate (inverse of a unit quaternion), vectorized
+    * INPUTS: ori: quaternions (w, x, y, z), shape (N, 4) or (4,)
+    * OUTPUTS:
+    * RETURNS: quaternions (w, -x, -y, -z), shape (N, 4)
+    * NOTES:
+    """
+    q = _as_batch(ori, 4, "ori").copy()
+    q[:, 1:] *= -1.0
+    return q
+
+
+def benchmark_transforms(count=1000000):
+    """
+    * FUNCTION: benchmark_transforms
+    * DESCRIPTION: Throughput of the batched conversions
+    * INPUTS: count: number of orientations per conversion
+    * OUTPUTS:
+    * RETURNS: {conversion name: conversions per second}
+    * NOTES:
+    """
+    rpy = np.random.uniform(-np.pi, np.pi, (count, 3))
+    rpy[:, 1] *= 0.5
+    quat = rpy_to_quaternion(rpy)
+    rotation = quaternion_to_rotation(quat)
+    axis, angle = quaternion_to_axis_angle(quat)
+
+    result = {}
+    for name, function, args in (("rpy_to_quaternion", rpy_to_quaternion, (rpy,)),
+                                 ("quaternion_to_rpy", quaternion_to_rpy, (quat,)),
+                                 ("quaternion_to_rotation", quaternion_to_rotation, (quat,)),
+                                 ("rotation_to_quaternion", rotation_to_quaternion, (rotation,)),
+                                 ("rpy_to_rotation", rpy_to_rotation, (rpy,)),
+                                 ("rotation_to_rpy", rotation_to_rpy, (rotation,)),
+                                 ("axis_angle_to_quaternion", axis_angle_to_quaternion, (axis, angle)),
+                                 ("quaternion_to_axis_angle", quaternion_to_axis_angle, (quat,))):
+        start = time.perf_counter()
+        function(*args)
+        result[name] = count / (time.perf_counter() - start)
+    return result
+
+
+if __name__ == '__main__':
+    for name, rate in benchmark_transforms().items():
+        print("{0:<28s} {1:>14,.0f} /s".format(name, rate))
@@ -0,0 +1,25 @@
+# coding=utf-8
+import os
+import sys
+import pytest
+
+# The SDK modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Run Auboi5Robot against libpyauboi5_sim, the native library is Windows only
+os.environ.setdefault('AUBO_SDK_SIMULATOR', '1')
+
+
+@pytest.fixture
+def robot():
+    # Auboi5Robot logged in to a started simulated arm
+    from robot_control_en import Auboi5Robot, RobotErrorType
+    Auboi5Robot.initialize()
+    robot = Auboi5Robot()
+    robot.create_context()
+    assert robot.connect('localhost', 8899) == RobotErrorType.RobotError_SUCC
+    assert robot.robot_startup() == RobotErrorType.RobotError_SUCC
+    yield robot
+    if robot.connected:
+        robot.disconnect()
+    Auboi5Robot.uninitialize()
@@ -0,0 +1,54 @@
+# coding=utf-8
+import asyncio
+import numpy as np
+import pytest
+import libpyauboi5_sim
+from robot_async import AsyncAuboi5Robot
+from robot_control_en import RobotErrorType, RobotEventType
+
+TARGET = (0.3, -0.127, -1.327, 0.364, -1.571, 0.0)
+
+
+def _run(robot, scenario):
+    async def main():
+        async_robot = AsyncAuboi5Robot(robot)
+        try:
+            return await scenario(async_robot)
+        finally:
+            async_robot.close()
+    return asyncio.run(main())
+
+
+def test_motion_returns_on_arrival_event(robot):
+    # Registered before the listener of AsyncAuboi5Robot, so it has seen the event when the motion returns
+    events = []
+    robot.event_waiter.add_listener(events.append)
+
+    async def scenario(async_robot):
+        assert await async_robot.move_joint(TARGET, timeout=10.0) == RobotErrorType.RobotError_SUCC
+
+    _run(robot, scenario)
+    assert events and events[-1]['type'] == RobotEventType.RobotEvent_atTrackTargetPos
+    assert np.allclose(robot.get_current_waypoint()['joint'], TARGET)
+
+
+def test_blocking_motion(robot):
+    async def scenario(async_robot):
+        return await async_robot.move_line(TARGET, timeout=10.0)
+
+    assert _run(robot, scenario) == RobotErrorType.RobotError_SUCC
+    assert np.allclose(robot.get_current_waypoint()['joint'], TARGET)
+
+
+@pytest.mark.parametrize("name", ["move_joint", "move_line"])
+def test_timeout_stops_the_arm(robot, name):
+    robot.set_joint_maxvelc((0.1,) * 6)
+    robot.set_joint_maxacc((0.1,) * 6)
+
+    async def scenario(async_robot):
+        with pytest.raises(asyncio.TimeoutError):
+            await getattr(async_robot, name)(TARGET, timeout=0.05)
+
+    _run(robot, scenario)
+    joint = libpyauboi5_sim.sim_state(robot.rshd)["joint"]
+    assert 0.0 < joint[0] < TARGET[0]
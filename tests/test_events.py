@@ -0,0 +1,130 @@
+# coding=utf-8
+import logging
+import threading
+import pytest
+from robot_control_en import (RobotError, RobotEventCategory, RobotEventSeverity, RobotEventType, robot_event_info,
+                              robot_event_types)
+from robot_events import EventDispatcher
+
+
+def _event(event_type, code=0):
+    return {'type': event_type, 'code': code, 'content': ''}
+
+
+def test_stats_while_dispatching():
+    dispatcher = EventDispatcher(capacity=100000, latency_samples=64)
+    failures = []
+
+    def fail(event):
+        if event['code'] % 10 == 0:
+            raise ValueError("subscriber error")
+    dispatcher.subscribe(fail)
+    dispatcher.subscribe(lambda event: None, (1,))
+    done = threading.Event()
+
+    def poll():
+        # Sorting the latency samples while the dispatcher appends must not fail
+        while not done.is_set():
+            try:
+                dispatcher.stats()
+            except RuntimeError as error:
+                failures.append(error)
+                return
+    poller = threading.Thread(target=poll)
+    poller.start()
+    try:
+        for code in range(20000):
+            dispatcher.put(_event(1, code))
+        assert dispatcher.drain(timeout=30.0)
+    finally:
+        done.set()
+        poller.join()
+        dispatcher.stop()
+    stats = dispatcher.stats()
+    assert not failures
+    assert stats["received"] == stats["delivered"] == 20000 and stats["errors"] == 2000
+    assert stats["queue_p50"] <= stats["queue_p99"] <= stats["queue_max"]
+    assert len(dispatcher.callback_latency) == 64
+
+
+def test_full_queue_drops_unprotected_events_first():
+    dispatcher = EventDispatcher(capacity=3, keep=lambda event_type: event_type == 2)
+    delivered = []
+    release = threading.Event()
+
+    def slow(event):
+        release.wait(5.0)
+        delivered.append((event['type'], event['code']))
+    dispatcher.subscribe(slow)
+    dispatcher.put(_event(1, 0))
+    # The dispatcher is held in the first callback while the queue fills up
+    while dispatcher.stats()["queued"]:
+        pass
+    for event in (_event(2, 1), _event(1, 2), _event(1, 3), _event(2, 4), _event(1, 5)):
+        dispatcher.put(event)
+    release.set()
+    assert dispatcher.drain(timeout=5.0)
+    dispatcher.stop()
+    assert delivered == [(1, 0), (2, 1), (2, 4), (1, 5)]
+    assert dispatcher.stats()["dropped"] == 2
+
+
+@pytest.mark.parametrize("event_type, severity, category, is_error, clear_on_recover, user_post", [
+    (RobotEventType.RobotEvent_jointError, RobotEventSeverity.ERROR, RobotEventCategory.HARDWARE, True, True, False),
+    (RobotEventType.RobotEvent_remoteHalt, RobotEventSeverity.ERROR, RobotEventCategory.SAFETY, True, False, False),
+    (RobotEventType.RobotEvent_atTrackTargetPos, RobotEventSeverity.INFO, RobotEventCategory.MOTION, False, False,
+     False),
+    (RobotEventType.RobotEvent_robotControllerError, RobotEventSeverity.WARNING, RobotEventCategory.CONTROLLER, False,
+     False, True),
+    (RobotEventType.RobotEvent_socketDisconnected, RobotEventSeverity.ERROR, RobotEventCategory.LINK, True, False,
+     False),
+    (RobotEventType.RobotEvent_boardIoPause, RobotEventSeverity.WARNING, RobotEventCategory.BOARD_IO, False, False,
+     False),
+    (123456, RobotEventSeverity.ERROR, RobotEventCategory.UNKNOWN, True, False, False),
+])
+def test_robot_event_info(event_type, severity, category, is_error, clear_on_recover, user_post):
+    info = robot_event_info(event_type)
+    assert (info.severity, info.category, info.is_error) == (severity, category, is_error)
+    assert (info.clear_on_recover, info.user_post) == (clear_on_recover, user_post)
+    assert (event_type in RobotEventType.NoError) == (not is_error)
+    assert (event_type in RobotEventType.ClearErrorEvent) == clear_on_recover
+    assert (event_type in RobotEventType.UserPostEvent) == user_post
+
+
+@pytest.mark.parametrize("query, included, excluded", [
+    ({'severity': RobotEventSeverity.INFO}, RobotEventType.RobotEvent_atTrackTargetPos,
+     RobotEventType.RobotEvent_jointError),
+    ({'category': RobotEventCategory.SAFETY_IO}, RobotEventType.RobotEvent_safetyIoSystemStop,
+     RobotEventType.RobotEvent_boardIoStop),
+    ({'category': (RobotEventCategory.LINK, RobotEventCategory.POWER)}, RobotEventType.RobotEvent_ArmPowerOff,
+     RobotEventType.RobotEvent_collision),
+    ({'min_severity': RobotEventSeverity.WARNING}, RobotEventType.RobotEvent_safetyIoSystemStop,
+     RobotEventType.RobotEvent_forceControl),
+    ({'severity': RobotEventSeverity.ERROR, 'category': RobotEventCategory.SAFETY},
+     RobotEventType.RobotEvent_collision, RobotEventType.RobotEvent_socketDisconnected),
+])
+def test_robot_event_types(query, included, excluded):
+    codes = robot_event_types(**query)
+    assert included in codes and excluded not in codes
+    assert all(robot_event_info(code).severity >= query.get('min_severity', 0) for code in codes)
+
+
+@pytest.mark.parametrize("event_type, raised, raised_recovering", [
+    (RobotEventType.RobotEvent_jointError, True, False),
+    (RobotEventType.RobotEvent_collision, True, False),
+    (RobotEventType.RobotEvent_remoteHalt, True, True),
+    (RobotEventType.RobotEvent_overSpeed, True, True),
+    (RobotEventType.RobotEvent_atTrackTargetPos, False, False),
+    (RobotEventType.RobotEvent_safetyIoSystemStop, False, False),
+])
+def test_check_event(robot, caplog, event_type, raised, raised_recovering):
+    with caplog.at_level(logging.INFO, logger='main.robotcontrol'):
+        robot.robot_event_callback({'type': event_type, 'code': 7, 'content': 'test'})
+    assert "event=" in caplog.text
+    for recovering, expected in ((False, raised), (True, raised_recovering)):
+        if expected:
+            with pytest.raises(RobotError) as error:
+                robot.check_event(recovering)
+            assert error.value.error_type == event_type
+        else:
+            robot.check_event(recovering)
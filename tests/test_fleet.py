@@ -0,0 +1,41 @@
+# coding=utf-8
+import pytest
+from robot_control_en import Auboi5Robot, RobotError, RobotErrorType
+from robot_fleet import RobotFleet
+
+
+@pytest.fixture
+def fleet():
+    # Two arms, each with its own simulated context
+    Auboi5Robot.initialize()
+    fleet = RobotFleet({'left': ('localhost', 8899), 'right': ('localhost', 8899)})
+    assert fleet.connect().ok
+    assert fleet.robot_startup().ok
+    yield fleet
+    fleet.close()
+    Auboi5Robot.uninitialize()
+
+
+def test_call_returns_every_value(fleet):
+    assert fleet.call('set_joint_maxacc', (1.5,) * 6).ok
+    report = fleet.call('get_joint_maxacc')
+    assert report.ok and len(report) == 2
+    assert report.values() == {'left': (1.5,) * 6, 'right': (1.5,) * 6}
+
+
+def test_call_turns_result_codes_into_errors(fleet, monkeypatch):
+    monkeypatch.setattr(fleet.robots['right'], 'set_joint_maxvelc',
+                        lambda joint_maxvelc: RobotErrorType.RobotError_ERROR_ARGS)
+    report = fleet.call('set_joint_maxvelc', (1.0,) * 6)
+    assert not report.ok
+    assert report['left'].ok and report['left'].value == RobotErrorType.RobotError_SUCC
+    assert report.errors() == {'right': RobotErrorType.RobotError_ERROR_ARGS}
+
+
+def test_exception_is_an_arm_error(fleet, monkeypatch):
+    def fail():
+        raise RobotError(RobotErrorType.RobotError_NoLink, 0, "link lost")
+    monkeypatch.setattr(fleet.robots['left'], 'get_current_waypoint', fail)
+    report = fleet.get_status()
+    assert isinstance(report['left'].error, RobotError) and report['left'].value is None
+    assert report['right'].ok and report['right'].value['waypoint'] is not None
@@ -0,0 +1,65 @@
+# coding=utf-8
+import numpy as np
+import robot_kinematics
+import robot_transforms
+from robot_control_en import RobotCoordType
+
+TOOL = {"pos": (0.01, -0.02, 0.15), "ori": (1.0, 0.0, 0.0, 0.0)}
+
+
+def _user_coord(points):
+    return {'coord_type': RobotCoordType.Robot_World_Coordinate, 'calibrate_method': 0,
+            'calibrate_points': {"point1": points[0], "point2": points[1], "point3": points[2]},
+            'tool_desc': {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)}}
+
+
+USER_COORD = _user_coord(((0.0, -0.127, 1.27, -0.1, 1.57, 0.0), (0.3, -0.127, 1.27, -0.1, 1.57, 0.0),
+                          (0.0, 0.2, 1.27, -0.1, 1.57, 0.0)))
+
+
+def _flange_poses(count, seed=3):
+    joints = np.random.RandomState(seed).uniform(-2.0, 2.0, (count, 6))
+    return robot_kinematics.forward_kin_batch(joints)
+
+
+def test_base_user_round_trip(robot):
+    pos, ori = _flange_poses(50)
+    end_pos, end_ori = robot.base_to_user_batch(pos, ori, USER_COORD, TOOL)
+    back_pos, back_ori = robot.user_to_base_batch(end_pos, end_ori, USER_COORD, TOOL)
+    assert np.abs(back_pos - pos).max() < 1e-9
+    assert np.abs(np.abs(np.sum(back_ori * ori, axis=1)) - 1.0).max() < 1e-9
+
+
+def test_calibration_points_lie_on_the_user_axes(robot):
+    # xOy calibration: point1 is the origin, point2 on +x, point3 in the xy plane on the +y side
+    points = USER_COORD['calibrate_points']
+    pos, ori = robot_kinematics.forward_kin_batch(np.array([points["point1"], points["point2"], points["point3"]]))
+    no_tool = {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)}
+    end_pos, _ = robot.base_to_user_batch(pos, ori, USER_COORD, no_tool)
+    assert np.abs(end_pos[0]).max() < 1e-9
+    assert end_pos[1][0] > 0.0 and np.abs(end_pos[1][1:]).max() < 1e-9
+    assert end_pos[2][1] > 0.0 and abs(end_pos[2][2]) < 1e-9
+
+
+def test_single_pose_matches_batch(robot):
+    pos, ori = _flange_poses(1)
+    single = robot.base_to_user(pos[0], ori[0], USER_COORD, TOOL)
+    batch = robot.base_to_user_batch(pos, ori, USER_COORD, TOOL)
+    assert np.allclose(single['pos'], batch[0][0]) and np.allclose(single['ori'], batch[1][0])
+
+
+def test_base_coordinate_only_adds_the_tool(robot):
+    pos, ori = _flange_poses(10)
+    base = _user_coord(((0.0,) * 6,) * 3)
+    base['coord_type'] = RobotCoordType.Robot_Base_Coordinate
+    end_pos, _ = robot.base_to_user_batch(pos, ori, base, TOOL)
+    expected = pos + robot_transforms.quaternion_to_rotation(ori) @ np.asarray(TOOL["pos"])
+    assert np.abs(end_pos - expected).max() < 1e-9
+
+
+def test_degenerate_frame_gives_none(robot):
+    # Three identical calibration points do not define a plane
+    point = (0.0, -0.127, 1.27, -0.1, 1.57, 0.0)
+    pos, ori = _flange_poses(1)
+    assert robot.base_to_user(pos[0], ori[0], _user_coord((point, point, point)), TOOL) is None
+    assert robot.user_to_base(pos[0], ori[0], _user_coord((point, point, point)), TOOL) is None
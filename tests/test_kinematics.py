@@ -0,0 +1,134 @@
+# coding=utf-8
+import numpy as np
+import pytest
+import robot_kinematics
+from robot_control_en import Auboi5Robot, RobotError, RobotErrorType, RobotModelType
+
+
+def _joints(count, seed=1):
+    # Away from the joint limits and the wrist singularity
+    joints = np.random.RandomState(seed).uniform(-2.5, 2.5, (count, 6))
+    joints[:, 4] = np.sign(joints[:, 4]) * np.clip(np.abs(joints[:, 4]), 0.3, 2.5)
+    return joints
+
+
+def test_forward_kin_upright_pose():
+    # All joints at 0: the arm stands upright, z = d1 + a2 + a3 + d5 and y = -(d2 + d6)
+    pos, ori = robot_kinematics.forward_kin_batch(np.zeros(6))
+    assert np.allclose(pos[0], (0.0, -0.2155, 0.985), atol=1e-12)
+    assert np.isclose(np.linalg.norm(ori[0]), 1.0) and ori[0][0] >= 0.0
+
+
+def test_forward_kin_blocks_match(monkeypatch):
+    joints = _joints(100)
+    pos, ori = robot_kinematics.forward_kin_batch(joints)
+    monkeypatch.setattr(robot_kinematics, 'BATCH_BLOCK_SIZE', 7)
+    block_pos, block_ori = robot_kinematics.forward_kin_batch(joints)
+    assert np.array_equal(block_pos, pos) and np.array_equal(block_ori, ori)
+
+
+def test_robot_forward_kin_matches_batch(robot):
+    joint = _joints(1, seed=2)[0]
+    pose = robot.forward_kin(tuple(joint))
+    pos, ori = robot_kinematics.forward_kin_batch(joint)
+    assert np.allclose(pose['pos'], pos[0]) and np.allclose(pose['ori'], ori[0])
+
+
+def test_forward_inverse_round_trip():
+    joints = _joints(500)
+    pos, ori = robot_kinematics.forward_kin_batch(joints)
+    solutions, valid = robot_kinematics.inverse_kin_batch(np.concatenate((pos, ori), axis=1))
+    back, found, _ = robot_kinematics.select_nearest_solution(solutions, valid, joints)
+    assert found.all()
+    back_pos, back_ori = robot_kinematics.forward_kin_batch(back)
+    assert np.abs(back_pos - pos).max() < 1e-9
+    assert np.abs(np.abs(np.sum(back_ori * ori, axis=1)) - 1.0).max() < 1e-9
+    assert np.abs(back - joints).max() < 1e-6
+
+
+def test_robot_methods_round_trip(robot):
+    joint = tuple(_joints(1, seed=2)[0])
+    pose = robot.forward_kin(joint)
+    result = robot.inverse_kin(joint, pose['pos'], pose['ori'])
+    assert result is not None
+    assert np.allclose(result['joint'], joint, atol=1e-6)
+
+
+def test_cartesian_move_reaches_target(robot):
+    # The simulated controller checks the local model at connect, so Cartesian motions are allowed
+    assert robot.verified_robot_model is True
+    start = robot.get_current_waypoint()
+    target = (start['pos'][0], start['pos'][1] + 0.05, start['pos'][2])
+    rpy = np.degrees(robot.quaternion_to_rpy(start['ori']))
+    assert robot.move_to_target_in_cartesian(target, rpy) == RobotErrorType.RobotError_SUCC
+    assert np.allclose(robot.get_current_waypoint()['pos'], target, atol=1e-6)
+
+
+def test_model_mismatch_refuses_local_kinematics():
+    # The simulated arm is an Aubo_i5
+    Auboi5Robot.initialize()
+    robot = Auboi5Robot(RobotModelType.Aubo_i10)
+    robot.create_context()
+    try:
+        assert robot.connect('localhost', 8899) == RobotErrorType.RobotError_SUCC
+        assert robot.verified_robot_model is False
+        assert robot.get_current_waypoint() is not None
+        for call in (lambda: robot.forward_kin(tuple(_joints(1)[0])),
+                     lambda: robot.inverse_kin(tuple(_joints(1)[0]), (0.3, 0.1, 0.4), (1.0, 0.0, 0.0, 0.0)),
+                     lambda: robot.validate_trajectory(_joints(10))):
+            with pytest.raises(RobotError) as error:
+                call()
+            assert error.value.error_type == RobotErrorType.RobotError_MODEL_MISMATCH
+        robot.disconnect()
+        assert robot.verified_robot_model is None
+    finally:
+        if robot.connected:
+            robot.disconnect()
+        Auboi5Robot.uninitialize()
+
+
+def test_ik_cache_key_and_eviction():
+    cache = robot_kinematics.IkResultCache(max_size=2)
+    pos, ori = (0.3, 0.1, 0.4), (0.5, 0.5, 0.5, 0.5)
+    key = cache.make_key(pos, ori, None, None, RobotModelType.Aubo_i5, 0)
+    # q and -q are the same attitude, steps below the resolution are the same pose
+    assert cache.make_key(pos, tuple(-v for v in ori), None, None, RobotModelType.Aubo_i5, 0) == key
+    assert cache.make_key((0.3 + 1e-8, 0.1, 0.4), ori, None, None, RobotModelType.Aubo_i5, 0) == key
+    assert cache.make_key(pos, ori, (0.0, 0.0, 0.1, 1.0, 0.0, 0.0, 0.0), None, RobotModelType.Aubo_i5, 0) != key
+    cache.store(key, (0.0,) * 6)
+    cache.store(cache.make_key(pos, ori, None, None, RobotModelType.Aubo_i5, 1), (1.0,) * 6)
+    assert cache.lookup(key) == (0.0,) * 6
+    cache.store(cache.make_key(pos, ori, None, None, RobotModelType.Aubo_i5, 2), (2.0,) * 6)
+    # The entry of branch 1 was the least recently used
+    assert cache.lookup(cache.make_key(pos, ori, None, None, RobotModelType.Aubo_i5, 1)) is None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_tool_change_cannot_return_stale_pose(robot):
+    joint = tuple(_joints(1, seed=4)[0])
+    pose = robot.forward_kin(joint)
+    key = robot.ik_cache.make_key(pose['pos'], pose['ori'], robot.ik_cache_tool, robot.user_frame,
+                                  robot.robot_model, robot_kinematics.ik_branch(joint))
+    stale = (0.0,) * 6
+    robot.ik_cache.store(key, stale)
+    assert robot.inverse_kin(joint, pose['pos'], pose['ori'])['joint'] == list(stale)
+    tool = {"pos": (0.0, 0.0, 0.1), "ori": (1.0, 0.0, 0.0, 0.0)}
+    assert robot.set_tool_kinematics_param(tool) == RobotErrorType.RobotError_SUCC
+    assert len(robot.ik_cache) == 0
+    assert np.allclose(robot.inverse_kin(joint, pose['pos'], pose['ori'])['joint'], joint, atol=1e-6)
+
+
+def test_user_frame_change_invalidates_ik_cache(robot):
+    joint = tuple(_joints(1, seed=5)[0])
+    pose = robot.forward_kin(joint)
+    robot.inverse_kin(joint, pose['pos'], pose['ori'])
+    assert len(robot.ik_cache) == 1
+    frame = robot.compile_user_coord({'coord_type': 2, 'calibrate_method': 0,
+                                      'calibrate_points': {"point1": (0.0, -0.127, 1.27, -0.1, 1.57, 0.0),
+                                                           "point2": (0.3, -0.127, 1.27, -0.1, 1.57, 0.0),
+                                                           "point3": (0.0, 0.2, 1.27, -0.1, 1.57, 0.0)},
+                                      'tool_desc': {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)}})
+    assert robot.set_user_coord(frame) == RobotErrorType.RobotError_SUCC
+    assert len(robot.ik_cache) == 0
+    assert robot.set_base_coord() == RobotErrorType.RobotError_SUCC
+    assert robot.ik_cache.stats()["invalidations"] == 2
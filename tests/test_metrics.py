@@ -0,0 +1,92 @@
+# coding=utf-8
+import threading
+import numpy as np
+import pytest
+import robot_control_en
+from robot_control_en import RobotError, RobotErrorType
+from robot_metrics import HISTOGRAM_SUB_BUCKET_BITS, LatencyHistogram, RobotInstrumentation
+
+
+def test_histogram_percentiles_within_bucket_error():
+    values = np.random.RandomState(3).lognormal(np.log(2e-3), 1.0, 20000)
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    fractions = (0.5, 0.9, 0.95, 0.99, 0.999)
+    expected = np.sort(values)[[max(int(f * len(values) + 0.5), 1) - 1 for f in fractions]]
+    relative = np.abs(np.array(histogram.percentiles(fractions)) - expected) / expected
+    assert relative.max() < 2.0 ** -(HISTOGRAM_SUB_BUCKET_BITS - 1)
+    assert histogram.count == len(values) and histogram.max == int(values.max() * 1e9)
+    assert histogram.percentiles((1.0,))[0] == pytest.approx(values.max(), abs=1e-9)
+
+
+def test_histogram_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for nanoseconds in range(1, 101):
+        histogram.record(nanoseconds / 1e9)
+    assert histogram.percentiles((0.01, 0.5, 1.0)) == [1e-9, 50e-9, 100e-9]
+    histogram.reset()
+    assert histogram.percentiles((0.5,)) == [None]
+
+
+@pytest.fixture
+def strict_maxacc(monkeypatch):
+    # set_joint_maxacc answers RobotError_ERROR_ARGS for anything but six values
+    set_joint_maxacc = robot_control_en.Auboi5Robot.set_joint_maxacc
+
+    def strict(self, joint_maxacc):
+        if len(joint_maxacc) != 6:
+            return RobotErrorType.RobotError_ERROR_ARGS
+        return set_joint_maxacc(self, joint_maxacc)
+    monkeypatch.setattr(robot_control_en.Auboi5Robot, 'set_joint_maxacc', strict)
+
+
+def test_error_counting(robot, strict_maxacc, monkeypatch):
+    def lost():
+        raise RobotError(RobotErrorType.RobotError_NoLink, 0, "link lost")
+    monkeypatch.setattr(robot_control_en.Auboi5Robot, 'get_robot_state', lambda self: lost())
+    with RobotInstrumentation(robot) as instrumentation:
+        assert robot.set_joint_maxacc((1.5,) * 6) == RobotErrorType.RobotError_SUCC
+        assert robot.set_joint_maxacc((1.5,) * 5) == RobotErrorType.RobotError_ERROR_ARGS
+        with pytest.raises(RobotError):
+            robot.get_robot_state()
+        # Results of getters are values, not error codes
+        robot.get_joint_maxacc()
+    snapshot = instrumentation.snapshot()
+    assert (snapshot["set_joint_maxacc"]["count"], snapshot["set_joint_maxacc"]["errors"]) == (2, 1)
+    assert (snapshot["get_robot_state"]["count"], snapshot["get_robot_state"]["errors"]) == (1, 1)
+    assert snapshot["get_joint_maxacc"]["errors"] == 0
+    assert 'set_joint_maxacc' not in vars(robot)
+
+
+def test_error_counting_across_threads(robot, strict_maxacc):
+    instrumentation = RobotInstrumentation(robot).enable()
+    try:
+        def fail():
+            for _ in range(2000):
+                robot.set_joint_maxacc(())
+        threads = [threading.Thread(target=fail) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        instrumentation.disable()
+    row = instrumentation.snapshot()["set_joint_maxacc"]
+    assert row["count"] == row["errors"] == 8000
+
+
+def test_second_native_instrumentation_is_refused(robot):
+    library = robot_control_en.libpyauboi5
+    first = RobotInstrumentation(robot, native=True).enable()
+    try:
+        with pytest.raises(RuntimeError):
+            RobotInstrumentation(robot, native=True).enable()
+        robot.get_robot_state()
+        assert first.snapshot()["libpyauboi5.get_robot_state"]["count"] == 1
+    finally:
+        first.disable()
+    assert robot_control_en.libpyauboi5 is library
+    second = RobotInstrumentation(robot, native=True).enable()
+    second.disable()
+    assert robot_control_en.libpyauboi5 is library
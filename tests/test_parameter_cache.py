@@ -0,0 +1,103 @@
+# coding=utf-8
+import threading
+import pytest
+import libpyauboi5_sim
+from robot_control_en import RobotDefaultParameters, RobotErrorType, RobotParameterCache, RobotParameterCacheMode
+
+ACC = (1.5,) * 6
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    # get_joint_maxacc calls that reached the controller
+    calls = []
+    query = libpyauboi5_sim.get_joint_maxacc
+
+    def counting(rshd):
+        calls.append(rshd)
+        return query(rshd)
+    monkeypatch.setattr(libpyauboi5_sim, 'get_joint_maxacc', counting)
+    return calls
+
+
+def test_off_queries_every_time(robot, counted):
+    assert robot.parameter_cache_mode == RobotParameterCacheMode.Off
+    robot.get_joint_maxacc()
+    robot.get_joint_maxacc()
+    assert len(counted) == 2 and robot.parameter_cache_hits == 0
+    # The answer is still kept for validate_trajectory
+    assert robot.parameter_cache['joint_maxacc'] == tuple(robot.get_joint_maxacc())
+
+
+def test_read_through_queries_once(robot, counted):
+    robot.parameter_cache_mode = RobotParameterCacheMode.ReadThrough
+    first = robot.get_joint_maxacc()
+    assert robot.get_joint_maxacc() == first
+    assert len(counted) == 1 and robot.parameter_cache_hits == 1
+
+
+def test_setters_write_through(robot, counted):
+    robot.parameter_cache_mode = RobotParameterCacheMode.ReadThrough
+    assert robot.set_joint_maxacc(ACC) == RobotErrorType.RobotError_SUCC
+    assert robot.set_end_max_line_velc(0.2) == RobotErrorType.RobotError_SUCC
+    assert robot.get_joint_maxacc() == ACC and robot.get_end_max_line_velc() == 0.2
+    assert not counted and robot.parameter_cache_hits == 2
+
+
+def test_failed_setter_drops_the_value(robot, monkeypatch):
+    robot.parameter_cache_mode = RobotParameterCacheMode.ReadThrough
+    robot.set_joint_maxacc(ACC)
+    monkeypatch.setattr(libpyauboi5_sim, 'set_joint_maxacc', lambda rshd, value: RobotErrorType.RobotError_ERROR_ARGS)
+    assert robot.set_joint_maxacc((2.0,) * 6) == RobotErrorType.RobotError_ERROR_ARGS
+    assert 'joint_maxacc' not in robot.parameter_cache
+
+
+def test_init_profile_invalidates_move_profile(robot):
+    robot.parameter_cache_mode = RobotParameterCacheMode.ReadThrough
+    robot.set_joint_maxacc(ACC)
+    robot.set_work_mode(robot.get_work_mode())
+    assert robot.init_profile() == RobotErrorType.RobotError_SUCC
+    assert not set(robot.parameter_cache) & set(RobotParameterCache.MOVE_PROFILE)
+    assert 'work_mode' in robot.parameter_cache
+    # The controller restored its defaults, which the next query reads
+    assert robot.get_joint_maxacc() == libpyauboi5_sim.get_joint_maxacc(robot.rshd) != ACC
+
+
+def test_connect_and_disconnect_invalidate(robot):
+    robot.parameter_cache_mode = RobotParameterCacheMode.ReadThrough
+    robot.set_joint_maxacc(ACC)
+    robot.disconnect()
+    assert robot.parameter_cache == {}
+    robot.parameter_cache['joint_maxacc'] = ACC
+    assert robot.connect('localhost', 8899) == RobotErrorType.RobotError_SUCC
+    assert 'joint_maxacc' not in robot.parameter_cache
+
+
+def test_cached_only_never_reaches_the_controller(robot, monkeypatch):
+    robot.set_joint_maxacc(ACC)
+    robot.parameter_cache_mode = RobotParameterCacheMode.CachedOnly
+
+    def unreachable(*args):
+        raise AssertionError("CachedOnly queried the controller")
+    for name in RobotParameterCache.PARAMETERS:
+        monkeypatch.setattr(libpyauboi5_sim, 'get_' + name, unreachable)
+    assert robot.get_joint_maxacc() == ACC
+    # robot_startup sent the tool dynamics, joint_maxvelc was never set nor read
+    assert robot.get_tool_dynamics_param() == RobotDefaultParameters.tool_dynamics
+    assert robot.get_joint_maxvelc() is None
+    assert robot.validate_trajectory([(0.0,) * 6, (0.001,) * 6], 0.005).ok
+
+
+def test_concurrent_hits_are_counted(robot):
+    robot.parameter_cache_mode = RobotParameterCacheMode.ReadThrough
+    robot.set_joint_maxacc(ACC)
+
+    def read():
+        for _ in range(2000):
+            robot.get_joint_maxacc()
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert robot.parameter_cache_hits == 8000
@@ -0,0 +1,25 @@
+# coding=utf-8
+import pytest
+from robot_control_en import RobotError, RobotErrorType
+from robot_profile import RobotProfile
+
+
+def test_angle_velc_has_its_own_slot(robot):
+    profile = RobotProfile(robot)
+    assert profile.set_end_max_line_velc(0.2) == RobotErrorType.RobotError_SUCC
+    assert profile.set_end_max_angle_velc(0.2) == RobotErrorType.RobotError_SUCC
+    assert profile.sent_calls == 2
+    assert robot.get_end_max_line_velc() == 0.2
+    assert robot.get_end_max_angle_velc() == 0.2
+
+
+def test_flush_failure_raises_on_motion(robot, monkeypatch):
+    profile = RobotProfile(robot)
+    profile.set_joint_maxacc((1.5,) * 6)
+    monkeypatch.setattr(robot, 'init_profile', lambda: RobotErrorType.RobotError_ERROR_ARGS)
+    assert profile.init_profile() == RobotErrorType.RobotError_SUCC
+    # Calls that do not move the arm neither send nor report the deferred reset
+    assert profile.get_robot_state() is not None
+    with pytest.raises(RobotError, match="motion profile flush failed before move_joint") as error:
+        profile.move_joint((0.0, -0.127, -1.327, 0.364, -1.571, 0.0))
+    assert error.value.error_type == RobotErrorType.RobotError_ERROR_ARGS
@@ -0,0 +1,68 @@
+# coding=utf-8
+import time
+import numpy as np
+import robot_recorder
+from robot_recorder import TelemetryFile, TelemetryRecorder
+from robot_telemetry import TELEMETRY_DTYPE, TelemetrySampler
+
+
+def _records(count, start=1000.0, rate=250.0):
+    records = np.zeros(count, dtype=TELEMETRY_DTYPE)
+    records['time'] = start + np.arange(count) / rate
+    records['sequence'] = np.arange(count)
+    records['joint'] = np.sin(np.arange(count)[:, None] * 0.01 + np.arange(6))
+    records['pos'] = records['joint'][:, :3] * 0.5
+    records['ori'] = (1.0, 0.0, 0.0, 0.0)
+    records['current'] = np.nan
+    return records
+
+
+def test_round_trip_within_resolution(tmp_path):
+    path = str(tmp_path / "telemetry.tlm")
+    records = _records(2500)
+    with TelemetryRecorder(path, chunk_records=1000) as recorder:
+        recorder.append(records[:1200])
+        recorder.append(records[1200:])
+        recorder.append_event({'type': 22, 'code': 0, 'content': 'arrived'}, timestamp=1001.0)
+    telemetry = TelemetryFile(path)
+    assert len(telemetry) == len(records)
+    back = telemetry.read()
+    assert np.array_equal(back['time'], records['time'])
+    assert np.array_equal(back['sequence'], records['sequence'])
+    for name, step in robot_recorder.TELEMETRY_RESOLUTION.items():
+        assert np.abs(back[name] - records[name]).max() <= step / 2 + 1e-12
+    assert np.isnan(back['current']).all()
+    assert telemetry.events() == [{'time': 1001.0, 'type': 22, 'code': 0, 'content': 'arrived'}]
+
+
+def test_time_window_and_fields(tmp_path):
+    path = str(tmp_path / "telemetry.tlm")
+    records = _records(5000)
+    with TelemetryRecorder(path, chunk_records=1000) as recorder:
+        recorder.append(records)
+    window = TelemetryFile(path).read(1005.0, 1010.0, fields=('time', 'joint'))
+    assert window.dtype.names == ('time', 'joint')
+    assert window['time'][0] == 1005.0 and window['time'][-1] == 1010.0
+    assert len(window) == 5 * 250 + 1
+
+
+def test_unclosed_file_is_readable(tmp_path):
+    path = str(tmp_path / "telemetry.tlm")
+    recorder = TelemetryRecorder(path, chunk_records=1000)
+    recorder.append(_records(2500))
+    recorder.flush()
+    assert len(TelemetryFile(path)) == 2500
+    recorder.close()
+
+
+def test_records_sampled_robot(robot, tmp_path):
+    path = str(tmp_path / "telemetry.tlm")
+    with TelemetrySampler(robot, rate=200.0) as sampler, TelemetryRecorder(path) as recorder:
+        recorder.start(sampler.ring, robot, interval=0.05)
+        robot.move_joint((0.3, -0.127, 1.27, -0.1, 1.57, 0.0))
+        time.sleep(0.2)
+        recorder.stop()
+    telemetry = TelemetryFile(path)
+    samples = telemetry.read()
+    assert len(samples) > 0 and np.all(np.diff(samples['sequence']) > 0)
+    assert any(event['type'] == 22 for event in telemetry.events())
@@ -0,0 +1,73 @@
+# coding=utf-8
+import time
+import types
+import pytest
+import libpyauboi5_sim
+import robot_session
+from robot_control_en import RobotError, RobotErrorType
+from robot_session import RobotSession
+
+
+def _wait_link_down(session, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not session.link_down and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return session.link_down
+
+
+@pytest.fixture
+def flaky_login(monkeypatch):
+    # Fails the next `failures` logins like an unreachable controller; the backoff sleeps are recorded, not slept
+    state = types.SimpleNamespace(failures=0, delays=[])
+    login = libpyauboi5_sim.login
+
+    def flaky(rshd, ip, port):
+        if state.failures > 0:
+            state.failures -= 1
+            return libpyauboi5_sim.SIM_ERROR_LOGIN
+        return login(rshd, ip, port)
+    monkeypatch.setattr(libpyauboi5_sim, 'login', flaky)
+    monkeypatch.setattr(robot_session, 'time', types.SimpleNamespace(sleep=state.delays.append,
+                                                                     monotonic=time.monotonic))
+    return state
+
+
+def test_reconnect_with_backoff_and_replay(robot, flaky_login):
+    session = RobotSession(robot, backoff=(0.1, 2.0, 0.3))
+    assert session.set_joint_maxacc((1.5,) * 6) == RobotErrorType.RobotError_SUCC
+    assert session.set_end_max_line_velc(0.2) == RobotErrorType.RobotError_SUCC
+
+    libpyauboi5_sim.sim_drop_link(robot.rshd)
+    assert _wait_link_down(session)
+    # The controller lost the settings with the link
+    libpyauboi5_sim.contexts[robot.rshd].init_profile()
+    flaky_login.failures = 3
+
+    assert session.get_end_max_line_velc() == 0.2
+    assert flaky_login.delays == [0.1, 0.2, 0.3]
+    assert libpyauboi5_sim.contexts[robot.rshd].joint_maxacc == (1.5,) * 6
+    assert session.recovery_stats()["recoveries"] == 1 and not session.link_down
+
+
+def test_motion_is_not_repeated(robot, flaky_login, monkeypatch):
+    session = RobotSession(robot, backoff=(0.1, 2.0, 0.3))
+    calls = []
+
+    def lost(*args):
+        calls.append(args)
+        raise RobotError(RobotErrorType.RobotError_NoLink, 0, "link lost")
+    monkeypatch.setattr(robot, 'move_joint', lost)
+    with pytest.raises(RobotError):
+        session.move_joint((0.0,) * 6)
+    assert len(calls) == 1 and session.recovery_stats()["recoveries"] == 1
+
+
+def test_recovery_gives_up(robot, flaky_login):
+    session = RobotSession(robot, backoff=(0.1, 2.0, 0.3), max_attempts=4)
+    libpyauboi5_sim.sim_drop_link(robot.rshd)
+    assert _wait_link_down(session)
+    flaky_login.failures = 10
+    with pytest.raises(RobotError):
+        session.get_robot_state()
+    assert flaky_login.delays == [0.1, 0.2, 0.3]
+    assert session.recovery_stats()["failed"] == 1 and session.link_down
@@ -0,0 +1,107 @@
+# coding=utf-8
+import numpy as np
+import pytest
+from robot_telemetry import SharedTelemetryRing, TelemetryReader, TelemetryRing
+
+
+def _write(ring, count):
+    for _ in range(count):
+        index = ring.slot()
+        ring.data['time'][index] = ring.written + 1
+        ring.commit()
+
+
+def _sequences(views):
+    return [int(value) for view in views for value in view['sequence']]
+
+
+def test_latest_and_since_across_wraparound():
+    ring = TelemetryRing(capacity=8)
+    _write(ring, 5)
+    assert ring.latest()['sequence'].tolist() == [1, 2, 3, 4, 5]
+    _write(ring, 8)
+    # A full ring keeps capacity - 1 records, the oldest slot is the next one written
+    records = ring.latest()
+    assert records['sequence'].tolist() == list(range(7, 14))
+    assert np.array_equal(records['time'], records['sequence'].astype(float))
+    assert ring.latest(3)['sequence'].tolist() == [11, 12, 13]
+    records, lost = ring.since(2)
+    assert records['sequence'].tolist() == list(range(7, 14)) and lost == 4
+    records, lost = ring.since(10)
+    assert records['sequence'].tolist() == [11, 12, 13] and lost == 0
+
+
+def test_slot_being_filled_is_not_copied():
+    ring = TelemetryRing(capacity=4)
+    _write(ring, 6)
+    index = ring.slot()
+    ring.data['time'][index] = -1.0
+    # The writer stopped between the payload and commit(): record 7 is not published, record 3 is gone
+    assert ring.latest()['sequence'].tolist() == [4, 5, 6]
+    assert ring.overwritten(3) and not ring.overwritten(4)
+
+
+def test_refilled_slot_is_dropped_from_copy(monkeypatch):
+    ring = TelemetryRing(capacity=4)
+    _write(ring, 6)
+    concatenate = np.concatenate
+
+    def refill_during_copy(arrays, *args, **kwargs):
+        # The writer starts refilling the slot of record 4 between the payload copy and the sequence check
+        result = concatenate(arrays, *args, **kwargs)
+        if result.dtype.names:
+            ring.sequence[3] = 0
+        return result
+    monkeypatch.setattr(np, 'concatenate', refill_during_copy)
+    assert ring.latest()['sequence'].tolist() == [5, 6]
+
+
+def test_reader_views_split_at_wraparound():
+    ring = TelemetryRing(capacity=8)
+    reader = TelemetryReader(ring)
+    _write(ring, 6)
+    assert _sequences(reader.read()) == [1, 2, 3, 4, 5, 6] and reader.valid()
+    _write(ring, 5)
+    views = reader.read()
+    assert len(views) == 2 and _sequences(views) == [7, 8, 9, 10, 11]
+    assert reader.valid() and reader.lost == 0
+    assert reader.read() == () and reader.valid()
+
+
+def test_reader_counts_lost_records_and_invalidates_views():
+    ring = TelemetryRing(capacity=8)
+    reader = TelemetryReader(ring)
+    _write(ring, 20)
+    assert _sequences(reader.read()) == list(range(14, 21)) and reader.lost == 13
+    _write(ring, 1)
+    # Record 14 sat in the slot of record 21
+    assert not reader.valid()
+    assert _sequences(reader.read()) == [21] and reader.valid()
+
+
+def test_reader_detects_refilled_record():
+    ring = TelemetryRing(capacity=8)
+    reader = TelemetryReader(ring)
+    _write(ring, 4)
+    views = reader.read()
+    ring.sequence[1] = 0
+    assert len(views) == 1 and not reader.valid()
+
+
+def test_shared_ring_attach_round_trip():
+    ring = SharedTelemetryRing(capacity=16)
+    try:
+        _write(ring, 20)
+        attached = SharedTelemetryRing(ring.name)
+        try:
+            assert attached.capacity == 16 and attached.written == 20
+            assert np.array_equal(attached.latest(), ring.latest())
+            reader = TelemetryReader(attached, 17)
+            assert _sequences(reader.read()) == [18, 19, 20] and reader.valid()
+        finally:
+            attached.close()
+        with pytest.raises(ValueError):
+            SharedTelemetryRing(ring.name, dtype=np.dtype([('sequence', 'u8')]))
+    finally:
+        ring.close()
+        ring.unlink()
@@ -0,0 +1,49 @@
+# coding=utf-8
+import numpy as np
+import pytest
+import libpyauboi5_sim
+import robot_track
+from robot_control_en import RobotErrorType
+
+
+def _waypoints(count):
+    waypoints = np.zeros((count, 6))
+    waypoints[:, 0] = np.linspace(0.0, 0.5, count)
+    waypoints[:, 2] = np.linspace(1.27, 1.0, count)
+    return waypoints
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_binary_round_trip(tmp_path, dtype):
+    path = str(tmp_path / "track.bin")
+    waypoints = _waypoints(7000)
+    assert robot_track.write_track_binary(path, waypoints, dtype, period=0.005) == len(waypoints)
+    header = robot_track.validate_track_binary(path, joint_limit=np.pi)
+    assert header["count"] == len(waypoints) and header["period"] == 0.005
+    assert np.array_equal(robot_track.open_track_binary(path), waypoints.astype(dtype))
+
+
+def test_text_binary_round_trip(tmp_path):
+    text, binary, back = (str(tmp_path / name) for name in ("track.txt", "track.bin", "back.txt"))
+    waypoints = np.round(_waypoints(100), 6)
+    np.savetxt(text, waypoints, delimiter=',', fmt='%.6f')
+    assert robot_track.track_text_to_binary(text, binary) == len(waypoints)
+    assert robot_track.track_binary_to_text(binary, back) == len(waypoints)
+    assert np.allclose(np.loadtxt(back, delimiter=','), waypoints)
+
+
+def test_invalid_waypoint_is_reported(tmp_path):
+    path = str(tmp_path / "track.bin")
+    waypoints = _waypoints(10)
+    waypoints[4, 3] = np.nan
+    robot_track.write_track_binary(path, waypoints)
+    with pytest.raises(ValueError, match="index 4"):
+        robot_track.validate_track_binary(path)
+
+
+def test_upload_file_in_chunks(robot, tmp_path):
+    path = str(tmp_path / "track.bin")
+    robot_track.write_track_binary(path, _waypoints(7000))
+    assert robot.upload_offline_track_file(path, chunk_size=2500, startup=False) == RobotErrorType.RobotError_SUCC
+    assert robot.last_track_upload.chunks == 3
+    assert libpyauboi5_sim.sim_state(robot.rshd)["offline_track_points"] == 7000
@@ -0,0 +1,61 @@
+# coding=utf-8
+import numpy as np
+import pytest
+import robot_trajectory
+
+
+def _line(length, vertices=2):
+    path = np.zeros((vertices, 6))
+    path[:, 0] = np.linspace(0.0, length, vertices)
+    return path
+
+
+@pytest.mark.parametrize("vertices", [2, 11])
+def test_straight_line_is_trapezoid(vertices):
+    # vmax = 1, amax = 2, 1 rad: 0.5 s accelerating, 0.5 s cruising, 0.5 s decelerating
+    timed = robot_trajectory.time_parameterize(_line(1.0, vertices), 1.0, 2.0)
+    assert timed.duration == pytest.approx(1.5, abs=1e-9)
+    velocity = np.diff(timed.waypoints[:, 0]) / timed.period
+    acceleration = np.diff(velocity) / timed.period
+    assert np.abs(velocity).max() == pytest.approx(1.0, rel=1e-6)
+    assert np.abs(acceleration).max() == pytest.approx(2.0, rel=1e-6)
+
+
+def test_short_line_is_triangle():
+    # Never reaches vmax: t = 2 * sqrt(L / a)
+    timed = robot_trajectory.time_parameterize(_line(0.2), 1.0, 2.0)
+    assert timed.duration == pytest.approx(2.0 * np.sqrt(0.2 / 2.0), abs=1e-9)
+
+
+def test_curved_path_respects_limits():
+    angle = np.linspace(0.0, np.pi, 200)
+    path = np.zeros((200, 6))
+    path[:, 0] = 0.5 * np.cos(angle)
+    path[:, 1] = 0.5 * np.sin(angle)
+    timed = robot_trajectory.time_parameterize(path, 1.0, 2.0)
+    report = robot_trajectory.validate_trajectory(timed.waypoints, timed.period, (1.0,) * 6, (2.0,) * 6)
+    assert report.ok
+    assert np.allclose(timed.waypoints[0], path[0]) and np.allclose(timed.waypoints[-1], path[-1])
+
+
+def test_validator_flags_each_violation():
+    timed = robot_trajectory.time_parameterize(_line(0.5), 1.0, 2.0)
+    waypoints = timed.waypoints.copy()
+    middle = len(waypoints) // 2
+    waypoints[middle, 1] += 0.05
+    waypoints[-3, 2] = np.nan
+    waypoints[-2, 3] = 10.0
+    report = robot_trajectory.validate_trajectory(waypoints, timed.period, (1.0,) * 6, (2.0,) * 6, max_jump=0.02)
+    assert not report.ok
+    # The spike accelerates the waypoint before it too
+    assert report.first_violation() == middle - 1
+    assert report.mask(robot_trajectory.TrajectoryViolation.VELOCITY)[middle]
+    assert report.mask(robot_trajectory.TrajectoryViolation.ACCELERATION)[middle]
+    assert report.mask(robot_trajectory.TrajectoryViolation.JUMP)[middle]
+    assert report.mask(robot_trajectory.TrajectoryViolation.NOT_FINITE)[-3]
+    assert report.mask(robot_trajectory.TrajectoryViolation.JOINT_LIMIT)[-2]
+
+
+def test_robot_validates_before_upload(robot):
+    timed = robot.time_parameterize_track(_line(0.5))
+    assert robot.validate_trajectory(timed.waypoints, timed.period).ok
@@ -0,0 +1,110 @@
+# coding=utf-8
+import numpy as np
+import pytest
+import libpyauboi5_sim
+import robot_kinematics
+import robot_transforms
+from robot_control_en import RobotCoordType
+
+HALF = np.sqrt(0.5)
+
+TOOL = {"pos": (0.01, -0.02, 0.15), "ori": (np.cos(0.2), 0.0, np.sin(0.2), 0.0)}
+
+USER_COORD = {'coord_type': RobotCoordType.Robot_World_Coordinate, 'calibrate_method': 0,
+              'calibrate_points': {"point1": (0.0, -0.127, 1.27, -0.1, 1.57, 0.0),
+                                   "point2": (0.3, -0.127, 1.27, -0.1, 1.57, 0.0),
+                                   "point3": (0.0, 0.2, 1.27, -0.1, 1.57, 0.0)},
+              'tool_desc': {"pos": (0.0, 0.0, 0.0), "ori": (1.0, 0.0, 0.0, 0.0)}}
+
+
+def _rpy(count, seed=7):
+    rpy = np.random.RandomState(seed).uniform(-np.pi, np.pi, (count, 3))
+    rpy[:, 1] *= 0.5
+    return rpy
+
+
+def _rotation(rx, ry, rz):
+    # R = Rz(rz) * Ry(ry) * Rx(rx) from the elementary rotations
+    x = np.array(((1.0, 0.0, 0.0), (0.0, np.cos(rx), -np.sin(rx)), (0.0, np.sin(rx), np.cos(rx))))
+    y = np.array(((np.cos(ry), 0.0, np.sin(ry)), (0.0, 1.0, 0.0), (-np.sin(ry), 0.0, np.cos(ry))))
+    z = np.array(((np.cos(rz), -np.sin(rz), 0.0), (np.sin(rz), np.cos(rz), 0.0), (0.0, 0.0, 1.0)))
+    return z @ y @ x
+
+
+def _same_attitude(lhs, rhs):
+    # q and -q are the same attitude
+    return np.abs(np.abs(np.sum(np.atleast_2d(lhs) * np.atleast_2d(rhs), axis=1)) - 1.0).max()
+
+
+@pytest.mark.parametrize("rpy, quaternion", [
+    ((0.0, 0.0, 0.0), (1.0, 0.0, 0.0, 0.0)),
+    ((np.pi / 2, 0.0, 0.0), (HALF, HALF, 0.0, 0.0)),
+    ((0.0, np.pi / 2, 0.0), (HALF, 0.0, HALF, 0.0)),
+    ((0.0, 0.0, np.pi / 2), (HALF, 0.0, 0.0, HALF)),
+    ((np.pi, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0)),
+    ((0.0, 0.0, -np.pi), (0.0, 0.0, 0.0, 1.0)),
+])
+def test_rpy_to_quaternion_known_values(rpy, quaternion):
+    assert _same_attitude(robot_transforms.rpy_to_quaternion(rpy), quaternion) < 1e-12
+
+
+def test_conversions_match_elementary_rotations():
+    rpy = _rpy(200)
+    expected = np.array([_rotation(*angles) for angles in rpy])
+    assert np.abs(robot_transforms.rpy_to_rotation(rpy) - expected).max() < 1e-12
+    quat = robot_transforms.rpy_to_quaternion(rpy)
+    assert np.abs(robot_transforms.quaternion_to_rotation(quat) - expected).max() < 1e-12
+    assert _same_attitude(robot_transforms.rotation_to_quaternion(expected), quat) < 1e-12
+
+
+def test_round_trips():
+    rpy = _rpy(10000)
+    quat = robot_transforms.rpy_to_quaternion(rpy)
+    assert np.abs(robot_transforms.quaternion_to_rpy(quat) - rpy).max() < 1e-9
+    assert np.abs(robot_transforms.rotation_to_rpy(robot_transforms.rpy_to_rotation(rpy)) - rpy).max() < 1e-9
+    axis, angle = robot_transforms.quaternion_to_axis_angle(quat)
+    assert _same_attitude(robot_transforms.axis_angle_to_quaternion(axis, angle), quat) < 1e-12
+
+
+@pytest.mark.parametrize("pitch", [np.pi / 2, -np.pi / 2])
+def test_gimbal_lock(pitch):
+    rpy = np.array(((0.3, pitch, -0.7), (1.2, pitch, 0.4), (0.0, pitch, 0.0)))
+    rotation = robot_transforms.rpy_to_rotation(rpy)
+    from_quaternion = robot_transforms.quaternion_to_rpy(robot_transforms.rpy_to_quaternion(rpy))
+    from_rotation = robot_transforms.rotation_to_rpy(rotation)
+    for back in (from_quaternion, from_rotation):
+        assert np.isfinite(back).all()
+        assert np.abs(back[:, 1] - pitch).max() < 1e-6
+        # Only rx -+ rz is defined at the lock, the attitude must be the same
+        assert np.abs(robot_transforms.rpy_to_rotation(back) - rotation).max() < 1e-6
+    assert np.all(from_rotation[:, 0] == 0.0)
+
+
+def test_robot_matches_library(robot):
+    for rpy in _rpy(20):
+        quat = robot.rpy_to_quaternion(tuple(rpy))
+        assert _same_attitude(quat, libpyauboi5_sim.rpy_to_quaternion(robot.rshd, tuple(rpy))) < 1e-12
+        assert np.allclose(robot.quaternion_to_rpy(quat), libpyauboi5_sim.quaternion_to_rpy(robot.rshd, quat))
+
+
+def test_base_user_matches_library(robot):
+    pos, ori = robot_kinematics.forward_kin_batch(np.random.RandomState(8).uniform(-2.0, 2.0, (20, 6)))
+    for p, o in zip(pos, ori):
+        user = robot.base_to_user(tuple(p), tuple(o), USER_COORD, TOOL)
+        reference = libpyauboi5_sim.base_to_user(robot.rshd, tuple(p), tuple(o), USER_COORD, TOOL)
+        assert np.allclose(user['pos'], reference['pos'], atol=1e-12)
+        assert _same_attitude(user['ori'], reference['ori']) < 1e-12
+        base = robot.user_to_base(user['pos'], user['ori'], USER_COORD, TOOL)
+        assert np.allclose(base['pos'], p, atol=1e-9) and _same_attitude(base['ori'], o) < 1e-9
+
+
+def test_tool_offset(robot):
+    pos, ori = robot_kinematics.forward_kin_batch(np.random.RandomState(9).uniform(-2.0, 2.0, (20, 6)))
+    for p, o in zip(pos, ori):
+        end = robot.base_to_base_additional_tool(tuple(p), tuple(o), TOOL)
+        rotation = robot_transforms.quaternion_to_rotation(o)[0]
+        assert np.allclose(end['pos'], p + rotation @ np.asarray(TOOL['pos']), atol=1e-12)
+        expected = robot_transforms.quaternion_to_rotation(TOOL['ori'])[0]
+        assert np.abs(robot_transforms.quaternion_to_rotation(end['ori'])[0] - rotation @ expected).max() < 1e-12
+        reference = libpyauboi5_sim.base_to_base_additional_tool(robot.rshd, tuple(p), tuple(o), TOOL)
+        assert np.allclose(end['pos'], reference['pos']) and _same_attitude(end['ori'], reference['ori']) < 1e-12